@@ -0,0 +1,149 @@
+'''asyncio versions of databass and DataBassLite.
+
+There is no asyncio driver underneath. The blocking calls run in a bounded
+thread pool so they never block the event loop. The same dictionaries and
+lists of dictionaries go in and come out as with the normal classes:
+
+    db = AsyncDatabass(config, pool_size=32)
+    rows = await db.select("table", {"id": 5})
+    await asyncio.gather(*[db.insert("table", row) for row in rows])
+
+AsyncDatabass gives every worker thread its own pooled connection, so up to
+pool_size queries run at the same time and any number can wait in line.
+SQLite only has one writer, so AsyncDataBassLite runs everything on one
+thread that owns the connection.
+'''
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Callable, AsyncIterator
+from databass import databass
+from databasslite import DataBassLite
+
+
+class _AsyncBass:
+    '''The awaitable methods shared by AsyncDatabass and AsyncDataBassLite.'''
+
+    def __init__(self, db, executor: ThreadPoolExecutor):
+        self.db = db
+        self._executor = executor
+
+    async def _call(self, method: Callable, *args, **kwargs):
+        '''Runs a blocking method in the thread pool.'''
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def run(self, sql: str, *args, **kwargs):
+        '''See run() of the wrapped class.'''
+        return await self._call(self.db.run, sql, *args, **kwargs)
+
+    async def tables(self) -> list:
+        '''Returns a list of tables in the database.'''
+        return await self._call(self.db.tables)
+
+    async def select(self, table: str, *args, **kwargs):
+        '''See select() of the wrapped class.'''
+        return await self._call(self.db.select, table, *args, **kwargs)
+
+    async def join(self, table: str, joins: list, **kwargs):
+        '''See join() of the wrapped class.'''
+        return await self._call(self.db.join, table, joins, **kwargs)
+
+    async def insert(self, table: str, data: Union[dict, list]):
+        '''See insert() of the wrapped class.'''
+        return await self._call(self.db.insert, table, data)
+
+    async def insupd(self, table: str, data: Union[dict, list]):
+        '''See insupd() of the wrapped class.'''
+        return await self._call(self.db.insupd, table, data)
+
+    async def update(self, table: str, data: dict, where: dict = {}, wherenot: dict = {}):
+        '''See update() of the wrapped class.'''
+        return await self._call(self.db.update, table, data, where, wherenot)
+
+    async def delete(self, table: str, where: dict = {}, wherenot: dict = {}):
+        '''See delete() of the wrapped class.'''
+        return await self._call(self.db.delete, table, where, wherenot)
+
+    async def bulk_load(self, table: str, rows, **kwargs):
+        '''See bulk_load() of the wrapped class. The rows are consumed on the worker thread.'''
+        return await self._call(self.db.bulk_load, table, rows, **kwargs)
+
+    async def EatFeed(self, feed: str, *args, **kwargs) -> str:
+        '''See EatFeed() of the wrapped class.'''
+        return await self._call(self.db.EatFeed, feed, *args, **kwargs)
+
+    async def iselect(self, table: str, *args, batchsize: int = 1000, **kwargs) -> AsyncIterator:
+        '''Async generator over the rows of a select, fetched batchsize at a time.'''
+        rows = await self._call(self.db.iselect, table, *args, batchsize=batchsize, **kwargs)
+        if not hasattr(rows, "__next__"):
+            # False, None or an error message, like select() would have returned.
+            raise ValueError(rows)
+        try:
+            while True:
+                batch = await self._call(lambda: [row for _, row in zip(range(batchsize), rows)])
+                if not batch:
+                    break
+                for row in batch:
+                    yield row
+        finally:
+            await self._call(rows.close)
+
+    async def scan(self, table: str, batch_size: int = 1000, **kwargs) -> AsyncIterator:
+        '''Async generator over the pages of scan() of the wrapped class.'''
+        pages = await self._call(self.db.scan, table, batch_size, **kwargs)
+        if not hasattr(pages, "__next__"):
+            raise ValueError(pages)
+        try:
+            while True:
+                page = await self._call(next, pages, None)
+                if page is None:
+                    break
+                yield page
+        finally:
+            await self._call(pages.close)
+
+    async def transact(self, work: Callable, *args, strict: bool = False) -> tuple:
+        '''Runs work(db, *args) in one transaction on one worker thread.
+        Returns what work returned and the BassTransaction. A transaction
+        belongs to a thread, so this is the way to get one instead of "async with".'''
+        def transaction():
+            with self.db.transaction(strict) as tx:
+                ret = work(self.db, *args)
+            return ret, tx
+        return await self._call(transaction)
+
+
+class AsyncDatabass(_AsyncBass):
+    '''databass for asyncio.'''
+
+    def __init__(self, config: dict, pool_size: int = 16, **kwargs):
+        '''config is the same as for databass. pool_size is both the number
+        of connections and the number of worker threads. Other keyword
+        arguments go to databass.'''
+        super().__init__(databass(config, pool_size=pool_size, **kwargs),
+                         ThreadPoolExecutor(pool_size, thread_name_prefix="databass"))
+
+    async def close(self) -> None:
+        '''Closes the connections and stops the worker threads.'''
+        await self._call(self.db.close)
+        self._executor.shutdown()
+
+
+class AsyncDataBassLite(_AsyncBass):
+    '''DataBassLite for asyncio.'''
+
+    def __init__(self, file: str, **kwargs):
+        '''The connection is made on the worker thread, since an SQLite
+        connection may only be used by the thread that made it.'''
+        executor = ThreadPoolExecutor(1, thread_name_prefix="databasslite")
+        super().__init__(executor.submit(DataBassLite, file, **kwargs).result(), executor)
+
+    async def columns(self, table: str) -> Union[list, None]:
+        '''Returns the columns in the table.'''
+        return await self._call(self.db.columns, table)
+
+    async def close(self) -> None:
+        '''Closes the database and stops the worker thread.'''
+        await self._call(self.db.sql.close)
+        self._executor.shutdown()
@@ -0,0 +1,189 @@
+'''Result cache for databass and DataBassLite.
+
+    db = databass(config, cache=ResultCache(maxsize=1000, ttl=5))
+
+Repeated select() and join() calls with the same arguments are answered
+from memory instead of the database. Every write that goes through the
+library, insert, insupd, update, delete, clear, drop, AlterTable, bulk_load
+and so the feed eaters too, forgets the cached results of the tables it
+touched. SQL you write yourself through run() forgets everything unless it
+only reads. Inside transaction() and batch() the cache is not used, and the
+tables written in the block are forgotten again when it ends.
+
+The cache only knows about writes made through this object in this
+process. Use ttl when someone else writes to the same tables.
+'''
+import copy
+import functools
+import inspect
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Union
+
+_READ = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(SELECT|SHOW|DESCRIBE|DESC|EXPLAIN|PRAGMA)\b", re.IGNORECASE)
+
+
+def is_read(sql: str) -> bool:
+    '''Returns True if the SQL statement only reads.'''
+    return _READ.match(sql) is not None
+
+
+class ResultCache:
+    '''A thread safe least recently used cache of query results.'''
+
+    def __init__(self, maxsize: int = 1024, ttl: Union[float, None] = None):
+        '''maxsize: the most results kept, the least recently used go first.
+        ttl:     seconds a result is trusted, None for as long as no write
+                 through the library touches its tables.'''
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (value, tables, time stored)
+        self._keys = {}                 # table -> set of keys that read it
+        self._generations = {}          # table -> invalidation count
+        self._generation = 0            # count of invalidations of everything
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def fetch(self, key, tables: Iterable, compute: Callable):
+        '''Returns the cached result for key, or compute() which is then
+        cached for the tables it read. Errors and empty answers (anything
+        but a list or a dictionary) are never cached.'''
+        tables = tuple(tables)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[0])
+            self.misses += 1
+            before = (self._generation, [self._generations.get(table, 0) for table in tables])
+        value = compute()
+        if not isinstance(value, (list, dict)):
+            return value
+        with self._lock:
+            # A write that happened while computing may have made the value old already.
+            if before == (self._generation, [self._generations.get(table, 0) for table in tables]):
+                if key in self._entries:
+                    self._remove(key)
+                self._entries[key] = (_copy(value), tables, time.monotonic())
+                for table in tables:
+                    self._keys.setdefault(table, set()).add(key)
+                while len(self._entries) > self.maxsize:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, tables: Union[Iterable, None] = None) -> None:
+        '''Forgets the results that read any of the tables, or everything.'''
+        with self._lock:
+            self.invalidations += 1
+            if tables is None:
+                self._generation += 1
+                self._entries.clear()
+                self._keys = {}
+                return
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                for key in list(self._keys.get(table, ())):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        '''Forgets everything.'''
+        self.invalidate()
+
+    def stats(self) -> dict:
+        '''Returns hits, misses, evictions, invalidations and the size.'''
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def _remove(self, key) -> None:
+        value, tables, stored = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys[table]
+
+
+def _copy(value):
+    '''The cache keeps its own copy, so callers can change what they get.'''
+    if isinstance(value, list):
+        return [dict(row) if type(row) is dict else row for row in value]
+    return {column: copy.copy(values) for column, values in value.items()}
+
+
+def _arguments(signature: inspect.Signature, args: tuple, kwargs: dict) -> dict:
+    bound = signature.bind(None, *args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop(next(iter(signature.parameters)))
+    return arguments
+
+
+def forget(db, tables: Union[Iterable, None]) -> None:
+    '''Invalidates the tables in db.cache and remembers them in the running
+    transaction, so they are invalidated again when it ends.'''
+    db.cache.invalidate(tables)
+    tx = db._top_transaction()
+    if tx is not None:
+        tx.touch(tables)
+
+
+def cached(tables: Callable):
+    '''Decorator for methods that read. tables(arguments) returns the tables
+    the call reads, arguments being a dictionary of all the arguments.'''
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.cache is None or self._top_transaction() is not None:
+                return method(self, *args, **kwargs)
+            arguments = _arguments(signature, args, kwargs)
+            key = (method.__name__, json.dumps(arguments, default=repr))
+            return self.cache.fetch(key, tables(arguments), lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorate
+
+
+def invalidates(tables: Callable):
+    '''Decorator for methods that write. tables(arguments) returns the
+    tables the call changes.'''
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                if self.cache is not None:
+                    forget(self, tables(_arguments(signature, args, kwargs)))
+        return wrapper
+    return decorate
+
+
+def one_table(arguments: dict) -> list:
+    '''tables() for methods with a table argument.'''
+    return [arguments["table"]]
+
+
+def join_tables(arguments: dict) -> list:
+    '''tables() for join().'''
+    return [arguments["table"]] + [join.get("table") for join in arguments["joins"]]
+
+
+def created_tables(arguments: dict) -> list:
+    '''tables() for create().'''
+    return list(arguments.get("tableconfigs", arguments.get("tableconfig", {})))
@@ -0,0 +1,105 @@
+'''Schema catalog shared by databass and DataBassLite.
+
+Looking up which tables and columns exist used to cost several round trips
+to the server before every single operation. The catalog keeps the answers
+in memory and only asks the database again when the library itself changed
+the schema, when someone calls refresh(), or when the optional time to live
+has run out.
+
+The backend gives the catalog two functions:
+    load_tables()         -> list of table names
+    load_columns(table)   -> (list of columns, list of primary keys)
+'''
+import re
+import threading
+import time
+from typing import Callable, Union
+
+# Statements that change the schema. Leading "--" comment lines, like the
+# "--begin-sql" marker used in DataBassLite, are skipped before matching.
+_DDL = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(CREATE|DROP|ALTER|RENAME|TRUNCATE)\b", re.IGNORECASE)
+
+
+def is_ddl(sql: str) -> bool:
+    '''Returns True if the SQL statement changes the schema.'''
+    return _DDL.match(sql) is not None
+
+
+class BassCatalog:
+    '''Caches tables, columns and primary keys for one database.'''
+
+    def __init__(self, load_tables: Callable, load_columns: Callable, ttl: Union[float, None] = None):
+        '''ttl: seconds before the cached schema is considered stale.
+        None means the catalog only refreshes when told to.'''
+        self._load_tables = load_tables
+        self._load_columns = load_columns
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables = None
+        self._columns = {}
+        self._loaded = 0.0
+        # Bumped on every refresh so a load that raced with it is not kept.
+        self._generation = 0
+
+    def _stale(self) -> bool:
+        return self.ttl is not None and time.monotonic() - self._loaded > self.ttl
+
+    def _table_list(self) -> list:
+        # The lock is never held while the database is asked, so a thread
+        # holding a connection can not deadlock with one loading the schema.
+        with self._lock:
+            if self._stale():
+                self._tables = None
+                self._columns = {}
+            tables = self._tables
+            generation = self._generation
+        if tables is None:
+            tables = list(self._load_tables())
+            with self._lock:
+                if generation == self._generation:
+                    self._tables = tables
+                    self._loaded = time.monotonic()
+        return tables
+
+    def _describe(self, table: str) -> Union[tuple, None]:
+        if table not in self._table_list():
+            return None
+        with self._lock:
+            described = self._columns.get(table)
+            generation = self._generation
+        if described is None:
+            columns, keys = self._load_columns(table)
+            described = (list(columns), list(keys))
+            with self._lock:
+                if generation == self._generation:
+                    self._columns[table] = described
+        return described
+
+    def tables(self) -> list:
+        '''Returns a list of tables in the database.'''
+        return list(self._table_list())
+
+    def has_table(self, table: str) -> bool:
+        '''Returns True if the table exists.'''
+        return table in self._table_list()
+
+    def columns(self, table: str) -> Union[list, None]:
+        '''Returns the columns in the table, None if there is no such table.'''
+        described = self._describe(table)
+        return None if described is None else list(described[0])
+
+    def primary_keys(self, table: str) -> Union[list, None]:
+        '''Returns the primary keys in the table, None if there is no such table.'''
+        described = self._describe(table)
+        return None if described is None else list(described[1])
+
+    def refresh(self, table: Union[str, None] = None) -> None:
+        '''Forgets the cached schema. With a table only that table is
+        described again, the table list is always reloaded.'''
+        with self._lock:
+            self._generation += 1
+            self._tables = None
+            if table is None:
+                self._columns = {}
+            else:
+                self._columns.pop(table, None)
@@ -0,0 +1,68 @@
+'''Checkpoints for resumable feeds, for databass and DataBassLite.
+
+    feed = master.GenerateFeed(operations, feed_id="nightly-2024-05-01")
+    replica.EatFeed(feed, checkpoint=1000)
+
+A feed with an id numbers its operations with "seq". EatFeed() with
+checkpoint commits every checkpoint operations and in the same transaction
+stores the seq it got to in the table bass_checkpoints of the database that
+eats. Eating the same feed again, after a lost connection or a crash,
+skips what was already committed and goes on from there.
+
+The checkpoint is kept in the database itself, also for DataBassLite, so
+that it is committed together with the operations and never tells more or
+less than what is there. The table is made the first time a feed with
+checkpoints is eaten, and after that the schema catalog knows it is there.
+MariaDB commits by itself on create, drop and alter table, a feed with
+those can repeat them after a crash.
+'''
+import time
+from bassmetrics import internal
+
+CHECKPOINTS = "bass_checkpoints"
+
+_TABLES = {
+    "mariadb": """CREATE TABLE IF NOT EXISTS `{}` (
+                    `feed` VARCHAR(255) NOT NULL PRIMARY KEY,
+                    `seq` BIGINT NOT NULL,
+                    `time` DOUBLE NOT NULL)""",
+    "sqlite": """CREATE TABLE IF NOT EXISTS `{}` (
+                    `feed` TEXT NOT NULL PRIMARY KEY,
+                    `seq` INTEGER NOT NULL,
+                    `time` REAL NOT NULL)""",
+}
+_SAVE = {
+    "mariadb": """INSERT INTO `{}` (`feed`, `seq`, `time`) VALUES (%s, %s, %s)
+                  ON DUPLICATE KEY UPDATE `seq`=VALUES(`seq`), `time`=VALUES(`time`)""",
+    "sqlite": """INSERT INTO `{}` (`feed`, `seq`, `time`) VALUES (?, ?, ?)
+                 ON CONFLICT(`feed`) DO UPDATE SET `seq`=excluded.`seq`, `time`=excluded.`time`""",
+}
+
+
+def prepare(db) -> None:
+    '''Makes the checkpoint table if the catalog does not know it. Done
+    before the first batch, as MariaDB commits on CREATE TABLE.'''
+    if not db.catalog.has_table(CHECKPOINTS):
+        with internal(db):
+            db._run(_TABLES[db._dialect].format(CHECKPOINTS))
+
+
+def last_seq(db, feed: str) -> int:
+    '''Returns the seq the feed got to in db, 0 if it was never eaten there.'''
+    if not db.catalog.has_table(CHECKPOINTS):
+        return 0
+    with internal(db):
+        rows = db._run("SELECT `seq` FROM `{}` WHERE `feed` = {}".format(CHECKPOINTS, db._placeholder), (str(feed),))
+    return rows[0]["seq"] if rows else 0
+
+
+def save(db, feed: str, seq: int) -> None:
+    '''Stores the seq the feed got to, inside the running transaction.'''
+    with internal(db):
+        db._run(_SAVE[db._dialect].format(CHECKPOINTS), (str(feed), seq, time.time()))
+
+
+def forget(db, feed: str) -> None:
+    '''Removes the checkpoint of a feed, so it is eaten from the start again.'''
+    if db.catalog.has_table(CHECKPOINTS):
+        db._run("DELETE FROM `{}` WHERE `feed` = {}".format(CHECKPOINTS, db._placeholder), (str(feed),))
@@ -0,0 +1,205 @@
+'''Table diff between two databases, databass or DataBassLite in any mix.
+
+    feed = master.diff("users", replica)
+    replica.EatFeed(master.GenerateFeed(feed))
+
+diff() returns the insupds and deletes that make the table in the other
+database the same as in this one, without moving the tables themselves:
+
+1. Both databases compute a checksum of the table, the number of rows and
+   the XOR and the sum of a CRC32 of every row, in the database itself.
+2. Where they differ the range is split in fanout parts by primary key,
+   at keys picked from the side with the most rows, and each part is
+   compared the same way. Parts that are equal are left alone.
+3. Parts with at most leaf rows are read from both sides and compared row
+   by row.
+
+For two big tables with a few changed rows only checksums and the changed
+rows go over the wire. MariaDB uses CRC32() and BIT_XOR(), SQLite gets the
+same functions from Python, bass_crc32() and bass_xor().
+
+A row is hashed as the text of its values, so between MariaDB and SQLite
+values that are equal but written differently, like 1 and 1.0, count as
+changed. That costs an insupd that was not needed, never a missed change.
+'''
+import sqlite3
+import zlib
+from typing import Union
+from basswhere import compile_where, keyset, quote
+
+# A row is hashed as the text of its values, NULL as \N, joined by the unit
+# separator. MariaDB does it with CONCAT_WS, SQLite with row_bytes().
+_NULL = b"\\N"
+_SEPARATOR = b"\x1f"
+
+
+def row_bytes(values) -> bytes:
+    '''The bytes a row is hashed as. The same as CONCAT_WS in MariaDB, as
+    far as the text of the values goes.'''
+    parts = []
+    for value in values:
+        if value is None:
+            parts.append(_NULL)
+        elif isinstance(value, bytes):
+            parts.append(value)
+        elif isinstance(value, float):
+            # MariaDB writes 1.0 as 1 and 1e+20 as 1e20.
+            parts.append((str(int(value)) if value.is_integer() and abs(value) < 1e15
+                          else repr(value).replace("e+", "e")).encode("utf-8"))
+        elif isinstance(value, bool):
+            parts.append(b"1" if value else b"0")
+        else:
+            parts.append(str(value).encode("utf-8"))
+    return _SEPARATOR.join(parts)
+
+
+def _crc32(*values) -> int:
+    return zlib.crc32(row_bytes(values))
+
+
+class _Xor:
+    '''BIT_XOR() for SQLite.'''
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value) -> None:
+        if value is not None:
+            self.value ^= value
+
+    def finalize(self) -> int:
+        return self.value
+
+
+def register(connection: sqlite3.Connection) -> None:
+    '''Adds bass_crc32() and bass_xor() to an SQLite connection.'''
+    connection.create_function("bass_crc32", -1, _crc32, deterministic=True)
+    connection.create_aggregate("bass_xor", 1, _Xor)
+
+
+class _Side:
+    '''The SQL for one of the two databases.'''
+
+    def __init__(self, db, table: str, keys: list, columns: list):
+        self.db = db
+        self.table = table
+        self.keys = keys
+        self.columns = columns
+        self.placeholder = db._placeholder
+        if db._dialect == "sqlite":
+            register(db.sql)
+            hashed = "bass_crc32({})".format(", ".join(quote(c) for c in columns))
+            self.checksum_sql = ("SELECT COUNT(*) AS `n`, bass_xor(`h`) AS `x`, SUM(`h`) AS `s` "
+                                 "FROM (SELECT {} AS `h` FROM `{}`{{}})".format(hashed, table))
+        else:
+            hashed = "CRC32(CONCAT_WS(CHAR(31), {}))".format(", ".join(
+                "COALESCE(CAST({} AS CHAR), '\\\\N')".format(quote(c)) for c in columns))
+            self.checksum_sql = ("SELECT COUNT(*) AS `n`, COALESCE(BIT_XOR(`h`), 0) AS `x`, "
+                                 "COALESCE(SUM(`h`), 0) AS `s` "
+                                 "FROM (SELECT {} AS `h` FROM `{}`{{}}) AS `hashes`".format(hashed, table))
+        self.order = ", ".join(quote(k) for k in keys)
+        self.queries = 0
+
+    def _where(self, after: Union[tuple, None], upto: Union[tuple, None]) -> tuple:
+        '''WHERE for the keys after after and up to and including upto.'''
+        where = keyset(self.keys, list(after)) if after is not None else {}
+        wherenot = keyset(self.keys, list(upto)) if upto is not None else {}
+        sql, values = compile_where(where, wherenot, self.placeholder)
+        return (" WHERE " + sql if sql else ""), values
+
+    def _run(self, sql: str, values: tuple) -> list:
+        self.queries += 1
+        rows = self.db._run(sql, values)
+        if not isinstance(rows, list):
+            raise ValueError("Checksum query failed: {}".format(rows))
+        return rows
+
+    def checksum(self, after: Union[tuple, None], upto: Union[tuple, None]) -> tuple:
+        '''(rows, xor, sum) for a range of keys.'''
+        where, values = self._where(after, upto)
+        row = self._run(self.checksum_sql.format(where), values)[0]
+        return int(row["n"]), int(row["x"] or 0), int(row["s"] or 0)
+
+    def key_at(self, after: Union[tuple, None], upto: Union[tuple, None], offset: int) -> tuple:
+        '''The key of row number offset, counted from 0, in a range of keys.'''
+        where, values = self._where(after, upto)
+        sql = "SELECT {} FROM `{}`{} ORDER BY {} LIMIT 1 OFFSET {}".format(
+              self.order, self.table, where, self.order, int(offset))
+        row = self._run(sql, values)[0]
+        return tuple(row[k] for k in self.keys)
+
+    def rows(self, after: Union[tuple, None], upto: Union[tuple, None]) -> dict:
+        '''{key: row} for a range of keys.'''
+        where, values = self._where(after, upto)
+        sql = "SELECT {} FROM `{}`{} ORDER BY {}".format(
+              ", ".join(quote(c) for c in self.columns), self.table, where, self.order)
+        return {tuple(row[k] for k in self.keys): dict(row) for row in self._run(sql, values)}
+
+
+def table_diff(source, target, table: str, fanout: int = 16, leaf: int = 1000) -> tuple:
+    '''Returns (feed, stats), the operations that make table in target the
+    same as in source and what it took. Raises ValueError if the table is
+    missing, has no primary key or does not have the same columns on both
+    sides.'''
+    if fanout < 2 or leaf < 1:
+        raise ValueError("fanout has to be at least 2 and leaf at least 1")
+    columns = source.catalog.columns(table)
+    othercolumns = target.catalog.columns(table)
+    if columns is None or othercolumns is None:
+        raise ValueError("Table {} not in both databases".format(table))
+    if set(columns) != set(othercolumns):
+        raise ValueError("Table {} does not have the same columns in both databases".format(table))
+    keys = source.catalog.primary_keys(table)
+    if not keys or keys != target.catalog.primary_keys(table):
+        raise ValueError("Table {} needs the same primary key in both databases".format(table))
+
+    here = _Side(source, table, keys, columns)
+    there = _Side(target, table, keys, columns)
+    feed = []
+    stats = {"ranges": 0, "equal": 0, "leaves": 0, "rows read": 0, "insupd": 0, "delete": 0}
+    pending = [(None, None)]
+    while pending:
+        after, upto = pending.pop()
+        stats["ranges"] += 1
+        mine, theirs = here.checksum(after, upto), there.checksum(after, upto)
+        if mine == theirs:
+            stats["equal"] += 1
+            continue
+        count = max(mine[0], theirs[0])
+        if count <= leaf:
+            stats["leaves"] += 1
+            feed += _leaf(source, table, keys, here.rows(after, upto), there.rows(after, upto), stats)
+            continue
+        side = here if mine[0] >= theirs[0] else there
+        edges = [after]
+        for i in range(1, fanout):
+            offset = count * i // fanout - 1
+            if offset >= 0:
+                key = side.key_at(after, upto, offset)
+                if key != edges[-1]:
+                    edges.append(key)
+        edges.append(upto)
+        # Pushed backwards so the ranges are handled in key order.
+        for i in reversed(range(len(edges) - 1)):
+            pending.append((edges[i], edges[i + 1]))
+    stats["queries"] = here.queries + there.queries
+    return feed, stats
+
+
+def _leaf(source, table: str, keys: list, mine: dict, theirs: dict, stats: dict) -> list:
+    '''The operations for a range small enough to compare row by row.'''
+    stats["rows read"] += len(mine) + len(theirs)
+    changed = [row for key, row in mine.items()
+               if key not in theirs or row_bytes(row.values()) != row_bytes(theirs[key][c] for c in row)]
+    gone = [key for key in theirs if key not in mine]
+    ret = []
+    if gone:
+        stats["delete"] += len(gone)
+        if len(keys) == 1:
+            ret.append(source.FeedDelete(table, {keys[0]: {"in": [key[0] for key in gone]}}))
+        else:
+            ret.append(source.FeedDelete(table, {"$or": [dict(zip(keys, key)) for key in gone]}))
+    if changed:
+        stats["insupd"] += len(changed)
+        ret.append(source.FeedInsupd(table, changed))
+    return ret
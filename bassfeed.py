@@ -0,0 +1,754 @@
+'''Bass feeds, the JSON format databass and DataBassLite use to send
+operations to each other.
+
+A feed is a list of operations, each a dictionary made by one of the Feed*
+functions. GenerateFeed() turns the list in to JSON and EatFeed() on the other
+side runs the operations against its own database. The result of eating a
+feed is identical to as if the operations were done locally.
+
+BassFeeder holds the feed functions for both databass and DataBassLite. The
+class using it needs create, AlterTable, drop, insert, update, insupd, delete,
+clear, join and transaction, and has to fill self._feedeaters in its __init__.
+'''
+import codecs
+import io
+import json
+import mmap
+import time
+from typing import Union, Callable, Iterable, Iterator
+from basstransaction import BassTransaction
+from basspack import MAGIC, PackReader, is_packed, pack
+from bassresult import json_default
+from basswhere import is_plain, keyset, where_columns
+from bassdiff import table_diff
+from bassio import export_table, import_table
+import basscheckpoint
+
+# Operations that change the schema. They must run alone, after everything
+# before them and before everything after them.
+BARRIERS = ("create", "drop", "alter table")
+# Operations that read more tables than their own. They also run alone.
+READERS = ("join",)
+
+
+def stages(feeds: list) -> list:
+    '''Splits the operations of a feed in to stages that run one after the other.
+    A stage is a list of streams and a stream is a list of indexes in to feeds.
+    Operations on the same table end up in the same stream, in feed order,
+    so the streams of a stage can run at the same time. Schema changes, and
+    operations without a single table, get a stage of their own.'''
+    ret = []
+    streams = {}
+    for index, f in enumerate(feeds):
+        if f["operation"] in BARRIERS or f["operation"] in READERS or "table" not in f:
+            if streams:
+                ret.append(list(streams.values()))
+                streams = {}
+            ret.append([[index]])
+        else:
+            streams.setdefault(f["table"], []).append(index)
+    if streams:
+        ret.append(list(streams.values()))
+    return ret
+
+
+def numbered(feeds: list) -> list:
+    '''Returns the operations with their place in the feed as "seq", from 1.'''
+    return [dict(f, seq=seq) for seq, f in enumerate(feeds, 1)]
+
+
+class FeedReader:
+    '''Reads the operations of a bassfeed one at a time:
+
+        for operation in FeedReader(open("feed.json", "rb")):
+            ...
+
+    The source can be a JSON string or bytes, a file-like object with read(),
+    or an iterator of str or bytes chunks. Only the operation being parsed is
+    kept in memory, never the whole feed. Keys other than "bassfeed", like
+    server information, are put in self.header as they are passed.
+    '''
+
+    def __init__(self, source, chunksize: int = 65536):
+        self.header = {}
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._chunksize = chunksize
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        if isinstance(source, (str, bytes, bytearray, memoryview)):
+            self._chunks = iter([source])
+        elif hasattr(source, "read"):
+            self._chunks = iter(lambda: source.read(self._chunksize), source.read(0))
+        else:
+            self._chunks = iter(source)
+
+    def _more(self, atleast: int = 0) -> bool:
+        '''Reads more of the source in to the buffer. Returns False at the end.'''
+        if self._eof:
+            return False
+        if self._pos > 0:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        read = 0
+        while read <= atleast:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                self._buffer += self._utf8.decode(b"", final=True)
+                return read > 0
+            if not isinstance(chunk, str):
+                chunk = self._utf8.decode(bytes(chunk))
+            self._buffer += chunk
+            read += len(chunk)
+        return True
+
+    def _skip(self) -> str:
+        '''Skips whitespace and returns the next character, "" at the end.'''
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._more():
+                return ""
+
+    def _expect(self, characters: str) -> str:
+        character = self._skip()
+        if character == "" or character not in characters:
+            raise ValueError("Bad bassfeed, expected {} at {!r}".format(
+                " or ".join(characters), self._buffer[self._pos:self._pos+20]))
+        self._pos += 1
+        return character
+
+    def _value(self):
+        '''Decodes the next JSON value, reading more until it is complete.'''
+        self._skip()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number at the very end of the buffer might go on in the next chunk.
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Read at least as much as is buffered so a big value is not
+            # parsed from the start over and over again.
+            if not self._more(len(self._buffer) - self._pos):
+                value, self._pos = self._decoder.raw_decode(self._buffer, self._pos)
+                return value
+
+    def __iter__(self):
+        self._expect("{")
+        if self._skip() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == "bassfeed":
+                self._expect("[")
+                if self._skip() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.header[key] = self._value()
+            if self._expect(",}") == "}":
+                return
+
+
+class FeedWriter:
+    '''Writes a bassfeed one operation at a time:
+
+        with FeedWriter("feed.json", header={"server": "a"}) as feed:
+            for row in rows:
+                feed.write(db.FeedInsupd("table", row))
+
+    The target can be a file name, a text or binary file-like object, or a
+    socket. Nothing but the operation being written is kept in memory.
+    The header goes before "bassfeed" so FeedReader sees it first.
+    '''
+
+    def __init__(self, target, header: dict = {}):
+        self._opened = isinstance(target, str)
+        if self._opened:
+            target = open(target, "w", encoding="utf-8")
+        self._target = target
+        if hasattr(target, "sendall"):
+            self._send = lambda text: target.sendall(text.encode("utf-8"))
+        elif isinstance(target, io.TextIOBase):
+            self._send = target.write
+        else:
+            self._send = lambda text: target.write(text.encode("utf-8"))
+        self.count = 0
+        self._closed = False
+        self._send("{")
+        for key in header:
+            if key != "bassfeed":
+                self._send(json.dumps(key) + ": " + json.dumps(header[key]) + ", ")
+        self._send('"bassfeed": [')
+
+    def write(self, operation: dict) -> None:
+        '''Appends one operation to the feed.'''
+        self._send((", " if self.count else "") + json.dumps(operation, default=json_default))
+        self.count += 1
+
+    def writemany(self, operations: Iterable) -> None:
+        '''Appends all operations from an iterable.'''
+        for operation in operations:
+            self.write(operation)
+
+    def close(self) -> None:
+        '''Ends the feed. A file opened by the writer is also closed.'''
+        if self._closed:
+            return
+        self._closed = True
+        self._send("]}")
+        if self._opened:
+            self._target.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+class _Rewound:
+    '''A binary file-like object with the bytes already read put back in front.'''
+
+    def __init__(self, head: bytes, source):
+        self._head = head
+        self._source = source
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._head:
+            return self._source.read(size)
+        if size < 0:
+            data, self._head = self._head + self._source.read(), b""
+        elif size <= len(self._head):
+            data, self._head = self._head[:size], self._head[size:]
+        else:
+            data, self._head = self._head + self._source.read(size - len(self._head)), b""
+        return data
+
+
+def read_feed(source):
+    '''Returns a reader for the feed in source, a PackReader for a packed
+    feed (see basspack) and a FeedReader for JSON. Packed feeds are told
+    apart by their first bytes, so bytes, mmaps and binary files can hold
+    either.'''
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return PackReader(source) if is_packed(source) else FeedReader(source)
+    if hasattr(source, "read"):
+        head = source.read(len(MAGIC))
+        if head == MAGIC:
+            return PackReader(_Rewound(head, source))
+        return FeedReader(_Rewound(head, source) if head else source)
+    return FeedReader(source)
+
+
+def optimize(feeds: list, primary_keys: Union[Callable, None] = None) -> tuple:
+    '''Rewrites the operations of a feed so that fewer statements are needed
+    to get the same end result. Returns (operations, stats).
+
+    - Operations on a table that is dropped later in the feed are removed,
+      and so are updates whose rows a later delete with the same where removes.
+    - Inserts, insupds, updates and deletes before a clear of their table are removed.
+    - insupd rows whose primary key a later delete removes are left out.
+    - Inserts, and insupds, on the same table with the same columns are merged
+      in to one operation when they follow each other directly in the feed.
+    - Repeated insupds of the same primary key are merged in to one row, with
+      the columns of later rows over those of earlier ones.
+
+    primary_keys(table) returns the primary keys of a table. Tables created
+    in the feed itself use the keys from their create. Without keys insupds
+    are merged but not collapsed.
+
+    Merged inserts succeed or fail together, where the original operations
+    could fail one at a time.
+    '''
+    keys = {}
+    for f in feeds:
+        if f["operation"] == "create":
+            for table, columns in f["tableconfigs"].items():
+                keys[table] = [c["Field"] for c in columns if c.get("Key", "").upper() == "PRI"]
+
+    def keys_of(table):
+        if table not in keys:
+            found = primary_keys(table) if primary_keys is not None else None
+            keys[table] = found if found else None
+        return keys[table]
+
+    def pk(row, keys):
+        return tuple(row.get(key) for key in keys) if all(key in row for key in keys) else None
+
+    stats = {"in": len(feeds), "out": 0, "dead": 0, "merged": 0, "collapsed": 0, "saved": 0}
+
+    # Backwards: what a later drop, clear or delete makes pointless.
+    dropped = set()
+    cleared = set()
+    deletes = {}    # table -> where dictionaries of later deletes without wherenot
+    alive = []
+    for f in reversed(feeds):
+        operation = f["operation"]
+        if operation == "create":
+            for table in f["tableconfigs"]:
+                dropped.discard(table)
+                cleared.discard(table)
+                deletes.pop(table, None)
+            alive.append(f)
+            continue
+        if operation in READERS:
+            # Everything before it has to be there when it reads.
+            dropped = set()
+            cleared = set()
+            deletes = {}
+            alive.append(f)
+            continue
+        if "table" not in f or operation in BARRIERS:
+            if operation == "drop":
+                dropped.add(f["table"])
+            elif operation == "alter table" and f["table"] in dropped:
+                stats["dead"] += 1
+                continue
+            if "table" in f:
+                deletes.pop(f["table"], None)
+            else:
+                deletes = {}
+            alive.append(f)
+            continue
+        table = f["table"]
+        if table in dropped or (table in cleared and operation in ("insert", "insupd", "update", "delete")):
+            stats["dead"] += 1
+            continue
+        if operation == "clear":
+            cleared.add(table)
+        later = deletes.get(table, [])
+        if operation == "delete":
+            if f.get("wherenot", {}) == {} and f.get("where", {}) != {}:
+                deletes.setdefault(table, []).append(f["where"])
+        elif operation == "update":
+            where = f.get("where", {})
+            if f.get("wherenot", {}) == {} and where in later and not set(f["data"]) & set(where_columns(where)):
+                stats["dead"] += 1
+                continue
+            deletes.pop(table, None)
+        elif operation == "insupd" and later and keys_of(table):
+            tablekeys = keys_of(table)
+            gone = {tuple(where[key] for key in tablekeys) for where in later
+                    if set(where) == set(tablekeys) and is_plain(where)}
+            rows = f["data"] if isinstance(f["data"], list) else [f["data"]]
+            kept = [row for row in rows if pk(row, tablekeys) not in gone]
+            if kept == []:
+                stats["dead"] += 1
+                continue
+            if len(kept) != len(rows):
+                stats["collapsed"] += len(rows) - len(kept)
+                f = dict(f, data=kept)
+            deletes.pop(table, None)
+        elif operation != "insert":
+            deletes.pop(table, None)
+        alive.append(f)
+    alive.reverse()
+
+    # Forwards: merge inserts and insupds that follow each other directly and
+    # can share one statement.
+    ret = []
+    open_op = None  # the last operation in ret, if it is an insert or insupd open for more rows
+    for f in alive:
+        operation = f["operation"]
+        if operation in ("insert", "insupd") and "table" in f:
+            rows = f["data"] if isinstance(f["data"], list) else [f["data"]]
+            columns = {frozenset(row) for row in rows}
+            if (len(columns) == 1 and open_op is not None and open_op["operation"] == operation
+                    and open_op["table"] == f["table"] and frozenset(open_op["data"][0]) in columns):
+                open_op["data"].extend(rows)
+                stats["merged"] += 1
+                continue
+            if len(columns) == 1 and rows:
+                open_op = dict(f, data=list(rows))
+                ret.append(open_op)
+                continue
+        open_op = None
+        ret.append(f)
+
+    # One row per primary key in an insupd. A later row only sets its own
+    # columns, the others keep what the earlier rows set.
+    for i, f in enumerate(ret):
+        if f["operation"] == "insupd" and isinstance(f["data"], list) and keys_of(f["table"]):
+            tablekeys = keys_of(f["table"])
+            last = {}
+            for row in f["data"]:
+                key = pk(row, tablekeys)
+                key = key if key is not None else ("row", id(row))
+                last[key] = {**last.get(key, {}), **row}
+            if len(last) != len(f["data"]):
+                stats["collapsed"] += len(f["data"]) - len(last)
+                ret[i] = dict(f, data=list(last.values()))
+
+    stats["out"] = len(ret)
+    stats["saved"] = stats["in"] - stats["out"]
+    return ret, stats
+
+
+class BassFeeder:
+    '''Feed generators and feed eaters shared by databass and DataBassLite,
+    and the helpers the two have in common.'''
+
+    # A bassmetrics.BassMetrics and a bassjournal.BassJournal, set by the
+    # constructors of the databases.
+    metrics = None
+    journal = None
+    verbose = False
+
+    '''Feed generators'''
+    def FeedCreate(self, tableconfigs: dict) -> dict:
+        '''Returns a feed for the create operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"create", "tableconfigs":tableconfigs}
+
+    def FeedAlterTable(self, table: str, add: list=[], drop: Union[list, str]=[]) -> dict:
+        '''Returns a feed for the alter operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"alter table", "table":table, "add":add, "drop":drop}
+
+    def FeedDrop(self, table: str) -> dict:
+        '''Returns a feed for the drop operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"drop", "table":table}
+
+    def FeedInsert(self, table: str, data: dict) -> dict:
+        '''Returns a feed for the insert operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"insert", "table":table, "data":data}
+
+    def FeedUpdate(self, table: str, data: dict, where: dict={}, wherenot: dict={}) -> dict:
+        '''Returns a feed for the update operation to be read by EatFeed() on another server.
+        The conditions in where and wherenot are plain JSON, see basswhere.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"update", "table":table, "data":data, "where":where, "wherenot":wherenot }
+
+    def FeedInsupd(self, table: str, data: Union[list, dict]) -> dict:
+        '''Returns a feed for the insert/update operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"insupd", "table":table, "data":data}
+
+    def FeedDelete(self, table: str, where: dict={}, wherenot: dict={}) -> dict:
+        '''Returns a feed for the delete operation to be read by EatFeed() on another server.
+        The conditions in where and wherenot are plain JSON, see basswhere.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"delete", "table": table, "where" : where, "wherenot" : wherenot }
+
+    def FeedClear(self, table: str) -> dict:
+        '''Returns a feed for the clear operation to be read by EatFeed() on another server.
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"clear", "table":table}
+
+    def FeedJoin(self, table: str, joins: list, columns: Union[dict, None]=None, where: dict={},
+                 wherenot: dict={}, orderby: Union[str, list, None]=None,
+                 limit: Union[int, None]=None) -> dict:
+        '''Returns a feed for a join, see join(). The other side runs the same
+        query against its own database and the rows end up in the result of EatFeed().
+
+        The feeds need to be put in a list afterwards.'''
+        return {"operation":"join", "table":table, "joins":joins, "columns":columns, "where":where,
+                "wherenot":wherenot, "orderby":orderby, "limit":limit}
+
+    def GenerateFeed(self, feed: list, optimize: bool=False, feed_id: Union[str, None]=None) -> str:
+        '''Generated a json string from the list of feeds in feed.
+        This is the thing you are supposed to put in the feed for databass
+        to eat on the other side. It contains the keyword "bassfeed".
+        Other then that you can add whatever server information you like
+        to the json before you put it in the actual feed.
+
+        optimize: run the feed through OptimizeFeed() first.
+        feed_id: a name unique to this feed. The operations are numbered with
+        "seq" so that EatFeed() with checkpoint can resume it, see basscheckpoint.'''
+        if optimize:
+            feed = self.OptimizeFeed(feed)
+        if feed_id is None:
+            return json.dumps({"bassfeed":feed}, default=json_default)
+        return json.dumps({"id":feed_id, "bassfeed":numbered(feed)}, default=json_default)
+
+    def GeneratePackedFeed(self, feed: list, optimize: bool=False, compression: str="zlib",
+                           feed_id: Union[str, None]=None) -> bytes:
+        '''Same as GenerateFeed() but returns a packed feed, see basspack.
+        It is a lot smaller and faster to eat for inserts and insupds with
+        many rows. EatFeed() takes both kinds.
+
+        compression: "zlib", "lzma" or "none".'''
+        if optimize:
+            feed = self.OptimizeFeed(feed)
+        if feed_id is None:
+            return pack(feed, compression=compression)
+        return pack(numbered(feed), {"id":feed_id}, compression)
+
+    def feed_since(self, seq: int=0) -> Union[str, bool]:
+        '''Returns a bassfeed of the changes after seq from the journal, see
+        bassjournal. The key "seq" in it is where to continue the next time.
+        False if there is no journal.'''
+        if self.journal is None:
+            return False
+        return self.journal.feed(seq)
+
+    def diff(self, table: str, other, fanout: int=16, leaf: int=1000) -> Union[list, str]:
+        '''Returns the feed that makes table in the other database, databass or
+        DataBassLite, the same as here. Only checksums of key ranges and the
+        rows that differ are read, see bassdiff. What it took is put in
+        self.diffstats.
+
+        fanout: the number of parts a range that differs is split in.
+        leaf:   ranges with at most this many rows are compared row by row.'''
+        try:
+            feed, self.diffstats = table_diff(self, other, table, fanout, leaf)
+        except ValueError as err:
+            return "Error, " + str(err)
+        return feed
+
+    def export(self, table: str, path: str, format: Union[str, None]=None, compress: Union[bool, None]=None,
+               batch_size: int=10000, progress: Union[Callable, None]=None) -> Union[dict, str]:
+        '''Writes a table to a NDJSON, CSV or bassfeed file, gzipped if the name
+        ends in .gz, in primary key order and a batch at a time, see bassio.
+        progress: called as progress(rows, rows_per_second) after each batch.
+        Returns {"rows": ..., "seconds": ..., "rows_per_second": ...}'''
+        try:
+            return export_table(self, table, path, format, compress, batch_size, progress)
+        except ValueError as err:
+            return "Error, " + str(err)
+
+    def import_(self, path: str, table: str, format: Union[str, None]=None, compress: Union[bool, None]=None,
+                batch_size: int=10000, progress: Union[Callable, None]=None) -> Union[dict, bool, str]:
+        '''Reads a file made by export() in to a table with bulk_load(), or the
+        feed eaters for a bassfeed, a batch at a time, see bassio.'''
+        try:
+            return import_table(self, path, table, format, compress, batch_size, progress)
+        except ValueError as err:
+            return "Error, " + str(err)
+
+    def OptimizeFeed(self, feed: list) -> list:
+        '''Returns a shorter list of feeds with the same end result, see
+        bassfeed.optimize(). What was saved is put in self.feedstats.'''
+        feed, self.feedstats = optimize(feed, self.catalog.primary_keys)
+        return feed
+
+    '''Feed readers, because a feed is bass food in this case'''
+    def EatCreate(self, feed: dict):
+        return self.create(feed["tableconfigs"])
+
+    def EatAlterTable(self, feed: dict) -> Union[str, bool]:
+        table = feed["table"]
+        add   = feed["add"]
+        drop  = feed["drop"]
+        return self.AlterTable(table, add, drop)
+
+    def EatDrop(self, feed: dict) -> Union[bool, str]:
+        return self.drop(feed["table"])
+
+    def EatInsert(self, feed: dict) -> Union[bool, str]:
+        table = feed["table"]
+        data  = feed["data"]
+        return self.insert(table, data)
+
+    def EatUpdate(self, feed: dict) -> Union[str, bool]:
+        table    = feed["table"]
+        data     = feed["data"]
+        where    = feed["where"]
+        wherenot = feed["wherenot"]
+        return self.update(table, data, where, wherenot)
+
+    def EatInsupd(self, feed: dict) -> Union[list, str]:
+        table    = feed["table"]
+        data     = feed["data"]
+        if type(data)==dict:
+            data = [data]
+        return self.insupd(table, data)
+
+    def EatClear(self, feed: dict):
+        return self.clear(feed["table"])
+
+    def EatJoin(self, feed: dict):
+        return self.join(feed["table"], feed["joins"], feed.get("columns"), feed.get("where", {}),
+                         feed.get("wherenot", {}), feed.get("orderby"), feed.get("limit"))
+
+    def EatDelete(self, feed: dict) -> Union[str, bool]:
+        table    = feed["table"]
+        where    = feed["where"]
+        wherenot = feed["wherenot"]
+        return self.delete(table, where, wherenot)
+
+    def EatFeed(self, feed, atomic: bool=True, optimize: bool=False,
+                checkpoint: Union[int, None]=None, strict: bool=True) -> str:
+        '''This functions reads a feed, handles it and does operations
+        to the database.
+
+        feed: a json string with atleast the keyword "bassfeed" in it. Can also
+        be bytes, a file-like object or an iterator of chunks, which are read
+        one operation at a time by FeedReader so the feed never has to fit in
+        memory. bytes, mmaps and binary files can also hold a packed feed
+        from GeneratePackedFeed().
+        atomic: apply the whole feed in one transaction. (MariaDB commits by
+        itself on create, drop and alter table, so a feed with those is only
+        atomic between them.)
+        strict: roll everything back if an operation fails, returns False or
+        an error message, and end the result with "Rolled back". Failures
+        that do no harm, like dropping a table that is not there, do not
+        count. With strict=False only an exception rolls back.
+        optimize: run the feed through OptimizeFeed() first. The results are
+        then those of the optimized operations.
+        checkpoint: for a feed with an id, commit every this many operations
+        and remember how far it got, see basscheckpoint. Eating the feed
+        again goes on from there. strict then applies to each batch, and
+        the first batch that is rolled back stops the feed.
+        '''
+        feeds = read_feed(feed)
+        if checkpoint is not None:
+            if optimize:
+                return "Error, optimize a feed with checkpoints when it is generated"
+            return self._eat_resumable(feeds, strict, checkpoint)
+        if optimize:
+            feeds = self.OptimizeFeed(list(feeds))
+        if not atomic:
+            return self._eat(feeds)
+        with self.transaction(strict=strict) as tx:
+            ret = self._eat(feeds, tx)
+        if not tx.committed:
+            ret += "Rolled back"
+        return ret
+
+    def _eat_resumable(self, reader, strict: bool, every: int) -> str:
+        '''EatFeed() with checkpoints. Operations without seq are numbered by
+        their place in the feed. A batch never ends between parts of one
+        operation, which a packed feed can split in several with the same seq.'''
+        ret = []
+        feedid = None
+        done = 0
+        batch = []
+
+        def commit() -> bool:
+            with self.transaction(strict=strict) as tx:
+                ret.append(self._eat([f for seq, f in batch], tx))
+                basscheckpoint.save(self, feedid, batch[-1][0])
+            batch.clear()
+            if not tx.committed:
+                ret.append("Rolled back")
+            return tx.committed
+
+        for position, f in enumerate(reader, 1):
+            if feedid is None:
+                feedid = reader.header.get("id")
+                if feedid is None:
+                    return "Error, checkpoint needs a feed with an id, see GenerateFeed()"
+                basscheckpoint.prepare(self)
+                done = basscheckpoint.last_seq(self, feedid)
+            seq = f.get("seq", position)
+            if seq <= done:
+                continue
+            if len(batch) >= every and seq != batch[-1][0] and not commit():
+                return "".join(ret)
+            batch.append((seq, f))
+        if batch:
+            commit()
+        return "".join(ret)
+
+    def _eat(self, feeds: Iterable, tx: Union[BassTransaction, None]=None) -> str:
+        '''Runs the operations of a feed and joins the results.'''
+        ret = []
+        for f in feeds:
+            harmless = self._harmless(f)
+            result = self._eat_one(f)
+            if tx is not None and not harmless and self._failure(result):
+                tx.fail(result)
+            ret.append(str(result) + " ")
+        return "".join(ret)
+
+    def _eat_one(self, f: dict):
+        '''Runs one operation of a feed, timed when there are metrics.'''
+        if self.metrics is None:
+            return self._feedeaters[f["operation"]](f)
+        start = time.perf_counter()
+        try:
+            return self._feedeaters[f["operation"]](f)
+        finally:
+            self.metrics.feed_operation(f["operation"], time.perf_counter() - start)
+
+    def _harmless(self, f: dict) -> bool:
+        '''True if the operation fails without harm when it fails, asked
+        before it runs. Only dropping a table that is not there.'''
+        return f["operation"] == "drop" and not self.catalog.has_table(f["table"])
+
+    @staticmethod
+    def _failure(result) -> bool:
+        '''True if an operation result is False or an error message.'''
+        if type(result)==list:
+            return any(BassFeeder._failure(r) for r in result)
+        return result is False or (type(result)==str and "Error" in result)
+
+    '''Helpers shared by databass and DataBassLite'''
+    def _complain(self, message: str) -> None:
+        '''Tells about a bad table, column or argument. databass only returns
+        False, DataBassLite prints it.'''
+
+    def _known(self, table: str, columns: list) -> bool:
+        '''Checks that the table and the columns exist.'''
+        tablecolumns = self.catalog.columns(table)
+        if tablecolumns is None:
+            self._complain("table {} not in database".format(table))
+            return False
+        for column in columns:
+            if column not in tablecolumns:
+                self._complain("column {} not in table {}".format(column, table))
+                return False
+        return True
+
+    @staticmethod
+    def _runs(data: list):
+        '''Splits a list of dictionaries in to runs of consecutive rows with the
+        same columns. Yields (columns, rows). The order of the rows is kept so
+        that later rows still win over earlier ones.'''
+        columns, rows = None, []
+        for row in data:
+            keys = tuple(row.keys())
+            if keys != columns and rows:
+                yield columns, rows
+                rows = []
+            columns = keys
+            rows.append(row)
+        if rows:
+            yield columns, rows
+
+    def _scan(self, rows: list, table: str, batch_size: int, where: dict, wherenot: dict,
+              columns: list, layout: str, keys: list) -> Iterator:
+        '''The pages of scan(), starting with the first one.'''
+        while rows:
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after = keyset(keys, [rows[-1][key] for key in keys])
+            rows = self._select(table, {"$and": [where, after]} if where else after,
+                                wherenot, columns, layout, keys, batch_size)
+            if type(rows)!=list:
+                raise ValueError(rows if type(rows)==str else "Scan of table {} failed".format(table))
+
+    def _progress(self, progress: Union[Callable, None], rows: int, start: float) -> None:
+        '''Reports rows and rows per second to the progress callback.'''
+        seconds = time.monotonic() - start
+        rate = rows / seconds if seconds > 0 else 0.0
+        if progress is not None:
+            progress(rows, rate)
+        if self.verbose:
+            print("loaded {} rows, {:.0f} rows/s".format(rows, rate))
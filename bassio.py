@@ -0,0 +1,143 @@
+'''Export and import of whole tables, for databass and DataBassLite.
+
+    db.export("users", "users.ndjson.gz")
+    other.import_("users.ndjson.gz", "users")
+
+Formats:
+
+    ndjson      one JSON object per row and line.
+    csv         a header with the columns, then one line per row. NULL is
+                written as \\N, as MariaDB's LOAD DATA does.
+    bassfeed    a bassfeed with one insupd per batch of rows, which EatFeed()
+                also takes.
+
+Without format it is taken from the file name: .ndjson or .jsonl, .csv, and
+.json or .bassfeed. A file name ending in .gz is gzipped, unless compress
+says otherwise.
+
+export() reads the table with scan(), in primary key order, batch_size rows
+at a time. import_() reads the file a row or an operation at a time and
+writes with bulk_load(), the fastest way in each backend, or for a bassfeed
+with the feed eaters, batch by batch in their own transactions. Neither ever
+holds more than a batch in memory. progress(rows, rows_per_second) is
+called after each batch.
+'''
+import csv
+import gzip
+import json
+import time
+from typing import Callable, Iterator, Union
+from bassresult import json_default
+
+FORMATS = ("ndjson", "csv", "bassfeed")
+_EXTENSIONS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv", ".json": "bassfeed", ".bassfeed": "bassfeed"}
+_NULL = "\\N"
+
+
+def file_format(path: str, format: Union[str, None] = None, compress: Union[bool, None] = None) -> tuple:
+    '''Returns (format, compress) for a file, from the file name where not given.'''
+    name = path.lower()
+    if compress is None:
+        compress = name.endswith(".gz")
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if format is None:
+        format = next((f for extension, f in _EXTENSIONS.items() if name.endswith(extension)), None)
+        if format is None:
+            raise ValueError("Can not tell the format of {}, give format as one of {}".format(path, FORMATS))
+    if format not in FORMATS:
+        raise ValueError("Unknown format {}, use one of {}".format(format, FORMATS))
+    return format, compress
+
+
+def _open(path: str, mode: str, compress: bool):
+    '''Opens a text file, gzipped or not.'''
+    if compress:
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _report(progress: Union[Callable, None], rows: int, start: float) -> dict:
+    seconds = time.monotonic() - start
+    rate = rows / seconds if seconds > 0 else 0.0
+    if progress is not None:
+        progress(rows, rate)
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rate}
+
+
+def export_table(db, table: str, path: str, format: Union[str, None] = None,
+                 compress: Union[bool, None] = None, batch_size: int = 10000,
+                 progress: Union[Callable, None] = None) -> dict:
+    '''Writes a table to a file. Returns {"rows": ..., "seconds": ...,
+    "rows_per_second": ...}. Raises ValueError if the table can not be
+    scanned.'''
+    format, compress = file_format(path, format, compress)
+    columns = db.catalog.columns(table)
+    if columns is None:
+        raise ValueError("Table {} not in database".format(table))
+    pages = db.scan(table, batch_size)
+    if not isinstance(pages, Iterator):
+        raise ValueError("Can not scan table {}: {}".format(table, pages))
+    start = time.monotonic()
+    rows = 0
+    with _open(path, "w", compress) as f:
+        if format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(columns)
+        elif format == "bassfeed":
+            f.write('{"bassfeed": [')
+        for page in pages:
+            if format == "ndjson":
+                f.write("".join(json.dumps(dict(row), default=json_default) + "\n" for row in page))
+            elif format == "csv":
+                writer.writerows([_NULL if row[c] is None else row[c] for c in columns] for row in page)
+            else:
+                f.write((",\n" if rows else "\n") + json.dumps(db.FeedInsupd(table, [dict(row) for row in page]),
+                                                               default=json_default))
+            rows += len(page)
+            _report(progress, rows, start)
+        if format == "bassfeed":
+            f.write("\n]}\n")
+    return _report(None, rows, start)
+
+
+def import_table(db, path: str, table: str, format: Union[str, None] = None,
+                 compress: Union[bool, None] = None, batch_size: int = 10000,
+                 progress: Union[Callable, None] = None) -> Union[dict, bool, str]:
+    '''Reads a file from export_table() in to a table that already exists.
+    The operations of a bassfeed are written to table whatever table they
+    were made for. Returns what bulk_load() returns, or the same kind of
+    dictionary for a bassfeed.'''
+    format, compress = file_format(path, format, compress)
+    if format == "bassfeed":
+        return _import_feed(db, path, table, compress, progress)
+    with _open(path, "r", compress) as f:
+        if format == "ndjson":
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = ({column: None if value == _NULL else value for column, value in row.items()}
+                    for row in csv.DictReader(f))
+        return db.bulk_load(table, rows, batch_size, progress)
+
+
+def _import_feed(db, path: str, table: str, compress: bool, progress: Union[Callable, None]) -> dict:
+    # Not at the top, bassfeed imports this module.
+    from bassfeed import read_feed
+    start = time.monotonic()
+    rows = 0
+    errors = []
+    with (gzip.open(path, "rb") if compress else open(path, "rb")) as f:
+        for operation in read_feed(f):
+            if "table" in operation:
+                operation = dict(operation, table=table)
+            with db.transaction():
+                result = db._eat_one(operation)
+            if db._failure(result):
+                errors.append(result)
+            data = operation.get("data", [])
+            rows += len(data) if isinstance(data, list) else 1
+            _report(progress, rows, start)
+    ret = _report(None, rows, start)
+    if errors:
+        ret["errors"] = errors
+    return ret
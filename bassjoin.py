@@ -0,0 +1,143 @@
+'''JOINs described with dictionaries, shared by databass and DataBassLite.
+
+    db.join("orders",
+            [{"table": "customers", "on": {"customer": "id"}},
+             {"table": "products", "on": {"product": "id"}, "type": "left"}],
+            columns={"orders": ["id", "amount"], "customers": {"name": "customer"}},
+            where={"customers.country": "SE", "amount": {">": 100}},
+            orderby="-amount", limit=10)
+
+The first table is the base table. Each joined table is a dictionary:
+
+    table:  the table to join.
+    as:     a name for it, needed when the same table is joined twice.
+    on:     {column: column in this table}. The column on the left is in
+            the base table, or "table.column" for a table joined before.
+    type:   "inner", the default, or "left".
+
+columns says what to get, {table: list of columns} or {table: {column:
+name in the result}}. Without it every column of every table is returned,
+named "column" when only one table has it and "table.column" when several
+do. where and wherenot take the conditions from basswhere, with "column"
+for the base table and "table.column" for the others. orderby is written
+the same way, "-column" sorts descending.
+
+Everything is checked against the schema and turned in to one SELECT with
+placeholders, so the join runs in the database.
+'''
+import re
+from typing import Callable, Union
+from basswhere import compile_where, qualify, quote, where_columns
+
+JOINTYPES = {"inner": "JOIN", "left": "LEFT JOIN"}
+# The names "as" and the column names in the result can have, the same as
+# DataBassLite.create() allows for tables and columns.
+NAME = re.compile("[a-zA-Z0-9_ ]+")
+
+
+def compile_join(table: str, joins: list, columns: Union[dict, None] = None, where: dict = {},
+                 wherenot: dict = {}, orderby: Union[str, list, None] = None,
+                 limit: Union[int, None] = None, describe: Callable = None,
+                 placeholder: str = "%s") -> tuple:
+    '''Returns (sql, values) for a join. describe(table) returns the columns
+    of a table, or None if there is no such table. Raises ValueError on
+    anything that does not match the schema.'''
+    known = {table: _describe(describe, table)}
+    clauses = []
+    for join in joins:
+        other = join.get("table")
+        name = join.get("as", other)
+        if "as" in join:
+            _name(name)
+        if name in known:
+            raise ValueError('{} is joined twice, give it a name with "as"'.format(name))
+        kind = JOINTYPES.get(str(join.get("type", "inner")).lower())
+        if kind is None:
+            raise ValueError("Unknown join type {}".format(join.get("type")))
+        on = join.get("on")
+        if not on:
+            raise ValueError("Join of {} needs on".format(name))
+        othercolumns = _describe(describe, other)
+        conditions = []
+        for left, right in on.items():
+            left = _column(known, left if "." in left else table + "." + left)
+            right = _column({name: othercolumns}, name + "." + right)
+            conditions.append("{} = {}".format(quote(left), quote(right)))
+        known[name] = othercolumns
+        clauses.append(" {} `{}`{} ON {}".format(kind, other, "" if name == other else " AS `{}`".format(name),
+                                                 " AND ".join(conditions)))
+
+    selected = []
+    if columns is None:
+        seen = {}
+        for name in known:
+            for column in known[name]:
+                seen[column] = seen.get(column, 0) + 1
+        for name in known:
+            for column in known[name]:
+                selected.append((name + "." + column, column if seen[column] == 1 else name + "." + column))
+    else:
+        for name, wanted in columns.items():
+            if name not in known:
+                raise ValueError("Table {} is not in the join".format(name))
+            if isinstance(wanted, dict):
+                wanted = {column: _name(alias) for column, alias in wanted.items()}
+            else:
+                wanted = {column: column for column in (known[name] if wanted == ["*"] else wanted)}
+            for column, alias in wanted.items():
+                selected.append((_column(known, name + "." + column), alias))
+    aliases = [alias for column, alias in selected]
+    for alias in aliases:
+        if aliases.count(alias) > 1:
+            raise ValueError("Two columns are called {} in the result".format(alias))
+
+    where = qualify(where, table)
+    wherenot = qualify(wherenot, table)
+    for column in where_columns(where, wherenot):
+        _column(known, column)
+    conditions, values = compile_where(where, wherenot, placeholder)
+
+    if isinstance(orderby, str):
+        orderby = [orderby]
+    order = []
+    for column in orderby or []:
+        descending = column.startswith("-")
+        column = column.lstrip("-")
+        column = _column(known, column if "." in column else table + "." + column)
+        order.append(quote(column) + (" DESC" if descending else ""))
+
+    sql = "SELECT {} FROM `{}`{}".format(
+        ", ".join("{} AS `{}`".format(quote(column), alias) for column, alias in selected),
+        table, "".join(clauses))
+    if conditions:
+        sql += " WHERE " + conditions
+    if order:
+        sql += " ORDER BY " + ", ".join(order)
+    if limit is not None:
+        sql += " LIMIT " + placeholder
+        values += (int(limit),)
+    return sql, values
+
+
+def _describe(describe: Callable, table: str) -> list:
+    columns = describe(table)
+    if not columns:
+        raise ValueError("Table {} not in database".format(table))
+    return columns
+
+
+def _name(name) -> str:
+    '''Checks a name given for a table or a column in the result.'''
+    if not isinstance(name, str) or not NAME.fullmatch(name):
+        raise ValueError("{!r} is not allowed as a name".format(name))
+    return name
+
+
+def _column(known: dict, column: str) -> str:
+    '''Checks that "table.column" is in the join and returns it.'''
+    name, _, field = column.partition(".")
+    if name not in known:
+        raise ValueError("Table {} is not in the join".format(name))
+    if field not in known[name]:
+        raise ValueError("Column {} not in table {}".format(field, name))
+    return column
@@ -0,0 +1,185 @@
+'''Change journal for databass and DataBassLite.
+
+    db = DataBassLite("master.db", journal=BassJournal())
+    db.insert("users", {"id": 1, "name": "Anna"})
+    ...
+    feed = db.feed_since(seq)          # on the master
+    replica.EatFeed(feed)              # on the replica
+    seq = json.loads(feed)["seq"]      # where to continue next time
+
+Every successful write through the library, create, AlterTable, drop,
+insert, insupd, update, delete, clear and bulk_load, and so the feed eaters
+too, is written as its bassfeed operation to a journal table in the same
+database, numbered by an ever increasing seq. The write and its journal
+entry are one transaction, so a rolled back write leaves no entry.
+feed_since(seq) turns everything after seq in to one feed, made smaller by
+OptimizeFeed(), so a replica catches up in time proportional to what
+changed instead of to the size of the tables.
+
+SQL written by hand through run() is not journaled.
+
+Rows given as a generator, as to bulk_load(), are journaled a chunk at a
+time while the write reads them, so they are never all in memory. Such a
+write is rolled back as a whole if it fails part way, also the chunks
+already written. With several threads writing through a pool the
+entries are numbered in the order the writes are made. Writes made outside
+of transaction() are serialized so that this is also the order they are
+committed in.
+'''
+import functools
+import inspect
+import json
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import nullcontext
+from bassfeed import optimize
+from bassmetrics import internal
+from bassresult import json_default
+
+JOURNAL = "bass_journal"
+# Rows per journal entry for rows that come as a stream.
+CHUNK = 10000
+
+_TABLES = {
+    "mariadb": """CREATE TABLE IF NOT EXISTS `{}` (
+                    `seq` BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                    `time` DOUBLE NOT NULL,
+                    `operation` LONGTEXT NOT NULL)""",
+    # AUTOINCREMENT so that a seq is never used again, not even after truncate().
+    "sqlite": """CREATE TABLE IF NOT EXISTS `{}` (
+                    `seq` INTEGER PRIMARY KEY AUTOINCREMENT,
+                    `time` REAL NOT NULL,
+                    `operation` TEXT NOT NULL)""",
+}
+
+
+class BassJournal:
+    '''The journal of one database.'''
+
+    def __init__(self, table: str = JOURNAL):
+        '''table: the table the journal is kept in, made if it is missing.'''
+        self.table = table
+        self.db = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def attach(self, db) -> None:
+        '''Starts journaling the writes to db. Done by the constructors when
+        they get journal=.'''
+        self.db = db
+        db._run(_TABLES[db._dialect].format(self.table))
+        db.journal = self
+
+    def record(self, operation: dict) -> None:
+        '''Adds one bassfeed operation to the journal.'''
+        with internal(self.db):
+            self.db._run("INSERT INTO `{}` (`time`, `operation`) VALUES ({p}, {p})".format(self.table, p=self.db._placeholder),
+                         (time.time(), json.dumps(operation, default=json_default)))
+
+    def last(self) -> int:
+        '''Returns the seq of the latest entry, 0 for an empty journal.'''
+        rows = self.db._run("SELECT MAX(`seq`) AS `seq` FROM `{}`".format(self.table))
+        return (rows[0]["seq"] or 0) if rows else 0
+
+    def since(self, seq: int = 0) -> tuple:
+        '''Returns (operations, last) for the entries after seq, last being the
+        seq of the newest of them, or seq itself when there are none.'''
+        rows = self.db._run("SELECT `seq`, `operation` FROM `{}` WHERE `seq` > {} ORDER BY `seq`".format(
+                            self.table, self.db._placeholder), (seq,))
+        if not rows:
+            return [], seq
+        return [json.loads(row["operation"]) for row in rows], rows[-1]["seq"]
+
+    def feed(self, seq: int = 0, compact: bool = True) -> str:
+        '''Returns a bassfeed with the changes after seq and the key "seq" for
+        the next call. compact runs it through bassfeed.optimize().'''
+        operations, last = self.since(seq)
+        if compact:
+            operations = optimize(operations, self.db.catalog.primary_keys)[0]
+        return json.dumps({"bassfeed": operations, "seq": last}, default=json_default)
+
+    def truncate(self, seq: int) -> None:
+        '''Forgets the entries up to and including seq, once every replica has them.'''
+        self.db._run("DELETE FROM `{}` WHERE `seq` <= {}".format(self.table, self.db._placeholder), (seq,))
+
+
+def journaled(feedmaker: str, *parameters: str):
+    '''Decorator for methods that write. The write is journaled as
+    getattr(self, feedmaker)(*arguments), the arguments being those of the
+    parameters given, when it succeeds. An argument that is an iterator, like
+    a generator, is a stream of rows and is journaled a chunk at a time,
+    chunksize rows if the method has that parameter.'''
+    def decorate(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            journal = self.journal
+            if journal is None or getattr(journal._local, "busy", False):
+                return method(self, *args, **kwargs)
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = [bound.arguments[name] for name in parameters]
+
+            def record(values: list) -> None:
+                journal.record(getattr(self, feedmaker)(*values))
+
+            taps = []
+            for i, name in enumerate(parameters):
+                if isinstance(arguments[i], Iterator):
+                    tap = _Tap(arguments[i], bound.arguments.get("chunksize", CHUNK),
+                               lambda rows, i=i: record(arguments[:i] + [rows] + arguments[i+1:]))
+                    bound.arguments[name] = tap
+                    taps.append(tap)
+            journal._local.busy = True
+            try:
+                # Strict with streams, a failure has to take back the chunks already journaled.
+                with _ordered(self, journal), self.transaction(strict=taps != []) as tx:
+                    result = method(*bound.args, **bound.kwargs)
+                    if result is None or self._failure(result):
+                        tx.fail(result)
+                    elif taps:
+                        for tap in taps:
+                            tap.flush()
+                    else:
+                        record(arguments)
+            finally:
+                journal._local.busy = False
+            return result
+        return wrapper
+    return decorate
+
+
+class _Tap:
+    '''An iterator over a stream of rows that journals them a chunk at a time
+    as they are read.'''
+
+    def __init__(self, rows, size: int, record):
+        self._rows = iter(rows)
+        self._size = size
+        self._record = record
+        self._chunk = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._rows)
+        self._chunk.append(row)
+        if len(self._chunk) >= self._size:
+            self.flush()
+        return row
+
+    def flush(self) -> None:
+        '''Journals the rows read since the last chunk.'''
+        if self._chunk:
+            self._record(self._chunk)
+            self._chunk = []
+
+
+def _ordered(db, journal: BassJournal):
+    '''The journal lock outside of transactions, so that seq order is commit order.'''
+    if db._top_transaction() is None:
+        return journal._lock
+    return nullcontext()
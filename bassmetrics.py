@@ -0,0 +1,219 @@
+'''Metrics for databass and DataBassLite.
+
+    metrics = BassMetrics(slow=0.5)
+    db = DataBassLite("file.db", metrics=metrics)
+    ...
+    print(metrics.stats())
+    print(list(metrics.slowlog))
+
+What is measured:
+
+    calls       per public method: number of calls, seconds and rows. A call
+                that makes other calls, like insupd() calling insupdmany(),
+                is counted once. The generators of irun(), scan() and the
+                like count as part of the call while they are read, the
+                calls they make then are not counted on their own. Rows
+                written to the journal and checkpoints are not counted as
+                rows of the call that writes them.
+    queries     every SQL statement: number, seconds, rows returned or
+                affected and bytes of SQL. The ones the schema catalog makes
+                for tables() and colums(), columns() in DataBassLite, are
+                also counted as metadata.
+    feed        per feed operation: number and seconds.
+    slowlog     the latest statements slower than slow seconds.
+
+Callbacks get every measurement as a dictionary with "kind" set to "call",
+"query" or "feed", to send on to any other metrics system.
+
+Without metrics nothing is wrapped and every measuring point is a single
+"is None" check, so it costs next to nothing.
+'''
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterable
+
+# Public methods that are not worth timing.
+_SKIP = ("transaction", "batch", "close")
+
+
+class BassMetrics:
+    '''Counters, timings and a slow query log for one or more databases.'''
+
+    def __init__(self, slow: float = 1.0, slowlog: int = 100, callbacks: Iterable = ()):
+        '''slow:      seconds a statement takes to end up in the slow log.
+        slowlog:   the number of slow statements kept.
+        callbacks: functions called with every measurement.'''
+        self.slow = slow
+        self.slowlog = deque(maxlen=slowlog)
+        self.callbacks = list(callbacks)
+        self.callback_errors = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        '''Sets all counters to zero and empties the slow log.'''
+        with self._lock:
+            self.calls = {}         # method -> [calls, seconds, rows]
+            self.feed = {}          # operation -> [count, seconds]
+            self.queries = 0
+            self.query_seconds = 0.0
+            self.query_rows = 0
+            self.sql_bytes = 0
+            self.metadata = 0
+            self.slowlog.clear()
+
+    def add_callback(self, callback: Callable) -> None:
+        '''callback(measurement) is called after every call, query and feed operation.'''
+        self.callbacks.append(callback)
+
+    def attach(self, db) -> None:
+        '''Starts measuring the public methods of db. Done by the constructors
+        when they get metrics=.'''
+        db.metrics = self
+        for name in dir(type(db)):
+            if name.startswith("_") or name in _SKIP:
+                continue
+            method = getattr(db, name)
+            if callable(method):
+                setattr(db, name, self._wrap(name, method))
+
+    def detach(self, db) -> None:
+        '''Stops measuring db.'''
+        for name in list(vars(db)):
+            if getattr(getattr(db, name), "_bassmetrics", None) is self:
+                delattr(db, name)
+        db.metrics = None
+
+    def _wrap(self, name: str, method: Callable) -> Callable:
+        def measured(*args, **kwargs):
+            if getattr(self._local, "depth", 0):
+                # Made by another measured call, which counts it.
+                return method(*args, **kwargs)
+            result = self._measure(name, True, method, *args, **kwargs)
+            if isinstance(result, types.GeneratorType):
+                return self._follow(name, result)
+            return result
+        measured._bassmetrics = self
+        measured.__name__ = name
+        measured.__doc__ = method.__doc__
+        return measured
+
+    def _measure(self, name: str, call: bool, function: Callable, *args, **kwargs):
+        '''Runs function as the public method name. call is False for the steps
+        of a generator, which add to the seconds and rows of the call.'''
+        local = self._local
+        local.depth = 1
+        local.method = name
+        local.rows = 0
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            rows = local.rows
+            local.depth = 0
+            local.method = None
+            with self._lock:
+                counts = self.calls.setdefault(name, [0, 0.0, 0])
+                counts[0] += 1 if call else 0
+                counts[1] += seconds
+                counts[2] += rows
+            if call:
+                self._emit({"kind": "call", "method": name, "seconds": seconds, "rows": rows})
+
+    def _follow(self, name: str, generator: types.GeneratorType) -> types.GeneratorType:
+        '''Yields from a generator returned by a public method and measures
+        every step as part of that method.'''
+        try:
+            while True:
+                try:
+                    if getattr(self._local, "depth", 0):
+                        item = next(generator)
+                    else:
+                        item = self._measure(name, False, next, generator)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            generator.close()
+
+    @contextmanager
+    def internal(self):
+        '''Statements made in the with block are counted as queries but their
+        rows are not added to the call they are made in. For the journal and
+        the checkpoints.'''
+        local = self._local
+        local.internal = getattr(local, "internal", 0) + 1
+        try:
+            yield
+        finally:
+            local.internal -= 1
+
+    def query(self, sql: str, seconds: float, rows: int, metadata: bool = False) -> None:
+        '''Records one SQL statement.'''
+        size = len(sql.encode("utf-8"))
+        method = getattr(self._local, "method", None)
+        if method is not None and not metadata and not getattr(self._local, "internal", 0):
+            self._local.rows += rows
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            self.query_rows += rows
+            self.sql_bytes += size
+            if metadata:
+                self.metadata += 1
+            if seconds >= self.slow:
+                self.slowlog.append({"sql": sql, "seconds": seconds, "rows": rows,
+                                     "method": method, "time": time.time()})
+        self._emit({"kind": "query", "sql": sql, "seconds": seconds, "rows": rows,
+                    "bytes": size, "metadata": metadata, "method": method})
+
+    def feed_operation(self, operation: str, seconds: float) -> None:
+        '''Records one eaten feed operation.'''
+        with self._lock:
+            counts = self.feed.setdefault(operation, [0, 0.0])
+            counts[0] += 1
+            counts[1] += seconds
+        self._emit({"kind": "feed", "operation": operation, "seconds": seconds})
+
+    def _emit(self, measurement: dict) -> None:
+        for callback in self.callbacks:
+            try:
+                callback(measurement)
+            except Exception:
+                # A broken exporter must not break the database calls.
+                self.callback_errors += 1
+
+    def stats(self) -> dict:
+        '''Returns everything measured so far.'''
+        with self._lock:
+            return {
+                "calls": {name: {"calls": c[0], "seconds": c[1], "rows": c[2]} for name, c in self.calls.items()},
+                "feed": {name: {"count": c[0], "seconds": c[1]} for name, c in self.feed.items()},
+                "queries": self.queries, "query seconds": self.query_seconds, "rows": self.query_rows,
+                "sql bytes": self.sql_bytes, "metadata queries": self.metadata,
+                "slow queries": len(self.slowlog), "callback errors": self.callback_errors,
+            }
+
+
+def rowcount(result) -> int:
+    '''Number of rows in a result, or the affected rows when it is an int.'''
+    if isinstance(result, bool) or result is None:
+        return 0
+    if isinstance(result, int):
+        return max(result, 0)
+    if isinstance(result, dict):
+        return len(next(iter(result.values()), ()))
+    try:
+        return len(result)
+    except TypeError:
+        return 0
+
+
+def internal(db):
+    '''BassMetrics.internal() of db, or nothing when db has no metrics.'''
+    return nullcontext() if db.metrics is None else db.metrics.internal()
@@ -0,0 +1,349 @@
+'''Packed bassfeeds, a compact binary alternative to the JSON bassfeed.
+
+A JSON feed repeats every column name in every row. A packed feed stores the
+columns of an insert or insupd once and the values column by column, each
+column with its own encoding:
+
+    q   64 bit integers          d   64 bit floats
+    s   UTF-8 strings            j   JSON, for anything else
+
+None is kept in a bitmap next to the column. Operations are grouped in to
+blocks that are compressed with zlib or lzma, or stored as they are. Stored
+blocks are read straight out of a memoryview or mmap of the file without
+copying.
+
+Layout, all numbers little endian:
+
+    b"BASSPACK" version(1 byte) header length(4) header(JSON)
+    block*: compression(1) raw length(4) stored length(4) data
+    end:    255
+
+Block data is a series of operations:
+
+    0 length(4) JSON                           any other operation
+    1 length(4) JSON(meta) column*             insert and insupd with rows
+    column: encoding(1) has nulls(1) [null bitmap] values
+'''
+import io
+import json
+import lzma
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from typing import Iterable, Union
+from bassresult import Row, json_default
+
+MAGIC = b"BASSPACK"
+VERSION = 1
+
+_STORED, _ZLIB, _LZMA, _END = 0, 1, 2, 255
+_COMPRESSIONS = {None: _STORED, "none": _STORED, "zlib": _ZLIB, "lzma": _LZMA}
+_JSON_OP, _ROWS_OP = 0, 1
+_BLOCK = struct.Struct("<BII")
+_LENGTH = struct.Struct("<I")
+_SWAP = sys.byteorder == "big"
+
+
+def _nulls(values: list) -> bytes:
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is None:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+def _numbers(typecode: str, values: list) -> bytes:
+    numbers = array(typecode, values)
+    if _SWAP:
+        numbers.byteswap()
+    return numbers.tobytes()
+
+
+def _encode_column(values: list) -> bytes:
+    '''Encodes the values of one column.'''
+    kinds = {type(value) for value in values if value is not None}
+    nulls = _nulls(values) if None in values else None
+    nullhead = b"\x00" if nulls is None else b"\x01" + nulls
+    if kinds <= {int} and all(-2**63 <= value < 2**63 for value in values if value is not None):
+        return b"q" + nullhead + _numbers("q", [0 if value is None else value for value in values])
+    if kinds == {float}:
+        return b"d" + nullhead + _numbers("d", [0.0 if value is None else value for value in values])
+    if kinds == {str}:
+        encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+        ends, end = [], 0
+        for value in encoded:
+            end += len(value)
+            ends.append(end)
+        return b"s" + nullhead + _numbers("I", ends) + b"".join(encoded)
+    data = json.dumps(values, default=json_default).encode("utf-8")
+    return b"j\x00" + _LENGTH.pack(len(data)) + data
+
+
+def _encode(operation: dict) -> bytes:
+    '''Encodes one operation.'''
+    data = operation.get("data")
+    single = isinstance(data, (dict, Row))
+    rows = [data] if single else data
+    if (operation.get("operation") in ("insert", "insupd") and isinstance(rows, list) and rows
+            and all(isinstance(row, (dict, Row)) for row in rows)):
+        columns = list(rows[0])
+        if all(len(row) == len(columns) and all(c in row for c in columns) for row in rows):
+            meta = {key: value for key, value in operation.items() if key != "data"}
+            meta["columns"] = columns
+            meta["rows"] = len(rows)
+            meta["single"] = single
+            meta = json.dumps(meta).encode("utf-8")
+            return b"".join([bytes([_ROWS_OP]), _LENGTH.pack(len(meta)), meta] +
+                            [_encode_column([row[c] for row in rows]) for c in columns])
+    data = json.dumps(operation, default=json_default).encode("utf-8")
+    return bytes([_JSON_OP]) + _LENGTH.pack(len(data)) + data
+
+
+class PackWriter:
+    '''Writes a packed feed one operation at a time, like bassfeed.FeedWriter.
+
+        with PackWriter("feed.bass", compression="lzma") as feed:
+            feed.write(db.FeedInsupd("table", rows))
+
+    target is a file name, a binary file-like object or a socket.
+    compression: "zlib", "lzma" or "none". Only "none" can be read without copying.
+    blocksize: bytes of encoded operations collected before a block is written.
+    blockrows: inserts and insupds with more rows than this are split in to
+    several operations, so that no single block gets too big.
+    '''
+
+    def __init__(self, target, header: dict = {}, compression: Union[str, None] = "zlib",
+                 blocksize: int = 1 << 20, blockrows: int = 65536):
+        if compression not in _COMPRESSIONS:
+            raise ValueError("Unknown compression {}".format(compression))
+        self._compression = _COMPRESSIONS[compression]
+        self._opened = isinstance(target, str)
+        self._target = open(target, "wb") if self._opened else target
+        self._write = self._target.sendall if hasattr(self._target, "sendall") else self._target.write
+        self.blocksize = blocksize
+        self.blockrows = blockrows
+        self.count = 0
+        self._block = []
+        self._size = 0
+        self._closed = False
+        header = json.dumps({key: header[key] for key in header if key != "bassfeed"}).encode("utf-8")
+        self._write(MAGIC + bytes([VERSION]) + _LENGTH.pack(len(header)) + header)
+
+    def write(self, operation: dict) -> None:
+        '''Appends one operation to the feed.'''
+        data = operation.get("data")
+        if isinstance(data, list) and len(data) > self.blockrows:
+            for start in range(0, len(data), self.blockrows):
+                self.write(dict(operation, data=data[start:start + self.blockrows]))
+            return
+        encoded = _encode(operation)
+        self._block.append(encoded)
+        self._size += len(encoded)
+        self.count += 1
+        if self._size >= self.blocksize:
+            self._flush()
+
+    def writemany(self, operations: Iterable) -> None:
+        '''Appends all operations from an iterable.'''
+        for operation in operations:
+            self.write(operation)
+
+    def _flush(self) -> None:
+        if not self._block:
+            return
+        raw = b"".join(self._block)
+        if self._compression == _ZLIB:
+            stored = zlib.compress(raw, 6)
+        elif self._compression == _LZMA:
+            stored = lzma.compress(raw)
+        else:
+            stored = raw
+        self._write(_BLOCK.pack(self._compression, len(raw), len(stored)))
+        self._write(stored)
+        self._block = []
+        self._size = 0
+
+    def close(self) -> None:
+        '''Ends the feed. A file opened by the writer is also closed.'''
+        if self._closed:
+            return
+        self._closed = True
+        self._flush()
+        self._write(bytes([_END]))
+        if self._opened:
+            self._target.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.close()
+
+
+def pack(feeds: Iterable, header: dict = {}, compression: Union[str, None] = "zlib") -> bytes:
+    '''Returns a list of feed operations as a packed feed.'''
+    buffer = io.BytesIO()
+    with PackWriter(buffer, header, compression) as writer:
+        writer.writemany(feeds)
+    return buffer.getvalue()
+
+
+def is_packed(data) -> bool:
+    '''True if the bytes, memoryview or mmap starts like a packed feed.'''
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+class PackReader:
+    '''Reads the operations of a packed feed one at a time:
+
+        for operation in PackReader("feed.bass"):
+            ...
+
+    The source can be a file name, which is memory mapped, bytes, a
+    memoryview, an mmap or a binary file-like object. Stored blocks are
+    decoded straight from the memory of the source, compressed blocks are
+    decompressed one at a time. The header is in self.header.
+    '''
+
+    def __init__(self, source):
+        self._file = None
+        self._mmap = None
+        self._stream = None
+        if isinstance(source, str):
+            self._file = open(source, "rb")
+            source = self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(source, "read") and not isinstance(source, mmap.mmap):
+            self._stream = source
+            self._view = None
+        else:
+            self._view = memoryview(source)
+        self._pos = 0
+        try:
+            if self._take(len(MAGIC)) != MAGIC:
+                raise ValueError("Not a packed bassfeed")
+            version = self._take(1)[0]
+            if version > VERSION:
+                raise ValueError("Packed bassfeed version {} is newer than {}".format(version, VERSION))
+            length, = _LENGTH.unpack(self._take(4))
+            self.header = json.loads(bytes(self._take(length)).decode("utf-8"))
+        except ValueError:
+            self.close()
+            raise
+
+    def _take(self, length: int):
+        '''Returns the next length bytes of the source, as a view when possible.'''
+        if self._stream is not None:
+            data = self._stream.read(length)
+            if len(data) < length:
+                raise ValueError("Packed bassfeed ends too early")
+            return memoryview(data)
+        data = self._view[self._pos:self._pos + length]
+        if len(data) < length:
+            # The traceback would keep the view, and with it the mmap, alive.
+            data.release()
+            raise ValueError("Packed bassfeed ends too early")
+        self._pos += length
+        return data
+
+    def __iter__(self):
+        block = None
+        try:
+            while True:
+                compression = self._take(1)[0]
+                if compression == _END:
+                    return
+                raw, stored = _LENGTH.unpack(self._take(4))[0], _LENGTH.unpack(self._take(4))[0]
+                block = self._take(stored)
+                if compression == _ZLIB:
+                    block = memoryview(zlib.decompress(block))
+                elif compression == _LZMA:
+                    block = memoryview(lzma.decompress(block))
+                elif compression != _STORED:
+                    raise ValueError("Unknown compression {}".format(compression))
+                if len(block) != raw:
+                    raise ValueError("Broken block in packed bassfeed")
+                yield from _decode_block(block)
+        finally:
+            # Views in to an mmap have to be gone before it can be closed.
+            block = None
+            self.close()
+
+    def close(self) -> None:
+        '''Closes the file if the reader opened it.'''
+        if self._file is not None:
+            self._view.release()
+            self._mmap.close()
+            self._file.close()
+            self._file = None
+
+
+def _numbers_from(view, typecode: str, count: int) -> list:
+    if _SWAP:
+        numbers = array(typecode, bytes(view))
+        numbers.byteswap()
+        return numbers.tolist()
+    return view.cast(typecode).tolist() if count else []
+
+
+def _decode_block(block: memoryview):
+    '''Yields the operations in one block.'''
+    pos = 0
+    end = len(block)
+    while pos < end:
+        kind = block[pos]
+        length, = _LENGTH.unpack(block[pos + 1:pos + 5])
+        pos += 5
+        data = json.loads(str(block[pos:pos + length], "utf-8"))
+        pos += length
+        if kind == _JSON_OP:
+            yield data
+            continue
+        count = data.pop("rows")
+        columns = data.pop("columns")
+        single = data.pop("single")
+        values = []
+        for column in columns:
+            pos, column_values = _decode_column(block, pos, count)
+            values.append(column_values)
+        rows = [dict(zip(columns, row)) for row in zip(*values)] if columns else [{} for i in range(count)]
+        data["data"] = rows[0] if single else rows
+        yield data
+
+
+def _decode_column(block: memoryview, pos: int, count: int) -> tuple:
+    '''Decodes one column starting at pos. Returns (new pos, values).'''
+    encoding = chr(block[pos])
+    hasnulls = block[pos + 1]
+    pos += 2
+    nulls = None
+    if hasnulls:
+        size = (count + 7) // 8
+        nulls = bytes(block[pos:pos + size])
+        pos += size
+    if encoding == "q" or encoding == "d":
+        values = _numbers_from(block[pos:pos + 8 * count], encoding, count)
+        pos += 8 * count
+    elif encoding == "s":
+        ends = _numbers_from(block[pos:pos + 4 * count], "I", count)
+        pos += 4 * count
+        blob = block[pos:pos + (ends[-1] if ends else 0)]
+        pos += len(blob)
+        starts = [0] + ends[:-1]
+        text = str(blob, "utf-8")
+        if len(text) == len(blob):
+            # Only ASCII, byte offsets are character offsets.
+            values = [text[start:stop] for start, stop in zip(starts, ends)]
+        else:
+            blob = bytes(blob)
+            values = [blob[start:stop].decode("utf-8") for start, stop in zip(starts, ends)]
+    elif encoding == "j":
+        length, = _LENGTH.unpack(block[pos:pos + 4])
+        values = json.loads(str(block[pos + 4:pos + 4 + length], "utf-8"))
+        pos += 4 + length
+    else:
+        raise ValueError("Unknown column encoding {}".format(encoding))
+    if nulls is not None:
+        values = [None if nulls[i >> 3] & (1 << (i & 7)) else value for i, value in enumerate(values)]
+    return pos, values
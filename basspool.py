@@ -0,0 +1,134 @@
+'''Connection pool for databass.
+
+One MariaDB connection can only do one thing at a time. The pool keeps up to
+maxsize connections. A thread checks one out for each call, or for a whole
+transaction, and hands it back afterwards. A thread gets the connection it
+used last whenever that one is idle, so the prepared statements on it stay warm.
+Connections that have been idle for a while are pinged before they are
+handed out, and broken ones are replaced.
+'''
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Union
+
+
+class PoolTimeout(Exception):
+    '''Raised when no connection became free within the timeout.'''
+
+
+class BassPool:
+    '''A thread safe pool of database connections.'''
+
+    def __init__(self, connect: Callable, maxsize: int = 8, timeout: Union[float, None] = None,
+                 ping_after: float = 30.0, ping: Union[Callable, None] = None):
+        '''connect:    function that opens a new connection.
+        maxsize:    the most connections that will ever be open at once.
+        timeout:    seconds to wait for a free connection, None waits forever.
+        ping_after: seconds a connection can be idle before it is checked.
+        ping:       function that returns True for a working connection,
+                    by default conn.is_connected().'''
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self._connect = connect
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._ping = ping if ping is not None else lambda conn: conn.is_connected()
+        self._cond = threading.Condition()
+        self._idle = []         # [(connection, thread id of last user, time of checkin)]
+        self._broken = set()    # id() of checked out connections that should not come back
+        self._open = 0
+        self._closed = False
+
+    def checkout(self):
+        '''Returns a connection. Blocks while all maxsize connections are in use.'''
+        me = threading.get_ident()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("The pool is closed")
+                if self._idle:
+                    # Thread affinity first, otherwise the most recently used one.
+                    index = len(self._idle) - 1
+                    for i, (conn, owner, since) in enumerate(self._idle):
+                        if owner == me:
+                            index = i
+                            break
+                    conn, owner, since = self._idle.pop(index)
+                    break
+                if self._open < self.maxsize:
+                    self._open += 1
+                    conn, since = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout("No free connection within {} seconds".format(self.timeout))
+                self._cond.wait(remaining)
+        try:
+            if conn is not None and time.monotonic() - since > self.ping_after and not self._healthy(conn):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def checkin(self, conn) -> None:
+        '''Gives a connection back to the pool.'''
+        with self._cond:
+            if id(conn) in self._broken or self._closed:
+                self._broken.discard(id(conn))
+                self._open -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, threading.get_ident(), time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn) -> None:
+        '''Marks a checked out connection as broken. It is closed at checkin.'''
+        with self._cond:
+            self._broken.add(id(conn))
+
+    @contextmanager
+    def connection(self):
+        '''Checks out a connection for the duration of a with block.'''
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def close(self) -> None:
+        '''Closes the idle connections. Connections in use are closed at checkin.'''
+        with self._cond:
+            self._closed = True
+            for conn, owner, since in self._idle:
+                self._open -= 1
+                self._close(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        '''Returns the number of open, idle and used connections.'''
+        with self._cond:
+            return {"maxsize": self.maxsize, "open": self._open,
+                    "idle": len(self._idle), "in use": self._open - len(self._idle)}
+
+    def _healthy(self, conn) -> bool:
+        try:
+            return bool(self._ping(conn))
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,122 @@
+'''Other shapes for query results than a list of dictionaries.
+
+select() and run() normally give one dictionary per row. With
+layout="columns" they give one sequence per column instead:
+
+    {"id": array([1, 2, 3]), "name": ["a", "b", "c"]}
+
+The columns are built straight from the tuples the cursor returns, so no
+dictionary is ever made for a row. Numeric columns become NumPy arrays when
+NumPy is installed and array.array otherwise. Everything else, and numeric
+columns with NULLs in them, stay lists so no value is changed on the way.
+
+With layout="rows" they give a list of Row objects. A Row reads like a
+dictionary but is only the tuple from the cursor and a column index that
+all rows of the result share.
+'''
+from array import array
+from collections.abc import Mapping
+from typing import Iterable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LAYOUTS = ("dicts", "rows", "columns")
+
+
+class Row:
+    '''One row of a result, used like a read-only dictionary:
+
+        row["id"], row.get("name"), row.keys(), row.items(), dict(row)
+
+    json.dumps() does not know about it, use dict(row) or
+    default=json_default. The feed functions already do.
+    '''
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict, values: tuple):
+        '''index: {column: position in values}, shared by the whole result.'''
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, column: str):
+        return self._values[self._index[column]]
+
+    def get(self, column: str, default=None):
+        position = self._index.get(column)
+        return default if position is None else self._values[position]
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self) -> tuple:
+        return self._values
+
+    def items(self):
+        return zip(self._index, self._values)
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __contains__(self, column) -> bool:
+        return column in self._index
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Row) and other._index is self._index:
+            return self._values == other._values
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return "Row({!r})".format(dict(self.items()))
+
+
+Mapping.register(Row)
+
+
+def make_rows(names: Iterable, values: list) -> list:
+    '''Turns a list of row tuples in to a list of Row.'''
+    index = {name: position for position, name in enumerate(names)}
+    return [Row(index, row) for row in values]
+
+
+def json_default(value):
+    '''default= for json.dumps() so Row objects are written as objects.'''
+    if isinstance(value, Row):
+        return dict(value.items())
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+
+def columnar(names: Iterable, rows: list) -> dict:
+    '''Turns a list of row tuples in to {column: values}.'''
+    names = list(names)
+    columns = list(zip(*rows)) if rows else [() for name in names]
+    return {name: _array(values) for name, values in zip(names, columns)}
+
+
+def _array(values: tuple):
+    '''Returns the values of one column as the most compact sequence that holds them exactly.'''
+    kinds = {type(value) for value in values}
+    if kinds == {int}:
+        typecode = "q"
+    elif kinds == {float} or kinds == {int, float}:
+        typecode = "d"
+    elif kinds == {bool} and numpy is not None:
+        return numpy.array(values, dtype=bool)
+    else:
+        return list(values)
+    try:
+        if numpy is not None:
+            return numpy.array(values, dtype=numpy.int64 if typecode == "q" else numpy.float64)
+        return array(typecode, values)
+    except OverflowError:
+        # Integers bigger than 64 bits.
+        return list(values)
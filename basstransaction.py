@@ -0,0 +1,43 @@
+'''Bookkeeping for databass and DataBassLite transactions.
+
+A BassTransaction is what the with statement of transaction() or batch()
+gives you. It collects the database errors that happened inside the block
+and tells you afterwards if the block was committed.
+'''
+from typing import Union
+
+
+class BassTransaction:
+    '''State of one transaction() or batch() block.'''
+
+    def __init__(self, strict: bool = False, every: Union[int, None] = None):
+        '''strict: roll back at the end of the block if any statement failed,
+                not only when an exception is raised.
+        every:  commit every this many statements (batch mode).'''
+        self.strict = strict
+        self.every = every
+        self.errors = []
+        self.statements = 0
+        self.committed = False
+        # Tables written in the block, None for all of them. Used by the result cache.
+        self.tables = set()
+
+    def fail(self, error) -> None:
+        '''Records a failed statement.'''
+        self.errors.append(error)
+
+    def touch(self, tables) -> None:
+        '''Records tables written in the block, None meaning any table.'''
+        if tables is None:
+            self.tables = None
+        elif self.tables is not None:
+            self.tables.update(tables)
+
+    @property
+    def failed(self) -> bool:
+        '''True if a strict block had errors and has to be rolled back.'''
+        return self.strict and self.errors != []
+
+    def __repr__(self) -> str:
+        return "<BassTransaction statements={} errors={} committed={}>".format(
+            self.statements, len(self.errors), self.committed)
@@ -0,0 +1,167 @@
+'''Conditions for where and wherenot, shared by databass and DataBassLite.
+
+A condition is a dictionary of column: value. A plain value means equal,
+as it always has, and None means IS NULL. A dictionary as value holds one
+or more operators, which all have to be true:
+
+    {"age": {">=": 18, "<": 65}}
+    {"name": {"like": "A%"}}
+    {"id": {"in": [1, 2, 3]}}
+    {"born": {"between": [1990, 2000]}}
+    {"email": {"!=": None}}                 IS NOT NULL
+
+"$or" and "$and" take a list of conditions:
+
+    {"$or": [{"status": "new"}, {"updated": {"<": "2020-01-01"}}]}
+
+In wherenot every entry is turned around: plain values become not equal
+and the rest is put inside NOT (...).
+
+A column can be written "table.column" where more than one table is
+involved, as in join().
+
+Everything is plain JSON so FeedUpdate() and FeedDelete() carry it as it is.
+compile_where() turns it in to SQL with placeholders, the values are never
+put in the SQL itself.
+'''
+# operator: (SQL, number of values) where None is a list of any length.
+OPERATORS = {
+    "=": ("=", 1), "!=": ("!=", 1), "<>": ("!=", 1),
+    "<": ("<", 1), "<=": ("<=", 1), ">": (">", 1), ">=": (">=", 1),
+    "like": ("LIKE", 1), "not like": ("NOT LIKE", 1),
+    "in": ("IN", None), "not in": ("NOT IN", None),
+    "between": ("BETWEEN", 2), "not between": ("NOT BETWEEN", 2),
+}
+COMBINATORS = {"$and": " AND ", "$or": " OR "}
+
+
+def quote(column: str) -> str:
+    '''Quotes a column name, "table.column" becomes `table`.`column`.'''
+    return "`" + column.replace(".", "`.`", 1) + "`"
+
+
+def compile_where(where: dict, wherenot: dict = {}, placeholder: str = "%s") -> tuple:
+    '''Returns (SQL, values) for the conditions, SQL without the WHERE and
+    "" when there are no conditions. placeholder is "%s" for MariaDB and
+    "?" for SQLite. Raises ValueError on an unknown operator or a value
+    that does not fit its operator.'''
+    values = []
+    conditions = [_condition(column, value, placeholder, values) for column, value in where.items()]
+    for column, value in wherenot.items():
+        if column in COMBINATORS or isinstance(value, dict):
+            conditions.append("NOT (" + _condition(column, value, placeholder, values) + ")")
+        elif value is None:
+            conditions.append("{} IS NOT NULL".format(quote(column)))
+        else:
+            conditions.append("{}!={}".format(quote(column), placeholder))
+            values.append(value)
+    return " AND ".join(conditions), tuple(values)
+
+
+def _condition(column: str, value, placeholder: str, values: list) -> str:
+    if column in COMBINATORS:
+        if not isinstance(value, list) or value == []:
+            raise ValueError("{} needs a list of conditions".format(column))
+        parts = []
+        for where in value:
+            sql, more = compile_where(where, placeholder=placeholder)
+            if sql == "":
+                raise ValueError("Empty condition in {}".format(column))
+            parts.append(sql)
+            values.extend(more)
+        return "(" + COMBINATORS[column].join("({})".format(part) for part in parts) + ")"
+    if column.startswith("$"):
+        raise ValueError("Unknown combinator {}".format(column))
+    if not isinstance(value, dict):
+        if value is None:
+            return "{} IS NULL".format(quote(column))
+        values.append(value)
+        return "{}={}".format(quote(column), placeholder)
+    if value == {}:
+        raise ValueError("No operators for column {}".format(column))
+    parts = []
+    for operator, operand in value.items():
+        if operator.lower() not in OPERATORS:
+            raise ValueError("Unknown operator {} for column {}".format(operator, column))
+        sql, count = OPERATORS[operator.lower()]
+        if count == 1 and operand is None and sql in ("=", "!="):
+            parts.append("{} {}".format(quote(column), "IS NULL" if sql == "=" else "IS NOT NULL"))
+        elif count == 1:
+            parts.append("{} {} {}".format(quote(column), sql, placeholder))
+            values.append(operand)
+        elif count == 2:
+            if not isinstance(operand, (list, tuple)) or len(operand) != 2:
+                raise ValueError("{} for column {} needs two values".format(operator, column))
+            parts.append("{} {} {} AND {}".format(quote(column), sql, placeholder, placeholder))
+            values.extend(operand)
+        else:
+            if not isinstance(operand, (list, tuple)):
+                raise ValueError("{} for column {} needs a list".format(operator, column))
+            if len(operand) == 0:
+                # Nothing is in an empty list, and everything is not in it.
+                parts.append("1=0" if sql == "IN" else "1=1")
+            else:
+                parts.append("{} {} ({})".format(quote(column), sql, ", ".join([placeholder] * len(operand))))
+                values.extend(operand)
+    return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+
+def where_columns(*wheres: dict) -> list:
+    '''Returns the columns used in the conditions, for checking that they exist.'''
+    ret = []
+    for where in wheres:
+        for column, value in where.items():
+            if column in COMBINATORS and isinstance(value, list):
+                ret += where_columns(*value)
+            elif column not in ret:
+                ret.append(column)
+    return ret
+
+
+def where_shape(where: dict) -> tuple:
+    '''Returns a hashable description of the SQL the conditions compile to,
+    so statements can be cached by it. Values only count where they change
+    the SQL: None and the length of lists.'''
+    ret = []
+    for column, value in where.items():
+        if column in COMBINATORS and isinstance(value, list):
+            ret.append((column, tuple(where_shape(w) if isinstance(w, dict) else None for w in value)))
+        elif isinstance(value, dict):
+            ret.append((column, tuple((operator, operand is None,
+                                       len(operand) if isinstance(operand, (list, tuple)) else None)
+                                      for operator, operand in value.items())))
+        else:
+            ret.append((column, value is None))
+    return tuple(ret)
+
+
+def is_plain(where: dict) -> bool:
+    '''True if the conditions are only column equals value.'''
+    return all(not column.startswith("$") and not isinstance(value, (dict, list)) and value is not None
+               for column, value in where.items())
+
+
+def keyset(keys: list, last: list) -> dict:
+    '''Returns the condition for rows after last in the order of keys, used
+    to page through a table by its primary key:
+
+        keyset(["a", "b"], [1, 2]) == {"$or": [{"a": {">": 1}},
+                                                {"a": 1, "b": {">": 2}}]}
+
+    Written out instead of as (a, b) > (1, 2) so that every database can use
+    the index for it.'''
+    if len(keys) == 1:
+        return {keys[0]: {">": last[0]}}
+    return {"$or": [dict(zip(keys[:i], last[:i]), **{keys[i]: {">": last[i]}}) for i in range(len(keys))]}
+
+
+def qualify(where: dict, table: str) -> dict:
+    '''Returns the conditions with "column" written as "table.column".
+    Columns that already name a table are left alone.'''
+    ret = {}
+    for column, value in where.items():
+        if column in COMBINATORS and isinstance(value, list):
+            ret[column] = [qualify(w, table) for w in value]
+        else:
+            ret[column if "." in column else table + "." + column] = value
+    return ret
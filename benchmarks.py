@@ -0,0 +1,295 @@
+'''Benchmarks for databass and DataBassLite.
+
+    python benchmarks.py
+    python benchmarks.py --backend lite mariadb --ops 2000 --sizes 10 1000
+    python benchmarks.py --suite formats --rows 100000
+
+The crud suite times insert, insupd, select, update and delete, the
+metadata calls and GenerateFeed/EatFeed, one operation at a time, and
+reports operations and rows per second, latency percentiles and the peak
+memory of one call. The formats suite compares JSON bassfeeds with packed
+feeds (see basspack): the size of the feed, how fast it is read, and how
+fast DataBassLite eats it in to a fresh database file.
+
+DataBassLite runs on a temporary file. MariaDB runs against the database
+given by the environment variables DATABASS_HOST, DATABASS_PORT,
+DATABASS_USER, DATABASS_PASSWORD and DATABASS_DATABASE. Without them a
+throwaway server is started in a temporary folder if mariadbd or mysqld is
+installed, otherwise MariaDB is skipped. The tables made are called bench*.
+
+Everything is printed as JSON, save it with --output to compare releases.
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, Union
+from databasslite import DataBassLite
+from bassfeed import read_feed
+
+TABLE = {"bench": [{"Field": "id", "Type": "INT", "Key": "PRI"},
+                   {"Field": "name", "Type": "text", "Key": ""},
+                   {"Field": "score", "Type": "double", "Key": ""},
+                   {"Field": "note", "Type": "text", "Key": ""}]}
+
+
+def make_row(i: int) -> dict:
+    '''Returns row number i, of mixed columns and some of them empty.'''
+    return {"id": i, "name": "name {}".format(i % 977), "score": i * 0.25,
+            "note": None if i % 3 else "note {}".format(i)}
+
+
+def make_rows(count: int, first: int = 0) -> list:
+    '''Returns count rows with the ids from first on.'''
+    return [make_row(i) for i in range(first, first + count)]
+
+
+def make_feed(db, count: int, tablesize: int = 10000) -> list:
+    '''Returns a feed that creates a table and insupds count rows in to it.'''
+    feed = [db.FeedCreate(TABLE)]
+    rows = make_rows(count)
+    for start in range(0, count, tablesize):
+        feed.append(db.FeedInsupd("bench", rows[start:start + tablesize]))
+    return feed
+
+
+def percentile(seconds: list, p: float) -> float:
+    '''The p:th percentile of sorted seconds, nearest rank, in milliseconds.'''
+    index = max(0, min(len(seconds) - 1, int(round(p / 100 * len(seconds))) - 1))
+    return round(seconds[index] * 1000, 4)
+
+
+def measure(op: Callable, ops: int, rows: int = 1) -> dict:
+    '''Runs op(0) ... op(ops - 1) and times each call, then op(ops) once more
+    with tracemalloc to find the peak memory of a call. rows is the number
+    of rows each call handles.'''
+    timings = []
+    for i in range(ops):
+        start = time.perf_counter()
+        op(i)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        op(ops)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    total = sum(timings)
+    timings.sort()
+    return {"ops": ops, "rows per op": rows, "seconds": round(total, 4),
+            "ops per second": round(ops / total, 1) if total else None,
+            "rows per second": round(ops * rows / total, 1) if total else None,
+            "p50 ms": percentile(timings, 50), "p90 ms": percentile(timings, 90),
+            "p99 ms": percentile(timings, 99), "max ms": percentile(timings, 100),
+            "peak bytes": peak}
+
+
+def fresh(db, rows: int = 0) -> None:
+    '''Makes an empty bench table and fills it with rows rows.'''
+    db.drop("bench")
+    db.create(TABLE)
+    if rows:
+        db.insert("bench", make_rows(rows))
+
+
+def cases(db, ops: int, sizes: list) -> Iterator:
+    '''Yields (case, size, measurements) for every benchmark of db.'''
+    columns = db.columns if hasattr(db, "columns") else db.colums
+    biggest = max(sizes)
+
+    fresh(db)
+    yield "insert", 1, measure(lambda i: db.insert("bench", make_row(i)), ops)
+    for size in sizes:
+        fresh(db)
+        batches = [make_rows(size, i * size) for i in range(ops + 1)]
+        yield "insert", size, measure(lambda i: db.insert("bench", batches[i]), ops, size)
+
+    fresh(db, ops + 1)
+    yield "insupd", 1, measure(lambda i: db.insupd("bench", dict(make_row(i), score=-1.0)), ops)
+    for size in sizes:
+        fresh(db, size)
+        batch = make_rows(size)
+        yield "insupd", size, measure(lambda i: db.insupd("bench", batch), ops, size)
+
+    fresh(db, biggest + ops + 1)
+    yield "select", 1, measure(lambda i: db.select("bench", {"id": i}), ops)
+    for size in sizes:
+        yield "select", size, measure(lambda i: db.select("bench", {"id": {">=": i, "<": i + size}}), ops, size)
+    yield "update", 1, measure(lambda i: db.update("bench", {"score": -1.0}, {"id": i}), ops)
+    yield "delete", 1, measure(lambda i: db.delete("bench", {"id": i}), ops)
+
+    yield "tables", 1, measure(lambda i: db.tables(), ops)
+    yield "columns", 1, measure(lambda i: columns("bench"), ops)
+    yield "primary_keys", 1, measure(lambda i: db.primary_keys("bench"), ops)
+
+    def cold(i: int) -> None:
+        db.catalog.refresh()
+        db.tables()
+        columns("bench")
+    yield "metadata without catalog", 1, measure(cold, ops)
+
+    for size in sizes:
+        feed = [db.FeedInsupd("bench", make_rows(size))]
+        yield "GenerateFeed", size, measure(lambda i: db.GenerateFeed(feed), ops, size)
+        data = db.GenerateFeed(feed)
+        yield "EatFeed", size, measure(lambda i: db.EatFeed(data), ops, size)
+    db.drop("bench")
+
+
+def bench_backend(name: str, db, ops: int, sizes: list) -> list:
+    '''Returns the measurements of every case on one database.'''
+    return [dict({"backend": name, "case": case, "size": size}, **result)
+            for case, size, result in cases(db, ops, sizes)]
+
+
+def bench_lite(ops: int, sizes: list) -> list:
+    with tempfile.TemporaryDirectory() as folder:
+        db = DataBassLite(os.path.join(folder, "bench.db"))
+        try:
+            return bench_backend("DataBassLite", db, ops, sizes)
+        finally:
+            db.sql.close()
+
+
+def mariadb_config() -> Union[dict, None]:
+    '''The MariaDB to use from the environment, None if it is not set.'''
+    if "DATABASS_DATABASE" not in os.environ:
+        return None
+    config = {"database": os.environ["DATABASS_DATABASE"],
+              "host": os.environ.get("DATABASS_HOST", "127.0.0.1"),
+              "port": os.environ.get("DATABASS_PORT", "3306"),
+              "user": os.environ.get("DATABASS_USER", "root")}
+    if "DATABASS_PASSWORD" in os.environ:
+        config["password"] = os.environ["DATABASS_PASSWORD"]
+    return config
+
+
+@contextmanager
+def local_server(timeout: float = 60.0) -> Iterator:
+    '''Starts a throwaway MariaDB or MySQL server in a temporary folder and
+    yields the config to it, or None if no server is installed.'''
+    server = shutil.which("mariadbd") or shutil.which("mysqld")
+    if server is None:
+        yield None
+        return
+    import mysql.connector as MariaDB
+    with tempfile.TemporaryDirectory() as folder:
+        data = os.path.join(folder, "data")
+        socket = os.path.join(folder, "mysqld.sock")
+        install = shutil.which("mariadb-install-db") or shutil.which("mysql_install_db")
+        if install is not None:
+            subprocess.run([install, "--no-defaults", "--datadir=" + data, "--auth-root-authentication-method=normal"],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            subprocess.run([server, "--no-defaults", "--initialize-insecure", "--datadir=" + data],
+                           check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        process = subprocess.Popen([server, "--no-defaults", "--datadir=" + data, "--socket=" + socket,
+                                    "--skip-networking", "--pid-file=" + os.path.join(folder, "mysqld.pid")],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            config = {"unix_socket": socket, "user": "root"}
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    conn = MariaDB.connect(**config)
+                    break
+                except MariaDB.Error:
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise
+                    time.sleep(0.2)
+            conn.cursor().execute("CREATE DATABASE IF NOT EXISTS bench")
+            conn.close()
+            yield dict(config, database="bench")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def bench_mariadb(ops: int, sizes: list) -> list:
+    '''Benchmarks databass, [] if there is no MariaDB to run against.'''
+    from databass import databass
+    config = mariadb_config()
+    with local_server() if config is None else _given(config) as config:
+        if config is None:
+            print("No MariaDB in the environment and none installed, skipping it.", file=sys.stderr)
+            return []
+        db = databass(config)
+        try:
+            return bench_backend("databass", db, ops, sizes)
+        finally:
+            db.close()
+
+
+@contextmanager
+def _given(config: dict) -> Iterator:
+    yield config
+
+
+def bench_feed_formats(count: int) -> list:
+    '''Returns one dictionary of measurements per feed format.'''
+    ret = []
+    with tempfile.TemporaryDirectory() as folder:
+        feed = make_feed(DataBassLite(os.path.join(folder, "source.db")), count)
+        formats = [("json", lambda db: db.GenerateFeed(feed).encode("utf-8"))]
+        for compression in ("none", "zlib", "lzma"):
+            formats.append(("packed " + compression,
+                            lambda db, c=compression: db.GeneratePackedFeed(feed, compression=c)))
+        for name, generate in formats:
+            db = DataBassLite(os.path.join(folder, name.replace(" ", "_") + ".db"))
+            start = time.perf_counter()
+            data = generate(db)
+            generated = time.perf_counter() - start
+            start = time.perf_counter()
+            operations = sum(1 for f in read_feed(data))
+            read = time.perf_counter() - start
+            start = time.perf_counter()
+            db.EatFeed(data)
+            eaten = time.perf_counter() - start
+            db.sql.close()
+            ret.append({"format": name, "bytes": len(data), "operations": operations,
+                        "generate seconds": round(generated, 4), "read seconds": round(read, 4),
+                        "eat seconds": round(eaten, 4), "rows per second": round(count / eaten)})
+    return ret
+
+
+def environment() -> dict:
+    '''What the numbers were measured on.'''
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", nargs="+", choices=["crud", "formats"], default=["crud", "formats"])
+    parser.add_argument("--backend", nargs="+", choices=["lite", "mariadb"], default=["lite", "mariadb"])
+    parser.add_argument("--ops", type=int, default=500, help="operations timed per case")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="rows per bulk operation")
+    parser.add_argument("--rows", type=int, default=100000, help="rows in the feed of the formats suite")
+    parser.add_argument("--output", help="also write the JSON to this file")
+    args = parser.parse_args()
+    report = {"environment": environment(), "ops": args.ops, "sizes": args.sizes}
+    if "crud" in args.suite:
+        report["crud"] = []
+        if "lite" in args.backend:
+            report["crud"] += bench_lite(args.ops, args.sizes)
+        if "mariadb" in args.backend:
+            report["crud"] += bench_mariadb(args.ops, args.sizes)
+    if "formats" in args.suite:
+        report["feed formats"] = bench_feed_formats(args.rows)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
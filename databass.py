@@ -7,9 +7,9 @@ The syntax for doing operations and generating feeds is identical. And the
 result from reading the feed is identical to as if the operation were done
 locally.
 
-(Only tested with Python 3. (Automatic JOIN with dictionaries is on the TODO
-list. But you can still write your own SQL and get the list of dictionaries
-from joined SELECTS.))
+(Only tested with Python 3. JOINs are described with dictionaries too, see
+join(). You can still write your own SQL and get the list of dictionaries
+from joined SELECTS.)
 
 NAME
 
@@ -42,23 +42,81 @@ SOFTWARE.
 '''
 import mysql.connector as MariaDB
 from tabulate import tabulate
-from typing import Union
-import json
+from typing import Union, Iterable, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import itertools
+import os
+import tempfile
+import threading
+import time
+import weakref
+from basscatalog import BassCatalog, is_ddl
+from basspool import BassPool, PoolTimeout
+from basstransaction import BassTransaction
+from bassfeed import BassFeeder, read_feed, stages
+from bassresult import LAYOUTS, Row, columnar, make_rows
+from basswhere import compile_where, where_columns, where_shape
+from bassjoin import compile_join
+from basscache import ResultCache, cached, created_tables, forget, invalidates, is_read, join_tables, one_table
+from bassmetrics import BassMetrics, rowcount
+from bassjournal import BassJournal, journaled
 
-class databass:
+class databass(BassFeeder):
     '''Class that simplifies database connections.'''
     __version__ = 0.5
+    _dialect = "mariadb"
+    _placeholder = "%s"
 
-    def __init__(self, config: dict, verbose: bool=False):
+    def __init__(self, config: dict, verbose: bool=False, catalog_ttl: Union[float, None]=None,
+                 pool_size: Union[int, None]=None, pool_timeout: Union[float, None]=None,
+                 cache: Union[ResultCache, None]=None, metrics: Union[BassMetrics, None]=None,
+                 journal: Union[BassJournal, None]=None):
         '''Config format:
         config = {'user'     : 'root',
                   'password' : 'pass',
                   'host'     : '1.2.3.4',
                   'port'     : '3306',
-                  'database' : 'test'}'''
-        self._bass = MariaDB.connect(**config)
+                  'database' : 'test'}
+
+        catalog_ttl: seconds the cached table and column information is trusted.
+        Default is to trust it until the schema is changed through databass.
+        Call self.catalog.refresh() if someone else changes the schema.
+
+        pool_size: open up to this many connections so that threads can run
+        queries at the same time, see basspool.BassPool. Without a pool all
+        threads take turns on one connection.
+        pool_timeout: seconds to wait for a free connection in the pool.
+
+        cache: a basscache.ResultCache to answer repeated select() and join()
+        calls from memory. Writes through databass keep it up to date.
+
+        metrics: a bassmetrics.BassMetrics that times the calls, statements
+        and feed operations and keeps a slow query log.
+
+        journal: a bassjournal.BassJournal that records every write so that
+        feed_since() can make a feed of the changes.'''
+        self._config = dict(config)
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        if pool_size is None:
+            self._pool = None
+            self._bass = MariaDB.connect(**config)
+        else:
+            self._pool = BassPool(lambda: MariaDB.connect(**config), pool_size, pool_timeout)
+            self._bass = None
         self.verbose=verbose
-        #self._cursor  = self._bass.cursor(dictionary=True)
+        self.cache = cache
+        self.catalog = BassCatalog(self._load_tables, self._load_columns, catalog_ttl)
+        self._packet = None
+        self._infile = None
+        # Statement cache, (operation, table, columns...) -> SQL, and for each
+        # connection [schema generation, {SQL: server-side prepared cursor}].
+        self._statements = {}
+        self._prepared = weakref.WeakKeyDictionary()
+        self._preparedlock = threading.Lock()
+        self._generation = 0
+        self._maxprepared = 256
 
         # Feed eating functions
         self._feedeaters={}
@@ -69,84 +127,405 @@ class databass:
         self._feedeaters["update"]      = self.EatUpdate
         self._feedeaters["delete"]      = self.EatDelete
         self._feedeaters["insupd"]      = self.EatInsupd
+        self._feedeaters["clear"]       = self.EatClear
+        self._feedeaters["join"]        = self.EatJoin
+
+        self.journal = None
+        if journal is not None:
+            journal.attach(self)
+        self.metrics = None
+        if metrics is not None:
+            metrics.attach(self)
 
-    def run(self, sql: str, *args: Union[tuple, str]) -> Union[list, bool, str]:
+    def run(self, sql: str, *args: Union[tuple, str], layout: str="dicts") -> Union[list, dict, bool, str]:
         '''Runs a query.
            Returns a list of dictionaries on successfull SELECT.
+           With layout="rows" a list of Row, which are lighter than dictionaries,
+           and with layout="columns" a dictionary of columns, see bassresult.
+        '''
+        ret = self._run(sql, *args, layout=layout)
+        if self.cache is not None and not is_read(sql):
+            forget(self, None)
+        return ret
+
+    def _run(self, sql: str, *args: Union[tuple, str], layout: str="dicts",
+             metadata: bool=False) -> Union[list, dict, bool, str]:
+        '''run() for the statements of databass itself, which take care of the cache.
+        metadata marks the questions about the schema for the metrics.'''
+        if len(args)>0 and type(args[0])==tuple:
+            args = args[0] # at db.run(sql, ("219154664", "CPU0_PVCCIO")) I think...
+        # else at db.run(sql, "219154664", "CPU0_PVCCIO") I hope...
+        ret = self._execute(sql, args, layout=layout, metadata=metadata)
+        if type(ret)==int:
+            return True
+        return ret
+
+    def irun(self, sql: str, *args: Union[tuple, str], batchsize: int=1000,
+             layout: str="dicts") -> Union[Iterator, str]:
+        '''Like run() but returns a generator over the rows instead of a list.
+        The rows are streamed from the server with an unbuffered cursor,
+        batchsize rows at a time, so memory stays flat no matter how big
+        the result is. layout is "dicts" or "rows".
+
+        The query is sent when the first row is asked for, so a generator
+        that is never read never holds a connection. A database error is
+        then raised as ValueError. The connection is busy from there until
+        the generator is exhausted or closed. If the consumer stops early
+        the rest of the result is read and thrown away batch by batch before
+        the cursor is closed.
         '''
-        # TODO: add **kwargs
-        cursor = self._bass.cursor(dictionary=True)
+        if len(args)>0 and type(args[0])==tuple:
+            args = args[0]
+        if layout not in ("dicts", "rows"):
+            return "Error, irun can not make layout {}".format(layout)
+        return self._stream(sql, args, batchsize, layout == "rows")
+
+    def _stream(self, sql: str, args: tuple, batchsize: int, rowobjects: bool=False) -> Iterator:
+        '''Runs a query on an unbuffered cursor and yields the rows. Closes it
+        and gives the connection back when done.'''
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor(dictionary=not rowobjects, buffered=False)
+                if self.verbose:
+                    print("sql  =", sql)
+                    print("args =", args)
+                try:
+                    if len(args)>0:
+                        cursor.execute(sql, args)
+                    else:
+                        cursor.execute(sql)
+                except MariaDB.Error as err:
+                    cursor.close()
+                    raise ValueError(self._error(err))
+                try:
+                    if cursor.description:
+                        index = {name: i for i, name in enumerate(cursor.column_names)}
+                        while True:
+                            rows = cursor.fetchmany(batchsize)
+                            if not rows:
+                                break
+                            if rowobjects:
+                                yield from (Row(index, row) for row in rows)
+                            else:
+                                yield from rows
+                finally:
+                    try:
+                        # An unbuffered cursor can not be closed with rows left unread.
+                        while cursor.description and cursor.fetchmany(batchsize):
+                            pass
+                        self._commit(conn)
+                    finally:
+                        cursor.close()
+        except PoolTimeout as err:
+            raise ValueError("Database Error: " + str(err))
+
+    @contextmanager
+    def _connection(self):
+        '''Lends out a connection for one call.
+        Without a pool the threads take turns on the one connection.'''
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+        elif self._pool is None:
+            with self._lock:
+                yield self._bass
+        else:
+            conn = self._pool.checkout()
+            try:
+                yield conn
+            finally:
+                self._pool.checkin(conn)
+
+    def _execute(self, sql: str, args: Union[tuple, list]=(), many: bool=False,
+                 prepared: bool=False, layout: str="dicts", metadata: bool=False) -> Union[list, dict, int, str]:
+        '''Runs a query and commits.
+           Returns a list of dictionaries when there is a result,
+           otherwise the number of affected rows.
+
+           many:     args is a list of tuples for executemany.
+           prepared: use a server-side prepared statement. The prepared cursor
+                     is kept so the server only parses the statement once.
+           layout:   "dicts", "rows" or "columns", the shape of a result.
+           metadata: the query is about the schema, counted apart in the metrics.
+        '''
+        if layout not in LAYOUTS:
+            return "Error, unknown layout {}".format(layout)
+        try:
+            with self._connection() as conn:
+                return self._execute_on(conn, sql, args, many, prepared, layout, metadata)
+        except PoolTimeout as err:
+            return "Database Error: " + str(err)
+        finally:
+            if is_ddl(sql):
+                self.catalog.refresh()
+                self._forget_statements()
+
+    def _execute_on(self, conn, sql: str, args: Union[tuple, list], many: bool,
+                    prepared: bool, layout: str="dicts", metadata: bool=False) -> Union[list, dict, int, str]:
+        '''_execute() on a given connection.'''
+        if self.metrics is not None:
+            start = time.perf_counter()
+        dictionary = layout == "dicts"
+        if prepared:
+            cursor = self._prepared_cursor(conn, sql, dictionary)
+        else:
+            cursor = conn.cursor(dictionary=dictionary)
         if self.verbose:
             print("sql  =", sql)
             print("args =", args)
         try:
-            if len(args)>0:
-                if type(args[0])==tuple:
-                    cursor.execute(sql, *args) # at db.run(sql, ("219154664", "CPU0_PVCCIO")) I think...
-                if type(args[0])==str:
-                    cursor.execute(sql, args) # at db.run(sql, "219154664", "CPU0_PVCCIO") I hope...
+            if many:
+                cursor.executemany(sql, args)
+            elif len(args)>0:
+                cursor.execute(sql, args)
             else:
                 cursor.execute(sql)
         except MariaDB.Error as err:
-            cursor.close()
-            return "Database Error: " + str(err)
-        if cursor.description:
+            if not prepared:
+                cursor.close()
+            if self._pool is not None and isinstance(err, (MariaDB.OperationalError, MariaDB.InterfaceError)):
+                self._pool.discard(conn)
+            if self.metrics is not None:
+                self.metrics.query(sql, time.perf_counter() - start, 0, metadata)
+            return self._error(err)
+        if cursor.description and layout == "columns":
+            ret=columnar(cursor.column_names, cursor.fetchall())
+        elif cursor.description and layout == "rows":
+            ret=make_rows(cursor.column_names, cursor.fetchall())
+        elif cursor.description:
             ret=cursor.fetchall()
-            self._bass.commit()
-            cursor.close()
-            return ret
         else:
-            self._bass.commit()
+            ret=cursor.rowcount
+        self._commit(conn)
+        if not prepared:
             cursor.close()
-            return True
+        if self.metrics is not None:
+            self.metrics.query(sql, time.perf_counter() - start, rowcount(ret), metadata)
+        return ret
+
+    def _error(self, err: Exception) -> str:
+        '''Formats a database error and records it in the running transaction.'''
+        error = "Database Error: " + str(err)
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1].fail(error)
+        return error
+
+    def _top_transaction(self) -> Union[BassTransaction, None]:
+        '''The outermost transaction() or batch() of this thread, None outside of one.'''
+        stack = getattr(self._local, "stack", None)
+        return stack[0] if stack else None
+
+    def _commit(self, conn) -> None:
+        '''Commits after a statement. Inside transaction() or batch() the
+        commit waits for the end of the block, batch(every) commits every
+        so many statements.'''
+        stack = getattr(self._local, "stack", None)
+        if not stack:
+            conn.commit()
+            return
+        top = stack[0]
+        top.statements += 1
+        if top.every and len(stack)==1 and top.statements % top.every == 0:
+            conn.commit()
+
+    def transaction(self, strict: bool=False):
+        '''Runs a with block in one transaction on one connection:
+
+            with db.transaction() as tx:
+                db.insert("table", {...})
+                db.update("table", {...}, {...})
+
+        Commits once at the end and rolls back if an exception is raised.
+        Since databass returns database errors instead of raising them, they
+        are collected in tx.errors. With strict=True the block is rolled back
+        if there were any. A transaction inside a transaction is a savepoint.
+        tx.committed tells how it ended.
+
+        Note that MariaDB commits by itself on CREATE, DROP, ALTER and TRUNCATE.'''
+        return self._transaction(BassTransaction(strict))
+
+    def batch(self, every: Union[int, None]=None):
+        '''Like transaction() but meant for speed rather than atomicity.
+        The per statement commits are replaced by one commit at the end, or one
+        commit every "every" statements to keep the transaction small.
+        On an exception only what was not yet committed is rolled back.'''
+        return self._transaction(BassTransaction(False, every))
+
+    @contextmanager
+    def _transaction(self, tx: BassTransaction):
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            # Nested, use a savepoint on the connection of the outer block.
+            conn = self._local.conn
+            name = "bass{}".format(len(stack))
+            self._savepoint(conn, "SAVEPOINT " + name)
+            stack.append(tx)
+            try:
+                yield tx
+            except BaseException:
+                self._savepoint(conn, "ROLLBACK TO SAVEPOINT " + name)
+                raise
+            finally:
+                stack.pop()
+            if tx.failed:
+                self._savepoint(conn, "ROLLBACK TO SAVEPOINT " + name)
+            else:
+                self._savepoint(conn, "RELEASE SAVEPOINT " + name)
+                stack[-1].errors.extend(tx.errors)
+                tx.committed = True
+            return
+        with self._connection() as conn:
+            self._local.conn = conn
+            self._local.stack = [tx]
+            try:
+                yield tx
+            except BaseException:
+                self._end(conn, tx, False)
+                raise
+            else:
+                self._end(conn, tx, not tx.failed)
+            finally:
+                self._local.conn = None
+                self._local.stack = []
+                if self.cache is not None and tx.tables != set():
+                    # Others may have cached what was there before the commit.
+                    self.cache.invalidate(tx.tables)
+
+    @staticmethod
+    def _end(conn, tx: BassTransaction, commit: bool) -> None:
+        '''Commits or rolls back at the end of a transaction.'''
+        try:
+            if commit:
+                conn.commit()
+                tx.committed = True
+            else:
+                conn.rollback()
+        except MariaDB.Error as err:
+            tx.fail("Database Error: " + str(err))
+
+    def _savepoint(self, conn, sql: str) -> None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql)
+        except MariaDB.Error as err:
+            self._error(err)
+        finally:
+            cursor.close()
+
+    def _prepared_cursor(self, conn, sql: str, dictionary: bool=True):
+        '''Returns the prepared cursor for the SQL on this connection.
+        Cursors made before the last schema change are closed and made again.
+        dictionary=False gives one that returns tuples.'''
+        with self._preparedlock:
+            cache = self._prepared.get(conn)
+            if cache is None or cache[0] != self._generation or len(cache[1]) >= self._maxprepared:
+                if cache is not None:
+                    for cursor in cache[1].values():
+                        try:
+                            cursor.close()
+                        except MariaDB.Error:
+                            pass
+                cache = [self._generation, {}]
+                self._prepared[conn] = cache
+        cursor = cache[1].get((sql, dictionary))
+        if cursor is None:
+            cursor = conn.cursor(prepared=True, dictionary=dictionary)
+            cache[1][(sql, dictionary)] = cursor
+        return cursor
+
+    def _statement(self, key: tuple, build) -> str:
+        '''Returns the SQL for a statement of a given shape.
+        key is (operation, table, column tuples...), build() makes the SQL
+        the first time a shape is seen.'''
+        sql = self._statements.get(key)
+        if sql is None:
+            sql = build()
+            self._statements[key] = sql
+        return sql
+
+    def _forget_statements(self) -> None:
+        '''Drops cached statements. Done when the schema changes since the
+        statements might not be valid anymore. The prepared cursors belong to
+        their connections and are closed the next time the connection is used.'''
+        self._statements.clear()
+        self._generation += 1
+
+    def close(self) -> None:
+        '''Closes the connection, or all connections in the pool.'''
+        if self._pool is not None:
+            self._pool.close()
+        else:
+            self._bass.close()
+
+    @staticmethod
+    def _where(where: dict, wherenot: dict) -> tuple:
+        '''Builds a WHERE clause with placeholders, see basswhere.
+        Returns (clause, values). Raises ValueError on bad conditions.'''
+        sql, values = compile_where(where, wherenot)
+        return (" WHERE " + sql if sql else ""), values
 
     def count(self, table: str) -> Union[str, bool]:
         '''Returns the number of rows in a given table.'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return False
-        return self.run("SELECT count(*) FROM `{}`".format(table))[0]["count(*)"]
+        return self._run("SELECT count(*) FROM `{}`".format(table))[0]["count(*)"]
 
     def name(self) -> str:
         '''Returns the name of the currently selected database.'''
-        return self.run("SELECT DATABASE()")[0]["DATABASE()"]
+        return self._run("SELECT DATABASE()")[0]["DATABASE()"]
 
     def tables(self) -> list:
         '''Returns a list of tables in the database.'''
-        result = self.run("SHOW tables")
-        tables = []
-        name = self.name()
-        for table in result:
-            tables.append(table["Tables_in_" + name])
-        return tables
+        return self.catalog.tables()
 
     def colums(self, table: str) -> Union[list, bool]:
         '''Returns all the column in the table'''
-        if table not in self.tables():
+        columns = self.catalog.columns(table)
+        if columns is None:
             return False
-        ret = []
-        columns = self.run("SHOW COLUMNS FROM `{}`".format(table))
-        for c in columns:
-            ret.append(c["Field"])
-        return ret
+        return columns
+
+    def primary_keys(self, table: str) -> Union[list, bool]:
+        '''Returns the primary keys of the table'''
+        keys = self.catalog.primary_keys(table)
+        if keys is None:
+            return False
+        return keys
+
+    def _load_tables(self) -> list:
+        '''Asks the server for the tables. Used by the catalog.'''
+        # The only column is called "Tables_in_<database>", no need to ask for the name.
+        return [list(table.values())[0] for table in self._run("SHOW tables", metadata=True)]
+
+    def _load_columns(self, table: str) -> tuple:
+        '''Asks the server for the columns and primary keys. Used by the catalog.'''
+        columns = self._run("SHOW COLUMNS FROM `{}`".format(table), metadata=True)
+        return ([c["Field"] for c in columns],
+                [c["Field"] for c in columns if c["Key"]=="PRI"])
 
     def info(self, table: str) -> Union[str, bool]:
         '''Returns detailed table info in dictionary form'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return False
-        return self.run("DESCRIBE `{}`".format(table))
+        return self._run("DESCRIBE `{}`".format(table))
 
     def code(self, table: str) -> Union[str, bool]:
         '''Returns the code used to create the table'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return False
-        return self.run("SHOW CREATE TABLE `{}`".format(table))[0]["Create Table"]
+        return self._run("SHOW CREATE TABLE `{}`".format(table))[0]["Create Table"]
 
+    @invalidates(one_table)
+    @journaled("FeedDrop", "table")
     def drop(self, table: str) -> Union[bool, str]:
         '''Drops the table'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return False
-        return self.run("DROP TABLE `{}`".format(table))
+        return self._run("DROP TABLE `{}`".format(table))
 
+    @invalidates(created_tables)
+    @journaled("FeedCreate", "tableconfigs")
     def create(self, tableconfigs: dict) -> list:
         '''Creates a table according to the given configuration.
         This used the same syntax that MariaDB used when you DESCRIBE a table
@@ -215,166 +594,399 @@ class databass:
             if sql.endswith(", "):
                 sql = sql[:-2]+")"
             # print("sql =", sql)
-            ret.append(self.run(sql))
+            ret.append(self._run(sql))
         return ret
 
+    @invalidates(one_table)
+    @journaled("FeedInsupd", "table", "data")
     def insupd(self, table: str, data: Union[dict, list]) -> Union[list, str]:
-        '''Inserts if not existing, updates on existing'''
+        '''Inserts if not existing, updates on existing.
+        A list of dictionaries is sent as multi-row statements, see insupdmany().'''
         if type(data)==list:
-            return [self.insupd(table, d) for d in data]
-        else:
-            if table not in self.tables():
+            return self.insupdmany(table, data)
+        columns = tuple(data.keys())
+        key = ("insupd", table, columns)
+        if key not in self._statements:
+            if not self.catalog.has_table(table):
                 return "Error, table {} not in database".format(table)
             tableColums = self.colums(table)
-            for column in data.keys():
+            for column in columns:
                 if column not in tableColums:
                     return "Error, column {} not in table {}".format(column, table)
+        sql = self._statement(key, lambda:
+            "INSERT INTO `{}` ({}) VALUES ({}) ON DUPLICATE KEY UPDATE {}".format(table,
+            ", ".join("`{}`".format(c) for c in columns),
+            ", ".join(["%s"]*len(columns)),
+            ", ".join("`{0}`=VALUES(`{0}`)".format(c) for c in columns)))
+        ret = self._execute(sql, tuple(data.values()), prepared=True)
+        if type(ret)==int:
+            return True
+        return ret
 
-            sql = "INSERT INTO `{}` (".format(table)
-            for d in data:
-                sql += "`{}`, ".format(d)
-            sql = sql[:-2] + ") VALUES("
-            for d in data:
-                if type(data[d])==str:
-                    sql += "'{}', ".format(data[d].replace("'", "''"))
-                elif d==None:
-                    sql += "null, "
-                else:
-                    sql += "{}, ".format(data[d])
-            sql = sql[:-2] + ") ON DUPLICATE KEY UPDATE "
-            for d in data:
-                if type(data[d])==str:
-                    sql += "`{}`='{}', ".format(d, data[d].replace("'", "''"))
-                elif d==None:
-                    sql += "`{}`=null, ".format(d)
-                else:
-                    sql += "`{}`={}, ".format(d, data[d])
-            sql = sql[:-2]
-            return self.run(sql)
+    @invalidates(one_table)
+    @journaled("FeedInsupd", "table", "data")
+    def insupdmany(self, table: str, data: list) -> Union[list, str]:
+        '''Inserts if not existing, updates on existing, for a list of dictionaries.
+        Consecutive rows with the same columns share one
+        INSERT ... VALUES (...),(...) ON DUPLICATE KEY UPDATE statement,
+        split so that no statement is bigger than the server's max_allowed_packet.
+
+        Returns a list with the number of affected rows for each statement.
+        (MariaDB counts 1 for an inserted row and 2 for an updated row.)
+        '''
+        if not self.catalog.has_table(table):
+            return "Error, table {} not in database".format(table)
+        tableColums = self.colums(table)
+        for d in data:
+            for column in d.keys():
+                if column not in tableColums:
+                    return "Error, column {} not in table {}".format(column, table)
+
+        ret = []
+        for columns, rows in self._runs(data):
+            head = "INSERT INTO `{}` ({}) VALUES ".format(table, ", ".join("`{}`".format(c) for c in columns))
+            tail = " ON DUPLICATE KEY UPDATE " + ", ".join("`{0}`=VALUES(`{0}`)".format(c) for c in columns)
+            marks = "(" + ", ".join(["%s"]*len(columns)) + ")"
+            for chunk in self._chunks(rows, columns, len(head) + len(tail)):
+                sql = head + ", ".join([marks]*len(chunk)) + tail
+                args = tuple(row[c] for row in chunk for c in columns)
+                result = self._execute(sql, args)
+                if type(result)==str:
+                    return ret + [result]
+                ret.append(result)
+        return ret
+
+    def _chunks(self, rows: list, columns: tuple, overhead: int):
+        '''Splits rows in to chunks that fit in one packet to the server.'''
+        # Escaping and multi-byte characters can make a value bigger on the
+        # wire than len(str()) says, so only a quarter of the packet is used.
+        limit = self._max_packet() // 4
+        chunk, size = [], overhead
+        for row in rows:
+            rowsize = 4*len(columns) + sum(len(str(row[c])) for c in columns)
+            if chunk and size + rowsize > limit:
+                yield chunk
+                chunk, size = [], overhead
+            chunk.append(row)
+            size += rowsize
+        if chunk:
+            yield chunk
+
+    def _max_packet(self) -> int:
+        '''Returns the server's max_allowed_packet. Only asked for once.'''
+        if self._packet is None:
+            result = self._run("SELECT @@max_allowed_packet AS packet")
+            # 1 MB is the smallest default among the servers we talk to.
+            self._packet = int(result[0]["packet"]) if type(result)==list else 1024*1024
+        return self._packet
 
+    @invalidates(one_table)
+    @journaled("FeedInsert", "table", "data")
     def insert(self, table: str, data: Union[dict, list]) -> Union[bool, str]:
         '''Inserts data in to the table.
         data: a dictionary or a list of dictionaries with keywords equal to column names.
         '''
-        if table not in self.tables():
-            return False
         if type(data)==dict:
             data = [data]
+        if not self.catalog.has_table(table):
+            return False
         tableColums = self.colums(table)
         for d in data:
             for column in d.keys():
                 if column not in tableColums:
                     return False
 
-        sql = "INSERT INTO `{}` (".format(table)
-        for d in data[0]:
-            sql += "`{}`, ".format(d)
-        sql = sql[:-2] + ") VALUES "
-        for l in data:
-            sql+= "("
-            for d in l:
-                if type(l[d])==str:
-                    sql += "'{}', ".format(l[d].replace("'", "''"))
-                elif d==None:
-                    sql += "null, "
-                else:
-                    sql += "{}, ".format(l[d])
-            sql = sql[:-2] + "), "
-        sql = sql[:-2]
-        return self.run(sql)
+        for columns, rows in self._runs(data):
+            sql = self._statement(("insert", table, columns), lambda:
+                "INSERT INTO `{}` ({}) VALUES ({})".format(table,
+                ", ".join("`{}`".format(c) for c in columns),
+                ", ".join(["%s"]*len(columns))))
+            if len(rows)==1:
+                ret = self._execute(sql, tuple(rows[0].values()), prepared=True)
+            else:
+                # The connector folds executemany of an INSERT in to one
+                # multi-row statement, so keep each call within a packet.
+                for chunk in self._chunks(rows, columns, len(sql)):
+                    ret = self._execute(sql, [tuple(row.values()) for row in chunk], many=True)
+                    if type(ret)==str:
+                        break
+            if type(ret)==str:
+                return ret
+        return True
+
+    @invalidates(one_table)
+    @journaled("FeedInsert", "table", "rows")
+    def bulk_load(self, table: str, rows: Iterable, chunksize: int=10000,
+                  progress: Union[Callable, None]=None) -> Union[dict, str]:
+        '''Inserts rows from any iterable of dictionaries, like a generator,
+        without ever holding more than one chunk of rows in memory.
+        All rows must have the same columns as the first one.
+
+        Chunks are at most chunksize rows and a quarter of max_allowed_packet.
+        When the connection is made with "allow_local_infile": True in the
+        config and the server has local_infile on, each chunk is written to a
+        temporary CSV file and sent with LOAD DATA LOCAL INFILE. Otherwise the
+        chunks are sent as multi-row INSERTs.
+
+        progress: called as progress(rows, rows_per_second) after each chunk.
+        Returns {"rows": ..., "seconds": ..., "rows_per_second": ...}
+        '''
+        if not self.catalog.has_table(table):
+            return "Error, table {} not in database".format(table)
+        rows = iter(rows)
+        first = next(rows, None)
+        start = time.monotonic()
+        loaded = 0
+        if first is not None:
+            columns = tuple(first.keys())
+            keys = set(columns)
+            tableColums = self.colums(table)
+            for column in columns:
+                if column not in tableColums:
+                    return "Error, column {} not in table {}".format(column, table)
+            limit = self._max_packet() // 4
+            buffer = None
+            if self._use_infile():
+                buffer = tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8",
+                                                     newline="", delete=False)
+            try:
+                chunk, size = [], 0
+                for row in itertools.chain([first], rows):
+                    if row.keys()!=keys:
+                        return "Error, row {} does not have the columns {}".format(loaded+len(chunk), columns)
+                    values = tuple(row[c] for c in columns)
+                    chunk.append(values)
+                    size += 4*len(values) + sum(len(str(v)) for v in values)
+                    if len(chunk)>=chunksize or size>=limit:
+                        result = self._load_chunk(table, columns, chunk, buffer)
+                        if type(result)==str:
+                            return result
+                        loaded += len(chunk)
+                        chunk, size = [], 0
+                        self._progress(progress, loaded, start)
+                if chunk:
+                    result = self._load_chunk(table, columns, chunk, buffer)
+                    if type(result)==str:
+                        return result
+                    loaded += len(chunk)
+                    self._progress(progress, loaded, start)
+            finally:
+                if buffer is not None:
+                    buffer.close()
+                    os.remove(buffer.name)
+        seconds = time.monotonic() - start
+        return {"rows": loaded, "seconds": seconds,
+                "rows_per_second": loaded / seconds if seconds > 0 else 0.0}
 
-    def select(self, table: str, where: dict={}, wherenot: dict={}, columns: list=["*"]) -> Union[list, str, bool]:
+    def _use_infile(self) -> bool:
+        '''Returns True if LOAD DATA LOCAL INFILE is allowed by both sides.'''
+        if self._infile is None:
+            self._infile = False
+            if self._config.get("allow_local_infile"):
+                result = self._run("SELECT @@local_infile AS infile")
+                self._infile = type(result)==list and int(result[0]["infile"])==1
+        return self._infile
+
+    def _load_chunk(self, table: str, columns: tuple, chunk: list, buffer) -> Union[int, str]:
+        '''Writes one chunk of value tuples to the table.'''
+        if buffer is not None and self._infile:
+            buffer.seek(0)
+            buffer.truncate()
+            for values in chunk:
+                buffer.write(",".join(map(self._csv, values)))
+                buffer.write("\n")
+            buffer.flush()
+            sql = ("LOAD DATA LOCAL INFILE '{}' INTO TABLE `{}` CHARACTER SET utf8mb4 "
+                   "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+                   "LINES TERMINATED BY '\\n' ({})").format(
+                       buffer.name.replace("\\", "\\\\").replace("'", "''"), table,
+                       ", ".join("`{}`".format(c) for c in columns))
+            result = self._execute(sql)
+            if type(result)!=str:
+                return result
+            # The server or the connector said no, use INSERT from now on.
+            self._infile = False
+        sql = self._statement(("insert", table, columns), lambda:
+            "INSERT INTO `{}` ({}) VALUES ({})".format(table,
+            ", ".join("`{}`".format(c) for c in columns),
+            ", ".join(["%s"]*len(columns))))
+        return self._execute(sql, chunk, many=True)
+
+    @staticmethod
+    def _csv(value) -> str:
+        '''Formats a value for LOAD DATA. With an empty ESCAPED BY an unquoted
+        NULL is read as NULL and a doubled quote as one quote.'''
+        if value is None:
+            return "NULL"
+        if type(value)==bool:
+            return "1" if value else "0"
+        if type(value) in (int, float):
+            return repr(value)
+        return '"' + str(value).replace('"', '""') + '"'
+
+    @cached(one_table)
+    def select(self, table: str, where: dict={}, wherenot: dict={}, columns: list=["*"],
+               layout: str="dicts", orderby: Union[str, list, None]=None,
+               limit: Union[int, None]=None) -> Union[list, dict, str, bool]:
         '''Selects rows from the given table where the contritions in condition is met.
-        Currently only is equal and not equal conditions work. Making less than and
-        grater than still requires handwritten SQL-code.
+        Besides equal and not equal the conditions can use <, >, in, like,
+        between and more, combined with $or and $and, see basswhere:
+
+            db.select("table", {"age": {">=": 18}, "name": {"like": "A%"}})
 
         By default gets all columns. Since you are working with dictionaries just pick
         what you need and ignore the rest. We are trying to be as Pythonic as possible
         here. That is why the columns last. You can ignore them.
+
+        orderby: a column or a list of columns, "-column" sorts descending.
+        limit:   the most rows to return.
+
+        layout="rows" returns Row objects and layout="columns" returns
+        {column: values}. Both are much cheaper for big results, see bassresult.
+        '''
+        return self._select(table, where, wherenot, columns, layout, orderby, limit)
+
+    def _select(self, table: str, where: dict, wherenot: dict, columns: list, layout: str,
+                orderby: Union[str, list, None], limit: Union[int, None]) -> Union[list, dict, str, bool]:
+        '''select() without the result cache.'''
+        statement = self._select_sql(table, where, wherenot, columns, orderby, limit)
+        if type(statement)!=tuple:
+            return statement
+        return self._execute(*statement, prepared=True, layout=layout)
+
+    def iselect(self, table: str, where: dict={}, wherenot: dict={}, columns: list=["*"],
+                batchsize: int=1000, layout: str="dicts", orderby: Union[str, list, None]=None,
+                limit: Union[int, None]=None) -> Union[Iterator, str, bool]:
+        '''Like select() but returns a generator, see irun().'''
+        statement = self._select_sql(table, where, wherenot, columns, orderby, limit)
+        if type(statement)!=tuple:
+            return statement
+        return self.irun(*statement, batchsize=batchsize, layout=layout)
+
+    @cached(join_tables)
+    def join(self, table: str, joins: list, columns: Union[dict, None]=None, where: dict={},
+             wherenot: dict={}, orderby: Union[str, list, None]=None, limit: Union[int, None]=None,
+             layout: str="dicts") -> Union[list, dict, str]:
+        '''Joins tables in the database and returns the rows, see bassjoin:
+
+            db.join("orders", [{"table": "customers", "on": {"customer": "id"}}],
+                    columns={"orders": ["id", "amount"], "customers": ["name"]},
+                    where={"customers.country": "SE"})
+
+        Returns an error message if a table or column does not exist.
         '''
-        if table not in self.tables():
+        try:
+            sql, values = compile_join(table, joins, columns, where, wherenot, orderby, limit, self.colums)
+        except ValueError as err:
+            return "Error, " + str(err)
+        return self._execute(sql, values, prepared=True, layout=layout)
+
+    def scan(self, table: str, batch_size: int=1000, where: dict={}, wherenot: dict={},
+             columns: list=["*"], layout: str="dicts") -> Union[Iterator, str, bool]:
+        '''Walks through a table in primary key order and yields lists of
+        at most batch_size rows. Every page is found through the primary key
+        index with WHERE key > last ORDER BY key LIMIT batch_size, so the last
+        page costs as little as the first and memory stays flat.
+
+            for rows in db.scan("table", 5000):
+                ...
+
+        where and wherenot are the same as for select(). The primary keys
+        are always selected, even when columns leaves them out. layout is
+        "dicts" or "rows". Returns False if the table or a column does not
+        exist and an error message if the table has no primary key.
+        '''
+        keys = self.primary_keys(table)
+        if keys is False:
             return False
-        tableColums = self.colums(table)
-        for column in where.keys():
-            if column not in tableColums:
-                return False
-        for column in wherenot.keys():
-            if column not in tableColums:
-                return False
+        if keys == []:
+            return "Error, table {} has no primary key to scan by".format(table)
+        if layout not in ("dicts", "rows"):
+            return "Error, scan can not make layout {}".format(layout)
         if columns != ["*"]:
-            for column in columns:
-                if column not in tableColums:
-                    return False
+            columns = [key for key in keys if key not in columns] + list(columns)
+        first = self._select(table, where, wherenot, columns, layout, keys, batch_size)
+        if type(first)!=list:
+            return first
+        return self._scan(first, table, batch_size, where, wherenot, columns, layout, keys)
 
-        sql = "SELECT {} FROM `{}`".format(", ".join(columns), table)
-        if where!={} or wherenot!={}:
-            sql += " WHERE"
-        if where!={}:
-            for w in where:
-                sql += " `{}`='{}' AND".format(w, where[w].replace("'", "''"))
-            sql = sql[:-4]
-        if wherenot!={}:
-            for w in wherenot:
-                sql += " `{}`!='{}' AND".format(w, wherenot[w].replace("'", "''"))
-            sql = sql[:-4]
-        return self.run(sql)
+    def _select_sql(self, table: str, where: dict, wherenot: dict, columns: list,
+                    orderby: Union[str, list, None]=None, limit: Union[int, None]=None) -> Union[tuple, str, bool]:
+        '''Validates and builds a select statement. Returns (sql, values),
+        False on bad table or columns and an error message on bad conditions.'''
+        if type(orderby)==str:
+            orderby = [orderby]
+        orderby = orderby or []
+        key = ("select", table, tuple(columns), where_shape(where), where_shape(wherenot),
+               tuple(orderby), limit is not None)
+        if key not in self._statements:
+            if not self._known(table, where_columns(where, wherenot) + [c.lstrip("-") for c in orderby]):
+                return False
+            if columns != ["*"] and not self._known(table, columns):
+                return False
+        try:
+            clause, values = self._where(where, wherenot)
+        except ValueError as err:
+            return "Error, " + str(err)
+        if limit is not None:
+            values += (int(limit),)
+        return self._statement(key, lambda: "SELECT {} FROM `{}`{}{}{}".format(
+            "*" if columns == ["*"] else ", ".join("`{}`".format(c) for c in columns),
+            table, clause,
+            " ORDER BY " + ", ".join("`{}` DESC".format(c[1:]) if c.startswith("-") else "`{}`".format(c)
+                                     for c in orderby) if orderby else "",
+            " LIMIT %s" if limit is not None else "")), values
 
+    @invalidates(one_table)
+    @journaled("FeedUpdate", "table", "data", "where", "wherenot")
     def update(self, table: str, data: dict, where: dict={}, wherenot: dict={}) -> Union[str, bool]:
         '''Updates an existing post in the database
-        At least one of where and wherenot is required.'''
-        if table not in self.tables():
+        At least one of where and wherenot is required. They take the same
+        conditions as select().'''
+        if where=={} and wherenot=={}:
             return False
-        tableColums = self.colums(table)
-        for column in where.keys():
-            if column not in tableColums:
-                return False
-        for column in wherenot.keys():
-            if column not in tableColums:
-                return False
-        for column in data.keys():
-            if column not in tableColums:
+        key = ("update", table, tuple(data), where_shape(where), where_shape(wherenot))
+        if key not in self._statements:
+            if not self._known(table, list(data) + where_columns(where, wherenot)):
                 return False
+        try:
+            clause, values = self._where(where, wherenot)
+        except ValueError as err:
+            return "Error, " + str(err)
+        sql = self._statement(key, lambda: "UPDATE `{}` SET {}{}".format(table,
+            ", ".join("`{}`=%s".format(d) for d in data), clause))
+        ret = self._execute(sql, tuple(data.values()) + values, prepared=True)
+        if type(ret)==int:
+            return True
+        return ret
 
-        sql = "UPDATE {} SET ".format(table)
-        for d in data:
-            sql += "`{}`='{}', ".format(d, data[d].replace("'", "''"))
-        sql = sql[:-2]
-        sql += " WHERE"
-        if where!={}:
-            for w in where:
-                sql += " `{}`='{}' AND".format(w, where[w].replace("'", "''"))
-            sql = sql[:-4]
-        if wherenot!={}:
-            for w in wherenot:
-                sql += " `{}`!='{}' AND".format(w, wherenot[w].replace("'", "''"))
-            sql = sql[:-4]
-        return self.run(sql)
-
+    @invalidates(one_table)
+    @journaled("FeedDelete", "table", "where", "wherenot")
     def delete(self, table: str, where: dict={}, wherenot: dict={}) -> Union[str, bool]:
-        '''Deletes rows form the table where the conditions is met.'''
-        if table not in self.tables():
+        '''Deletes rows form the table where the conditions is met.
+        At least one of where and wherenot is required, use clear() to empty a table.
+        They take the same conditions as select().'''
+        if where=={} and wherenot=={}:
             return False
-        tableColums = self.colums(table)
-        for column in where.keys():
-            if column not in tableColums:
-                return False
-        for column in wherenot.keys():
-            if column not in tableColums:
+        key = ("delete", table, where_shape(where), where_shape(wherenot))
+        if key not in self._statements:
+            if not self._known(table, where_columns(where, wherenot)):
                 return False
-        sql = "DELETE FROM `{}` WHERE".format(table)
-        if where!={}:
-            for w in where:
-                sql += " `{}`='{}' AND".format(w, where[w].replace("'", "''"))
-            sql = sql[:-4]
-        if wherenot!={}:
-            for w in wherenot:
-                sql += " `{}`!='{}' AND".format(w, wherenot[w].replace("'", "''"))
-            sql = sql[:-4]
-        return self.run(sql)
+        try:
+            clause, values = self._where(where, wherenot)
+        except ValueError as err:
+            return "Error, " + str(err)
+        sql = self._statement(key, lambda: "DELETE FROM `{}`{}".format(table, clause))
+        ret = self._execute(sql, values, prepared=True)
+        if type(ret)==int:
+            return True
+        return ret
 
+    @invalidates(one_table)
+    @journaled("FeedAlterTable", "table", "add", "drop")
     def AlterTable(self, table: str, add: Union[list, dict]=[], drop: Union[list, str]=[]) -> Union[str, bool]:
         '''Alters a table'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return False
 
         sql = "ALTER TABLE `{}`".format(table)
@@ -396,112 +1008,45 @@ class databass:
                 ("DEFAULT({})".format(a["Default"]) if a["Default"]!="None" else "") if "Default" in a else "",
                 a["Extra"] if "Extra" in a else "")
             sql = sql [:-2]
-        return self.run(sql)
+        return self._run(sql)
 
+    @invalidates(one_table)
+    @journaled("FeedClear", "table")
     def clear(self, table: str) -> Union[str, bool]:
         '''Clears/truncates all rows in a table'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             return "Error, no such table"
-        return self.run("TRUNCATE TABLE " + table)
-
-    '''Feed generators'''
-    def FeedCreate(self, tableconfigs: dict) -> dict:
-        '''Returns a feed for the create operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"create", "tableconfigs":tableconfigs}
-
-    def FeedAlterTable(self, table: str, add: list=[], drop: Union[list, str]=[]) -> dict:
-        '''Returns a feed for the alter operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"alter table", "table":table, "add":add, "drop":drop}
+        return self._run("TRUNCATE TABLE " + table)
 
-    def FeedDrop(self, table: str) -> dict:
-        '''Returns a feed for the drop operation to be read by EatFeed() on another server.
+    def EatFeedParallel(self, feed, workers: Union[int, None]=None) -> str:
+        '''Like EatFeed() but operations on different tables run at the same
+        time on different connections. Operations on the same table keep
+        their order, and create, drop and alter table wait for everything
+        before them. The results come back in feed order, same as EatFeed().
 
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"drop", "table":table}
+        workers: number of tables handled at once, by default the pool size.
+        Without a pool there is only one connection and nothing to gain.
 
-    def FeedInsert(self, table: str, data: dict) -> dict:
-        '''Returns a feed for the insert operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"insert", "table":table, "data":data}
-
-    def FeedUpdate(self, table: str, data: dict, where: dict={}, wherenot: dict={}) -> dict:
-        '''Returns a feed for the update operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"update", "table":table, "data":data, "where":where, "wherenot":wherenot }
-
-    def FeedInsupd(self, table: str, data: Union[list, dict]) -> dict:
-        '''Returns a feed for the insert/update operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"insupd", "table":table, "data":data}
-
-    def FeedDelete(self, table: str, where: dict={}, wherenot: dict={}) -> dict:
-        '''Returns a feed for the delete operation to be read by EatFeed() on another server.
-
-        The feeds need to be put in a list afterwards.'''
-        return {"operation":"delete", "table": table, "where" : where, "wherenot" : wherenot }
-
-    def GenerateFeed(self, feed: list) -> str:
-        '''Generated a json string from the list of feeds in feed.
-        This is the thing you are supposed to put in the feed for databass
-        to eat on the other side. It contains the keyword "bassfeed".
-        Other then that you can add whatever server information you like
-        to the json before you put it in the actual feed.'''
-        return json.dumps({"bassfeed":feed})
-
-    '''Feed readers, because a feed is bass food in this case'''
-    def EatCreate(self, feed: dict):
-        return self.create(feed["tableconfigs"])
-
-    def EatAlterTable(self, feed: dict) -> Union[str, bool]:
-        table = feed["table"]
-        add   = feed["add"]
-        drop  = feed["drop"]
-        return self.AlterTable(table, add, drop)
-
-    def EatDrop(self, feed: dict) -> Union[bool, str]:
-        return self.drop(feed["table"])
-
-    def EatInsert(self, feed: dict) -> Union[bool, str]:
-        table = feed["table"]
-        data  = feed["data"]
-        return self.insert(table, data)
-
-    def EatUpdate(self, feed: dict) -> Union[str, bool]:
-        table    = feed["table"]
-        data     = feed["data"]
-        where    = feed["where"]
-        wherenot = feed["wherenot"]
-        return self.update(table, data, where, wherenot)
-
-    def EatInsupd(self, feed: dict) -> Union[list, str]:
-        table    = feed["table"]
-        data     = feed["data"]
-        return self.insupd(table, data)
-
-    def EatDelete(self, feed: dict) -> Union[str, bool]:
-        table    = feed["table"]
-        where    = feed["where"]
-        wherenot = feed["wherenot"]
-        return self.delete(table, where, wherenot)
+        Each table's operations are committed together, but the feed as a
+        whole is not atomic.
+        '''
+        feeds = list(read_feed(feed))
+        if workers is None:
+            workers = self._pool.maxsize if self._pool is not None else 1
+        results = [""]*len(feeds)
 
-    def EatFeed(self, feed: str) -> str:
-        '''This functions reads a feed, handles it and does operations
-        to the database.
+        def stream(indexes: list) -> None:
+            with self.batch():
+                for i in indexes:
+                    results[i] = str(self._eat_one(feeds[i])) + " "
 
-        feed: a json string with atleast the keyword "bassfeed" in it.
-        '''
-        feeds = json.loads(feed)
-        ret = ""
-        for f in feeds["bassfeed"]:
-            ret += str(self._feedeaters[f["operation"]](f)) + " "
-        return ret
+        with ThreadPoolExecutor(workers) as executor:
+            for stage in stages(feeds):
+                if len(stage)==1:
+                    stream(stage[0])
+                else:
+                    list(executor.map(stream, stage))
+        return "".join(results)
 
 def shorten(data: list, maxlen: int=50) -> list:
     '''Shortens the contents of a list of dictionaries to make it
@@ -5,9 +5,9 @@ JSON-feeds. Preferably over HTTPS.
 The syntax for doing operations and generating feeds is identical. And the
 result from reading the feed is identical to as if the operation were done
 locally.
-(Only tested with Python 3. (Automatic JOIN with dictionaries is on the TODO
-list. But you can still write your own SQL and get the list of dictionaries
-from joined SELECTS.))
+(Only tested with Python 3. JOINs are described with dictionaries too, see
+join(). You can still write your own SQL and get the list of dictionaries
+from joined SELECTS.)
 NAME
 Databass is a punmanteau from "data" and "bass" because bass sound like base.
 And you can feed the bass. Bass feed is much funnier than Atom feed.
@@ -30,13 +30,27 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
+import itertools
 import re
 import sqlite3
+import time
 from tabulate import tabulate
-from typing import Union
+from contextlib import contextmanager
+from typing import Union, Iterable, Iterator, Callable
+from basscatalog import BassCatalog, is_ddl
+from basstransaction import BassTransaction
+from bassfeed import BassFeeder
+from bassresult import LAYOUTS, Row, columnar, make_rows
+from basswhere import compile_where, where_columns
+from bassjoin import compile_join
+from basscache import ResultCache, cached, created_tables, forget, invalidates, is_read, join_tables, one_table
+from bassmetrics import BassMetrics, rowcount
+from bassjournal import BassJournal, journaled
 
-class DataBassLite:
+class DataBassLite(BassFeeder):
     '''DataBass but for SQLite'''
+    _dialect = "sqlite"
+    _placeholder = "?"
 
     @staticmethod
     def _dict_factory(cursor, row):
@@ -46,30 +60,69 @@ class DataBassLite:
             dic[col[0]] = row[idx]
         return dic
 
-    def __init__(self, file: str):
+    def __init__(self, file: str, catalog_ttl: Union[float, None] = None,
+                 cache: Union[ResultCache, None] = None, metrics: Union[BassMetrics, None] = None,
+                 journal: Union[BassJournal, None] = None):
+        '''catalog_ttl: seconds the cached table and column information is trusted.
+        Default is to trust it until the schema is changed through DataBassLite.
+        Call self.catalog.refresh() if someone else changes the schema.
+        cache: a basscache.ResultCache to answer repeated select() and join()
+        calls from memory.
+        metrics: a bassmetrics.BassMetrics that times the calls, statements
+        and feed operations and keeps a slow query log.
+        journal: a bassjournal.BassJournal that records every write so that
+        feed_since() can make a feed of the changes.'''
         self.sql = sqlite3.connect(file)
         self.sql.row_factory = self._dict_factory
+        self.cache = cache
+        self.catalog = BassCatalog(self._load_tables, self._load_columns, catalog_ttl)
+        self._stack = []
+
+        # Feed eating functions
+        self._feedeaters = {}
+        self._feedeaters["create"]      = self.EatCreate
+        self._feedeaters["alter table"] = self.EatAlterTable
+        self._feedeaters["drop"]        = self.EatDrop
+        self._feedeaters["insert"]      = self.EatInsert
+        self._feedeaters["update"]      = self.EatUpdate
+        self._feedeaters["delete"]      = self.EatDelete
+        self._feedeaters["insupd"]      = self.EatInsupd
+        self._feedeaters["clear"]       = self.EatClear
+        self._feedeaters["join"]        = self.EatJoin
+
+        self.journal = None
+        if journal is not None:
+            journal.attach(self)
+        self.metrics = None
+        if metrics is not None:
+            metrics.attach(self)
 
     def tables(self) -> list:
         '''Returns a list of tables in the database'''
-        tables = self.run("SELECT `name` FROM `sqlite_master` WHERE type='table';")
-        ret = [table["name"] for table in tables]
-        return ret
+        return self.catalog.tables()
 
     def columns(self, table: str) -> Union[list, None]:
         '''Returns the columns in the table.'''
-        if table not in self.tables():
+        columns = self.catalog.columns(table)
+        if columns is None:
             print("ERROR: table", table, "not in database")
-            return None
-        query = """--begin-sql
-        SELECT * FROM `{}`;
-        """.format(table)
-        cur = self.sql.cursor()
-        cur.execute(query)
-        columns = cur.description
-        ret = [column[0] for column in columns]
-        return ret
+        return columns
+
+    def _load_tables(self) -> list:
+        '''Reads the tables from sqlite_master. Used by the catalog.'''
+        tables = self._run("SELECT `name` FROM `sqlite_master` WHERE type='table';", metadata=True)
+        return [table["name"] for table in tables]
+
+    def _load_columns(self, table: str) -> tuple:
+        '''Reads the columns and primary keys of a table. Used by the catalog.'''
+        info = self._run("PRAGMA table_info(`{}`);".format(table), metadata=True)
+        columns = [column["name"] for column in info]
+        # pk is the position in the primary key, 0 for columns not in it.
+        keys = [column["name"] for column in sorted(info, key=lambda c: c["pk"]) if column["pk"]]
+        return columns, keys
 
+    @invalidates(created_tables)
+    @journaled("FeedCreate", "tableconfig")
     def create(self, tableconfig: dict) -> list:
         '''Creates a table from a dictionary
            TODO: Fix to the datatypes in the dictionary to match the other databass.
@@ -106,7 +159,7 @@ class DataBassLite:
         ret = []
         for table in tableconfig:
             pattern = re.compile("[a-zA-Z0-9_ ]*")
-            if table in self.tables():
+            if self.catalog.has_table(table):
                 ret.append("Table {} already exists".format(table))
             elif not pattern.fullmatch(table):
                 ret.append("Table {} contains illigal characters.".format(table))
@@ -128,86 +181,130 @@ class DataBassLite:
                 PRIMARY KEY({}));
                 """.format(table, columns, keys)
                 # print(query)
-                ret.append(self.run(query))
+                ret.append(self._run(query))
         return ret
 
     def primary_keys(self, table):
         '''Returns the primary keys in the table.'''
-        if table not in self.tables():
+        keys = self.catalog.primary_keys(table)
+        if keys is None:
             print("ERROR: table", table, "not in database")
-            return None
-        everything = self.run("SELECT * FROM `sqlite_master` WHERE type='table' AND name=?;",
-                              (table,))
-        code = everything[0]["sql"]
-        code = code.replace("\n", " ")
-        while "  " in code:
-            code = code.replace("  ", " ")
-        code = code.split("PRIMARY KEY")[1]
-        code = code.strip("(").strip(")").strip()
-        code = code.split(",")
-        primarykeys = [key.strip() for key in code]
-        return primarykeys
+        return keys
 
     def distinct(self, table: str, where: dict = {}, wherenot: dict = {},
                  columns: dict = ["*"]) -> Union[list, None]:
         '''Sistinct select statement'''
         return self.select(table, where, wherenot, columns, True)
 
+    @cached(one_table)
     def select(self, table: str, where: dict = {}, wherenot: dict = {},
-               columns: dict = ["*"], distinct: bool = False) -> Union[list, None]:
-        '''Select statement'''
-        if table not in self.tables():
-            print("ERROR: table", table, "not in database")
+               columns: dict = ["*"], distinct: bool = False,
+               layout: str = "dicts", orderby: Union[str, list, None] = None,
+               limit: Union[int, None] = None) -> Union[list, dict, None]:
+        '''Select statement
+        where and wherenot can use <, >, in, like, between and more, combined
+        with $or and $and, see basswhere.
+        orderby: a column or a list of columns, "-column" sorts descending.
+        limit: the most rows to return.
+        layout="rows" returns Row objects and layout="columns" returns
+        {column: values}, see bassresult.'''
+        return self._select(table, where, wherenot, columns, layout, orderby, limit, distinct)
+
+    def _select(self, table: str, where: dict, wherenot: dict, columns: list, layout: str,
+                orderby: Union[str, list, None], limit: Union[int, None],
+                distinct: bool = False) -> Union[list, dict, None]:
+        '''select() without the result cache.'''
+        statement = self._select_query(table, where, wherenot, columns, distinct, orderby, limit)
+        if statement is None:
             return None
-        tablecolumns = self.columns(table)
-        for column in where.keys():
-            if column not in tablecolumns:
-                print("ERROR: column", column, "not in table", table)
-                return None
-        for column in wherenot.keys():
-            if column not in tablecolumns:
-                print("ERROR: column", column, "not in table", table)
-                return None
+        return self._run(*statement, layout=layout)
+
+    def iselect(self, table: str, where: dict = {}, wherenot: dict = {},
+                columns: dict = ["*"], distinct: bool = False,
+                batchsize: int = 1000, layout: str = "dicts",
+                orderby: Union[str, list, None] = None,
+                limit: Union[int, None] = None) -> Union[Iterator, None]:
+        '''Like select() but returns a generator that fetches batchsize rows
+        at a time, see irun().'''
+        statement = self._select_query(table, where, wherenot, columns, distinct, orderby, limit)
+        if statement is None:
+            return None
+        return self.irun(*statement, batchsize=batchsize, layout=layout)
+
+    @cached(join_tables)
+    def join(self, table: str, joins: list, columns: Union[dict, None] = None, where: dict = {},
+             wherenot: dict = {}, orderby: Union[str, list, None] = None,
+             limit: Union[int, None] = None, layout: str = "dicts") -> Union[list, dict, None]:
+        '''Joins tables in the database and returns the rows, see bassjoin.'''
+        try:
+            query, values = compile_join(table, joins, columns, where, wherenot, orderby, limit,
+                                         self.catalog.columns, "?")
+        except ValueError as err:
+            print("ERROR:", err)
+            return None
+        return self._run(query, values, layout=layout)
+
+    def scan(self, table: str, batch_size: int = 1000, where: dict = {}, wherenot: dict = {},
+             columns: list = ["*"], layout: str = "dicts") -> Union[Iterator, None]:
+        '''Walks through a table in primary key order and yields lists of
+        at most batch_size rows, paging with WHERE key > last ORDER BY key
+        LIMIT batch_size so every page costs the same and memory stays flat.
+        where and wherenot are the same as for select(). The primary keys
+        are always selected. layout is "dicts" or "rows".'''
+        keys = self.primary_keys(table)
+        if keys is None:
+            return None
+        if keys == []:
+            print("ERROR: table", table, "has no primary key to scan by")
+            return None
+        if layout not in ("dicts", "rows"):
+            print("ERROR: scan can not make layout", layout)
+            return None
+        if isinstance(columns, str):
+            columns = [columns]
         if columns != ["*"]:
-            if isinstance(columns, str):
-                columns = [columns]
-            for column in columns:
-                if column not in tablecolumns:
-                    print("ERROR: column", column, "not in table", table)
-                    return None
-        values = ()
-        whereclause = ""
-        if where != {} or wherenot != {}:
-            whereclause += "WHERE "
-        if where != {}:
-            keys = list(where.keys())
-            wherecolumns = ["`{}`=?".format(key) for key in keys]
-            whereclause += " AND ".join(wherecolumns)
-            values += tuple([where[key] for key in keys])
-        if wherenot != {}:
-            keys = list(wherenot.keys())
-            wherenotcolumns = ["`{}`=?".format(key) for key in keys]
-            whereclause += " AND ".join(wherenotcolumns)
-            values += tuple([wherenot[key] for key in keys])
-        if distinct:
-            query = """--begin-sql
-            SELECT DISTINCT {}
-            FROM `{}`
-            {};
-            """.format(", ".join(columns), table, whereclause)
-        else:
-            query = """--begin-sql
-            SELECT {}
+            columns = [key for key in keys if key not in columns] + list(columns)
+        first = self._select(table, where, wherenot, columns, layout, keys, batch_size)
+        if first is None:
+            return None
+        return self._scan(first, table, batch_size, where, wherenot, columns, layout, keys)
+
+    def _select_query(self, table: str, where: dict, wherenot: dict,
+                      columns: list, distinct: bool, orderby: Union[str, list, None] = None,
+                      limit: Union[int, None] = None) -> Union[tuple, None]:
+        '''Validates and builds a select statement. Returns (query, values).'''
+        if isinstance(columns, str):
+            columns = [columns]
+        if isinstance(orderby, str):
+            orderby = [orderby]
+        orderby = orderby or []
+        used = where_columns(where, wherenot) + [column.lstrip("-") for column in orderby]
+        if not self._known(table, used if columns == ["*"] else used + columns):
+            return None
+        whereclause, values = self._whereclause(where, wherenot)
+        if whereclause is None:
+            return None
+        if orderby:
+            whereclause += "\n            ORDER BY " + ", ".join(
+                "`{}` DESC".format(column[1:]) if column.startswith("-") else "`{}`".format(column)
+                for column in orderby)
+        if limit is not None:
+            whereclause += "\n            LIMIT ?"
+            values += (int(limit),)
+        query = """--begin-sql
+            SELECT {}{}
             FROM `{}`
             {};
-            """.format(", ".join(columns), table, whereclause)
-        # print("query =", query)
-        # print("values =", values)
-        return self.run(query, values)
+            """.format("DISTINCT " if distinct else "",
+                       "*" if columns == ["*"] else ", ".join("`{}`".format(column) for column in columns),
+                       table, whereclause)
+        return query, values
 
+    @invalidates(one_table)
+    @journaled("FeedInsert", "table", "data")
     def insert(self, table: str, data: Union[dict, tuple]) -> Union[None, str]:
         '''Inserts data in to database'''
-        if table not in self.tables():
+        if not self.catalog.has_table(table):
             print("ERROR: table", table, "not in database")
             return False
         if isinstance(data, dict):
@@ -227,58 +324,239 @@ class DataBassLite:
         for row in data:
             values.append(tuple(row[key] for key in columns))
         # print(query, values)
-        return self.run(query, values)
+        return self._run(query, values)
 
-    def _exists(self, table: str, data: dict) -> bool:
-        '''Checks if the entry exists in the database. Only checks for primary keys'''
-        prim = self.primary_keys(table)
-        columns = {key: data[key] for key in data if key in prim}
-        return self.select(table, columns) != []
+    @invalidates(one_table)
+    @journaled("FeedInsert", "table", "rows")
+    def bulk_load(self, table: str, rows: Iterable, chunksize: int = 10000,
+                  progress: Union[Callable, None] = None) -> Union[dict, bool]:
+        '''Inserts rows from any iterable of dictionaries, like a generator,
+        without ever holding more than one chunk of rows in memory.
+        All rows must have the same columns as the first one.
+        Each chunk is one executemany in its own transaction.
 
-    def delete(self, table: str, where: dict) -> None:
-        '''Deletes a row.'''
-        if table not in self.tables():
+        progress: called as progress(rows, rows_per_second) after each chunk.
+        Returns {"rows": ..., "seconds": ..., "rows_per_second": ...}'''
+        if not self.catalog.has_table(table):
             print("ERROR: table", table, "not in database")
             return False
+        rows = iter(rows)
+        first = next(rows, None)
+        start = time.monotonic()
+        loaded = 0
+        if first is not None:
+            columns = tuple(first.keys())
+            keys = set(columns)
+            tablecolumns = self.columns(table)
+            for column in columns:
+                if column not in tablecolumns:
+                    print("ERROR: column", column, "not in table", table)
+                    return False
+            query = """--begin-sql
+            INSERT INTO `{}` ({}) VALUES ({});
+            """.format(table, ", ".join("`{}`".format(c) for c in columns),
+                       ", ".join(["?" for c in columns]))
+            chunk = []
+            for row in itertools.chain([first], rows):
+                if row.keys() != keys:
+                    print("ERROR: row", loaded + len(chunk), "does not have the columns", columns)
+                    return False
+                chunk.append(tuple(row[c] for c in columns))
+                if len(chunk) >= chunksize:
+                    self._load_chunk(query, chunk)
+                    loaded += len(chunk)
+                    chunk = []
+                    self._progress(progress, loaded, start)
+            if chunk:
+                self._load_chunk(query, chunk)
+                loaded += len(chunk)
+                self._progress(progress, loaded, start)
+        seconds = time.monotonic() - start
+        return {"rows": loaded, "seconds": seconds,
+                "rows_per_second": loaded / seconds if seconds > 0 else 0.0}
+
+    def _load_chunk(self, query: str, chunk: list) -> None:
+        '''Writes one chunk of bulk_load() in its own transaction.'''
+        if self.metrics is not None:
+            start = time.perf_counter()
+        with self._atomic():
+            self.sql.executemany(query, chunk)
+        if self.metrics is not None:
+            self.metrics.query(query, time.perf_counter() - start, len(chunk))
+
+    @invalidates(one_table)
+    @journaled("FeedDelete", "table", "where", "wherenot")
+    def delete(self, table: str, where: dict = {}, wherenot: dict = {}) -> None:
+        '''Deletes rows. At least one of where and wherenot is required,
+        use clear() to empty a table. The conditions are the same as for select().'''
+        if where == {} and wherenot == {}:
+            print("ERROR: delete without where or wherenot")
+            return False
+        if not self._known(table, where_columns(where, wherenot)):
+            return False
+        whereclause, values = self._whereclause(where, wherenot)
+        if whereclause is None:
+            return False
+        query = """--begin-sql
+        DELETE FROM `{}`
+        {};
+        """.format(table, whereclause)
+        return self._run(query, values)
+
+    @invalidates(one_table)
+    @journaled("FeedUpdate", "table", "data", "where", "wherenot")
+    def update(self, table: str, data: dict, where: dict = {}, wherenot: dict = {}) -> None:
+        '''Updates rows. At least one of where and wherenot is required.
+        The conditions are the same as for select().'''
+        if where == {} and wherenot == {}:
+            print("ERROR: update without where or wherenot")
+            return False
+        if not self._known(table, list(data) + where_columns(where, wherenot)):
+            return False
+        whereclause, values = self._whereclause(where, wherenot)
+        if whereclause is None:
+            return False
+        query = """--begin-sql
+        UPDATE `{}`
+        SET {}
+        {};
+        """.format(table, ", ".join("`{}`=?".format(key) for key in data), whereclause)
+        return self._run(query, tuple(data.values()) + values)
+
+    def _complain(self, message: str) -> None:
+        '''Prints what is wrong, see BassFeeder._known().'''
+        print("ERROR:", message)
+
+    @staticmethod
+    def _whereclause(where: dict, wherenot: dict) -> tuple:
+        '''Builds a WHERE clause from the conditions, see basswhere.
+        Returns (clause, values), (None, None) on bad conditions.'''
+        try:
+            conditions, values = compile_where(where, wherenot, "?")
+        except ValueError as err:
+            print("ERROR:", err)
+            return None, None
+        if conditions == "":
+            return "", ()
+        return "WHERE " + conditions, values
+
+    @invalidates(one_table)
+    @journaled("FeedAlterTable", "table", "add", "drop")
+    def AlterTable(self, table: str, add: Union[list, dict] = [], drop: Union[list, str] = []) -> bool:
+        '''Adds and drops columns. Columns that already exist are not added again.
+        add uses the same dictionaries as create(). Returns True, or False if
+        the table is missing or a change fails, in which case none are made.'''
+        if not self.catalog.has_table(table):
+            print("ERROR: table", table, "not in database")
+            return False
+        if isinstance(drop, str):
+            drop = [drop]
+        if isinstance(add, dict):
+            add = [add]
         tablecolumns = self.columns(table)
-        for column in where.keys():
-            if column not in tablecolumns:
-                print("ERROR: column", column, "not in table", table)
-                return False
-        keys = list(where.keys())
-        wherecolumns = ["`{}`=?".format(key) for key in keys]
-        values = tuple([where[key] for key in keys])
+        # SQLite only does one change per ALTER TABLE.
+        queries = ["ALTER TABLE `{}` DROP COLUMN `{}`;".format(table, column) for column in drop]
+        queries += ["ALTER TABLE `{}` ADD COLUMN `{}` {};".format(table, column["Field"], column["Type"])
+                    for column in add if column["Field"] not in tablecolumns]
+        try:
+            with self.transaction():
+                for query in queries:
+                    self._run(query)
+        except sqlite3.Error as err:
+            print("ERROR:", err)
+            return False
+        return True
+
+    @invalidates(one_table)
+    @journaled("FeedClear", "table")
+    def clear(self, table: str) -> None:
+        '''Deletes all rows in a table.'''
+        if not self.catalog.has_table(table):
+            print("ERROR: table", table, "not in database")
+            return False
         query = """--begin-sql
-        DELETE FROM {}
-        WHERE {};
-        """.format(table, " AND ".join(wherecolumns))
-        return self.run(query, values)
+        DELETE FROM `{}`;
+        """.format(table)
+        return self._run(query)
 
+    @invalidates(one_table)
+    @journaled("FeedInsupd", "table", "data")
     def insupd(self, table: str, data: Union[dict, list]) -> Union[list, str]:
-        '''Inserts if not existing, updates on existing'''
-        if isinstance(data, list):
-            return [self.insupd(table, d) for d in data]
-        if self._exists(table, data):
-            prim = self.primary_keys(table)
-            deletedata = {key: data[key] for key in data if key in prim}
-            self.delete(table, deletedata)
-        return self.insert(table, data)
+        '''Inserts if not existing, updates on existing.
+        Uses INSERT ... ON CONFLICT(primary keys) DO UPDATE. A list of
+        dictionaries is written with executemany in one single transaction.
+        For a list the number of written rows for each executemany is returned.'''
+        single = isinstance(data, dict)
+        if single:
+            data = [data]
+        if not self.catalog.has_table(table):
+            print("ERROR: table", table, "not in database")
+            return False
+        tablecolumns = self.columns(table)
+        for row in data:
+            for column in row.keys():
+                if column not in tablecolumns:
+                    print("ERROR: column", column, "not in table", table)
+                    return False
+        keys = self.primary_keys(table)
+        conflict = ", ".join("`{}`".format(key) for key in keys)
+        counts = []
+        with self._atomic():
+            cur = self.sql.cursor()
+            for columns, rows in self._runs(data):
+                update = ["`{0}`=excluded.`{0}`".format(c) for c in columns if c not in keys]
+                query = """--begin-sql
+                INSERT INTO `{}` ({}) VALUES ({})
+                ON CONFLICT({}) DO {};
+                """.format(table,
+                           ", ".join("`{}`".format(c) for c in columns),
+                           ", ".join(["?" for c in columns]),
+                           conflict,
+                           "UPDATE SET " + ", ".join(update) if update else "NOTHING")
+                if self.metrics is not None:
+                    start = time.perf_counter()
+                cur.executemany(query, [tuple(row[c] for c in columns) for row in rows])
+                counts.append(cur.rowcount)
+                if self.metrics is not None:
+                    self.metrics.query(query, time.perf_counter() - start, max(cur.rowcount, 0))
+        if single:
+            return []
+        return counts
 
+    @invalidates(one_table)
+    @journaled("FeedDrop", "table")
     def drop(self, table: str) -> None:
         '''Drops a table.'''
-        if table not in self.tables():
-            return
+        if not self.catalog.has_table(table):
+            return False
         query = """--begin-sql
         DROP TABLE {};
         """.format(table)
-        self.run(query)
+        return self._run(query)
+
+    def run(self, query: str, values: Union[tuple, list, None] = None,
+            layout: str = "dicts") -> Union[list, dict, None]:
+        '''Runs a query. Returns a list of dictionaries, with layout="rows"
+        a list of Row and with layout="columns" a dictionary of columns,
+        see bassresult.'''
+        result = self._run(query, values, layout)
+        if self.cache is not None and not is_read(query):
+            forget(self, None)
+        return result
 
-    def run(self, query: str, values: Union[tuple, list, None] = None) -> Union[list, None]:
-        '''_'''
+    def _run(self, query: str, values: Union[tuple, list, None] = None,
+             layout: str = "dicts", metadata: bool = False) -> Union[list, dict, None]:
+        '''run() for the statements of DataBassLite itself, which take care of the cache.
+        metadata marks the questions about the schema for the metrics.'''
+        if layout not in LAYOUTS:
+            print("ERROR: unknown layout", layout)
+            return None
         cur = self.sql.cursor()
+        if layout != "dicts":
+            cur.row_factory = None
         cur.execute('pragma encoding=utf8')
-        # print("query =", query)
-        # print("values =", values)
+        if self.metrics is not None:
+            start = time.perf_counter()
         if values is None:
             cur.execute(query)
         elif isinstance(values, tuple):
@@ -288,10 +566,147 @@ class DataBassLite:
         else:
             print("ERROR: strange values", values)
             return None
+        if is_ddl(query):
+            self.catalog.refresh()
         result = cur.fetchall()
-        self.sql.commit()
+        if layout == "columns" and cur.description:
+            result = columnar([d[0] for d in cur.description], result)
+        elif layout == "rows" and cur.description:
+            result = make_rows([d[0] for d in cur.description], result)
+        self._commit()
+        if self.metrics is not None:
+            rows = rowcount(result) if cur.description else max(cur.rowcount, 0)
+            self.metrics.query(query, time.perf_counter() - start, rows, metadata)
         return result
 
+    def irun(self, query: str, values: Union[tuple, None] = None,
+             batchsize: int = 1000, layout: str = "dicts") -> Iterator:
+        '''Like run() but returns a generator over the rows instead of a list.
+        Rows are fetched batchsize at a time so memory stays flat no matter how
+        big the result is. The cursor is closed when the generator is exhausted,
+        closed or garbage collected. layout is "dicts" or "rows".'''
+        if layout not in ("dicts", "rows"):
+            print("ERROR: irun can not make layout", layout)
+            return None
+        cur = self.sql.cursor()
+        if layout == "rows":
+            cur.row_factory = None
+        if values is None:
+            cur.execute(query)
+        else:
+            cur.execute(query, values)
+        return self._stream(cur, batchsize, layout == "rows")
+
+    @staticmethod
+    def _stream(cur: sqlite3.Cursor, batchsize: int, rowobjects: bool = False) -> Iterator:
+        '''Yields the rows of a cursor and closes it when done.'''
+        try:
+            index = {d[0]: i for i, d in enumerate(cur.description or ())}
+            while True:
+                rows = cur.fetchmany(batchsize)
+                if not rows:
+                    break
+                if rowobjects:
+                    yield from (Row(index, row) for row in rows)
+                else:
+                    yield from rows
+        finally:
+            cur.close()
+
+    def _top_transaction(self) -> Union[BassTransaction, None]:
+        '''The outermost transaction() or batch(), None outside of one.'''
+        return self._stack[0] if self._stack else None
+
+    def _commit(self) -> None:
+        '''Commits after a statement. Inside transaction() or batch() the
+        commit waits for the end of the block, batch(every) commits every
+        so many statements.'''
+        if not self._stack:
+            self.sql.commit()
+            return
+        top = self._stack[0]
+        top.statements += 1
+        if top.every and len(self._stack) == 1 and top.statements % top.every == 0:
+            self.sql.commit()
+            self.sql.execute("BEGIN")
+
+    @contextmanager
+    def _atomic(self):
+        '''One transaction for an operation that runs several statements.
+        Inside transaction() or batch() it is simply part of that.'''
+        if self._stack:
+            yield
+            self._commit()
+        else:
+            with self.sql:
+                yield
+
+    def transaction(self, strict: bool = False):
+        '''Runs a with block in one transaction:
+
+            with db.transaction() as tx:
+                db.insert("table", {...})
+                db.delete("table", {...})
+
+        Commits once at the end and rolls back if an exception is raised.
+        With strict=True it also rolls back if anything was recorded with
+        tx.fail(). A transaction inside a transaction is a savepoint.
+        tx.committed tells how it ended.'''
+        return self._transaction(BassTransaction(strict))
+
+    def batch(self, every: Union[int, None] = None):
+        '''Like transaction() but meant for speed rather than atomicity.
+        The per statement commits are replaced by one commit at the end, or one
+        commit every "every" statements to keep the transaction small.
+        On an exception only what was not yet committed is rolled back.'''
+        return self._transaction(BassTransaction(False, every))
+
+    @contextmanager
+    def _transaction(self, tx: BassTransaction):
+        if self._stack:
+            # Nested, use a savepoint.
+            name = "bass{}".format(len(self._stack))
+            self.sql.execute("SAVEPOINT " + name)
+            self._stack.append(tx)
+            try:
+                yield tx
+            except BaseException:
+                self.sql.execute("ROLLBACK TO " + name)
+                self.sql.execute("RELEASE " + name)
+                self.catalog.refresh()
+                raise
+            finally:
+                self._stack.pop()
+            if tx.failed:
+                self.sql.execute("ROLLBACK TO " + name)
+                self.catalog.refresh()
+            else:
+                self._stack[-1].errors.extend(tx.errors)
+                tx.committed = True
+            self.sql.execute("RELEASE " + name)
+            return
+        if self.sql.in_transaction:
+            self.sql.commit()
+        self.sql.execute("BEGIN")
+        self._stack = [tx]
+        try:
+            yield tx
+        except BaseException:
+            self.sql.rollback()
+            self.catalog.refresh()
+            raise
+        else:
+            if tx.failed:
+                self.sql.rollback()
+                self.catalog.refresh()
+            else:
+                self.sql.commit()
+                tx.committed = True
+        finally:
+            self._stack = []
+            if self.cache is not None and tx.tables != set():
+                self.cache.invalidate(tx.tables)
+
 def printrows(rows: list, grid: str = "presto") -> None:
     '''Pretty prints the list of dictionaries returned by DataBassLite.run()
     data: A list of dictionaries
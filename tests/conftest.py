@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The modules live in the root of the repository, not in a package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from databasslite import DataBassLite
+
+TABLES = {"t": [{"Field": "id", "Type": "INTEGER", "Key": "PRI"},
+                {"Field": "a", "Type": "text", "Key": ""},
+                {"Field": "b", "Type": "text", "Key": ""}],
+          "t2": [{"Field": "id", "Type": "INTEGER", "Key": "PRI"},
+                 {"Field": "a", "Type": "text", "Key": ""},
+                 {"Field": "b", "Type": "text", "Key": ""}]}
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    '''Returns a function that opens a new DataBassLite file with the tables t
+    and t2. Keyword arguments go to DataBassLite.'''
+    opened = []
+
+    def make(name: str = "db", tables: bool = True, **options) -> DataBassLite:
+        db = DataBassLite(str(tmp_path / (name + ".db")), **options)
+        if tables:
+            db.create(TABLES)
+        opened.append(db)
+        return db
+    yield make
+    for db in opened:
+        db.sql.close()
+
+
+@pytest.fixture
+def contents():
+    '''Returns a function that reads every row of some tables, in primary key order.'''
+    def read(db, *tables: str) -> dict:
+        return {table: [dict(row) for row in db.select(table, orderby="id")] for table in tables}
+    return read
@@ -0,0 +1,16 @@
+'''bulk_load() checks that every row has the columns of the first one.'''
+import pytest
+
+
+def test_rows_in_any_key_order(make_db, contents):
+    db = make_db()
+    result = db.bulk_load("t", [{"id": 1, "a": "x"}, {"a": "y", "id": 2}], chunksize=1)
+    assert result["rows"] == 2
+    assert contents(db, "t")["t"] == [{"id": 1, "a": "x", "b": None}, {"id": 2, "a": "y", "b": None}]
+
+
+@pytest.mark.parametrize("row", [{"id": 2, "b": "y"}, {"id": 2}, {"id": 2, "a": "y", "b": "z"}])
+def test_other_columns(make_db, contents, row):
+    db = make_db()
+    assert db.bulk_load("t", [{"id": 1, "a": "x"}, row]) is False
+    assert contents(db, "t")["t"] == []
@@ -0,0 +1,67 @@
+'''select() and join() answered from a ResultCache, and forgotten on writes.'''
+import pytest
+
+from basscache import ResultCache
+
+WRITES = {
+    "insert": lambda db: db.insert("t", {"id": 3, "a": "z"}),
+    "insupd": lambda db: db.insupd("t", {"id": 1, "a": "changed"}),
+    "update": lambda db: db.update("t", {"a": "changed"}, {"id": 1}),
+    "delete": lambda db: db.delete("t", {"id": 1}),
+    "clear": lambda db: db.clear("t"),
+    "run": lambda db: db.run("UPDATE t SET a = 'changed' WHERE id = 1"),
+    "feed": lambda db: db.EatFeed(db.GenerateFeed([db.FeedUpdate("t", {"a": "changed"}, {"id": 1})])),
+}
+
+
+@pytest.fixture
+def db(make_db):
+    db = make_db(cache=ResultCache())
+    db.insert("t", [{"id": 1, "a": "x"}, {"id": 2, "a": "y"}])
+    db.insert("t2", [{"id": 1, "a": "x"}])
+    return db
+
+
+def test_repeated_selects_are_cached(db):
+    first = db.select("t", orderby="id")
+    first[0]["a"] = "changed by the caller"
+    assert db.select("t", orderby="id") == [{"id": 1, "a": "x", "b": None}, {"id": 2, "a": "y", "b": None}]
+    assert db.cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("write", list(WRITES))
+def test_writes_invalidate_the_table(db, write):
+    before = db.select("t", orderby="id")
+    db.select("t2")
+    WRITES[write](db)
+    assert db.select("t", orderby="id") != before
+    assert db.select("t", orderby="id") == db._select("t", {}, {}, ["*"], "dicts", ["id"], None)
+    # Results from other tables are kept, except after SQL from run() which
+    # could have touched anything.
+    db.select("t2")
+    assert db.cache.stats()["hits"] == (1 if write == "run" else 2)
+
+
+def test_writes_in_a_transaction(db):
+    before = db.select("t", orderby="id")
+    with db.transaction():
+        db.insert("t", {"id": 3, "a": "z"})
+        assert len(db.select("t")) == 3
+    assert len(db.select("t", orderby="id")) == len(before) + 1
+
+
+def test_rolled_back_transaction(db):
+    before = db.select("t", orderby="id")
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.insert("t", {"id": 3, "a": "z"})
+            db.select("t", orderby="id")
+            raise RuntimeError()
+    assert db.select("t", orderby="id") == before
+
+
+def test_join_is_invalidated_by_either_table(db):
+    joins = [{"table": "t2", "on": {"id": "id"}}]
+    before = db.join("t", joins)
+    db.update("t2", {"a": "changed"}, {"id": 1})
+    assert db.join("t", joins) != before
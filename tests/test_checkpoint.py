@@ -0,0 +1,58 @@
+'''Resuming a feed with checkpoints after a crash.'''
+import pytest
+
+import basscheckpoint
+
+
+def make_feed(db, feed_id: str = "f1", first: int = 0) -> str:
+    return db.GenerateFeed([db.FeedInsert("t", {"id": i, "a": str(i)}) for i in range(first, first + 100)],
+                           feed_id=feed_id)
+
+
+def test_resume_after_a_crash(make_db, contents):
+    db = make_db()
+    feed = make_feed(db)
+    insert = db._feedeaters["insert"]
+    eaten = []
+
+    def crashing(f):
+        eaten.append(f)
+        if len(eaten) == 57:
+            raise ConnectionError("dropped")
+        return insert(f)
+    db._feedeaters["insert"] = crashing
+    with pytest.raises(ConnectionError):
+        db.EatFeed(feed, checkpoint=10)
+    # The batch that crashed is rolled back, the ones before it are kept.
+    assert len(contents(db, "t")["t"]) == 50
+    assert basscheckpoint.last_seq(db, "f1") == 50
+
+    db._feedeaters["insert"] = insert
+    db.EatFeed(feed, checkpoint=10)
+    assert [row["id"] for row in contents(db, "t")["t"]] == list(range(100))
+    assert basscheckpoint.last_seq(db, "f1") == 100
+    assert db.EatFeed(feed, checkpoint=10) == ""
+
+
+def test_a_batch_that_fails_stops_the_feed(make_db, contents):
+    db = make_db()
+    operations = [db.FeedInsert("t", {"id": i}) for i in range(6)]
+    feed = db.GenerateFeed(operations[:4] + [db.FeedInsert("nope", {"id": 1})] + operations[4:], feed_id="bad")
+    assert db.EatFeed(feed, checkpoint=3).endswith("Rolled back")
+    assert basscheckpoint.last_seq(db, "bad") == 3
+    assert len(contents(db, "t")["t"]) == 3
+    basscheckpoint.forget(db, "bad")
+    assert basscheckpoint.last_seq(db, "bad") == 0
+
+
+def test_checkpoint_table_is_made_once(make_db):
+    db = make_db()
+    assert basscheckpoint.last_seq(db, "f1") == 0
+    assert not db.catalog.has_table(basscheckpoint.CHECKPOINTS)
+    db.EatFeed(make_feed(db), checkpoint=10)
+    refreshes = []
+    refresh = db.catalog.refresh
+    db.catalog.refresh = lambda *args: refreshes.append(args) or refresh(*args)
+    db.EatFeed(make_feed(db, "f2", 100), checkpoint=10)
+    assert refreshes == []
+    assert basscheckpoint.last_seq(db, "f2") == 100
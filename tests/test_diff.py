@@ -0,0 +1,39 @@
+'''diff() between two DataBassLite databases.'''
+import pytest
+
+
+@pytest.fixture
+def pair(make_db):
+    source, target = make_db("source"), make_db("target")
+    rows = [{"id": i, "a": str(i), "b": None if i % 3 else "x"} for i in range(1000)]
+    source.insert("t", rows)
+    target.insert("t", rows)
+    source.update("t", {"a": "changed"}, {"id": {"in": [5, 500, 999]}})
+    source.delete("t", {"id": {"between": [100, 120]}})
+    target.delete("t", {"id": 700})
+    target.update("t", {"b": "y"}, {"id": 42})
+    source.insert("t", {"id": 5000, "a": "new"})
+    return source, target
+
+
+@pytest.mark.parametrize("fanout, leaf", [(16, 1000), (4, 10), (2, 1)])
+def test_applying_the_diff_makes_the_tables_equal(pair, contents, fanout, leaf):
+    source, target = pair
+    feed = source.diff("t", target, fanout, leaf)
+    assert feed != []
+    target.EatFeed(target.GenerateFeed(feed))
+    assert contents(target, "t") == contents(source, "t")
+    assert source.diff("t", target, fanout, leaf) == []
+
+
+def test_equal_tables_read_no_rows(make_db):
+    source, target = make_db("source"), make_db("target")
+    for db in (source, target):
+        db.insert("t", [{"id": i, "a": str(i)} for i in range(100)])
+    assert source.diff("t", target, leaf=10) == []
+    assert source.diffstats["rows read"] == 0
+
+
+def test_diff_needs_the_table_on_both_sides(make_db):
+    source, target = make_db("source"), make_db("target", tables=False)
+    assert source.diff("t", target).startswith("Error")
@@ -0,0 +1,51 @@
+'''EatFeed() in one transaction, with and without strict.'''
+import pytest
+
+
+def test_harmless_failures_do_not_roll_back(make_db, contents):
+    db = make_db()
+    result = db.EatFeed(db.GenerateFeed([db.FeedDrop("nope"), db.FeedInsert("t", {"id": 50})]))
+    assert not result.endswith("Rolled back")
+    assert contents(db, "t")["t"] == [{"id": 50, "a": None, "b": None}]
+
+
+def test_a_failed_insert_rolls_back_the_whole_feed(make_db, contents):
+    db = make_db()
+    feed = db.GenerateFeed([db.FeedInsert("t", {"id": 1}),
+                            db.FeedInsert("t", {"id": 2, "nope": "x"}),
+                            db.FeedInsert("t", {"id": 3})])
+    assert db.EatFeed(feed).endswith("Rolled back")
+    assert contents(db, "t")["t"] == []
+
+
+def test_a_missing_table_rolls_back_the_whole_feed(make_db, contents):
+    db = make_db()
+    feed = db.GenerateFeed([db.FeedInsert("t", {"id": 1}), db.FeedInsert("nope", {"id": 1})])
+    assert db.EatFeed(feed).endswith("Rolled back")
+    assert contents(db, "t")["t"] == []
+
+
+def test_not_strict_keeps_what_succeeded(make_db, contents):
+    db = make_db()
+    feed = db.GenerateFeed([db.FeedInsert("t", {"id": 1}), db.FeedInsert("nope", {"id": 1})])
+    assert not db.EatFeed(feed, strict=False).endswith("Rolled back")
+    assert contents(db, "t")["t"] == [{"id": 1, "a": None, "b": None}]
+
+
+def test_strict_commits_a_feed_without_failures(make_db, contents):
+    db = make_db()
+    feed = db.GenerateFeed([db.FeedInsert("t", {"id": 1}), db.FeedUpdate("t", {"a": "x"}, {"id": 1})])
+    assert not db.EatFeed(feed).endswith("Rolled back")
+    assert contents(db, "t")["t"] == [{"id": 1, "a": "x", "b": None}]
+
+
+def test_an_exception_rolls_back_the_whole_feed(make_db, contents):
+    db = make_db()
+
+    def broken(f):
+        raise ConnectionError("dropped")
+    db._feedeaters["update"] = broken
+    feed = db.GenerateFeed([db.FeedInsert("t", {"id": 1}), db.FeedUpdate("t", {"a": "x"}, {"id": 1})])
+    with pytest.raises(ConnectionError):
+        db.EatFeed(feed)
+    assert contents(db, "t")["t"] == []
@@ -0,0 +1,64 @@
+'''FeedReader with small chunks, and FeedWriter round trips.'''
+import io
+import json
+
+import pytest
+
+from bassfeed import FeedReader, FeedWriter
+
+FEED = {"server": "ä", "bassfeed": [
+    {"operation": "insert", "table": "t", "data": [{"id": i, "a": "räksmörgås ✓ 🦆 {}".format(i), "b": None}
+                                                   for i in range(20)]},
+    {"operation": "update", "table": "t", "data": {"b": 1234567}, "where": {"id": 12345}},
+    {"operation": "delete", "table": "t", "where": {"id": 10}},
+]}
+
+
+def chunks(data, size: int):
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_operations_split_across_chunks(size):
+    text = json.dumps(FEED, ensure_ascii=False)
+    reader = FeedReader(chunks(text, size))
+    assert list(reader) == FEED["bassfeed"]
+    assert reader.header == {"server": "ä"}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5])
+def test_utf8_characters_split_across_chunks(size):
+    data = json.dumps(FEED, ensure_ascii=False).encode("utf-8")
+    assert list(FeedReader(chunks(data, size))) == FEED["bassfeed"]
+    assert list(FeedReader(io.BytesIO(data), chunksize=size)) == FEED["bassfeed"]
+
+
+def test_a_number_at_a_chunk_boundary():
+    # 1234567 is cut in to 12 and 34567, the first part must not be taken as the value.
+    text = json.dumps(FEED)
+    cut = text.index("1234567") + 2
+    assert list(FeedReader([text[:cut], text[cut:]])) == FEED["bassfeed"]
+
+
+@pytest.mark.parametrize("cut", [-1, -2, -10, -30])
+def test_truncated_final_operation(cut):
+    data = json.dumps(FEED, ensure_ascii=False).encode("utf-8")[:cut]
+    reader = FeedReader(chunks(data, 3))
+    with pytest.raises(ValueError):
+        list(reader)
+
+
+@pytest.mark.parametrize("target", ["text", "bytes", "file"])
+def test_writer_round_trip(tmp_path, target):
+    path = str(tmp_path / "feed.json")
+    buffer = {"text": io.StringIO(), "bytes": io.BytesIO(), "file": path}[target]
+    with FeedWriter(buffer, header={"server": "ä"}) as writer:
+        writer.writemany(FEED["bassfeed"])
+    if target == "file":
+        with open(path, "rb") as source:
+            written = source.read()
+    else:
+        written = buffer.getvalue()
+    reader = FeedReader(chunks(written, 4))
+    assert list(reader) == FEED["bassfeed"]
+    assert reader.header == {"server": "ä"}
@@ -0,0 +1,32 @@
+'''export() and import_() round trips.'''
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bassio
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_bassio_imports_on_its_own():
+    # In this process databasslite has already imported bassio through bassfeed.
+    subprocess.run([sys.executable, "-c", "import bassio"], cwd=ROOT, check=True)
+
+
+@pytest.mark.parametrize("name", ["t.ndjson", "t.csv", "t.json", "t.ndjson.gz", "t.csv.gz", "t.bassfeed.gz"])
+def test_round_trip(make_db, contents, tmp_path, name):
+    source, target = make_db("source"), make_db("target")
+    source.insert("t", [{"id": i, "a": "rad {} åäö".format(i), "b": None if i % 2 else "x,\"y\""}
+                        for i in range(250)])
+    path = str(tmp_path / name)
+    exported = bassio.export_table(source, "t", path, batch_size=100)
+    assert exported["rows"] == 250
+    imported = bassio.import_table(target, path, "t", batch_size=100)
+    assert imported["rows"] == 250 and "errors" not in imported
+    assert contents(target, "t") == contents(source, "t")
+
+
+def test_unknown_format(make_db, tmp_path):
+    assert make_db().export("t", str(tmp_path / "t.xml")).startswith("Error")
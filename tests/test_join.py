@@ -0,0 +1,25 @@
+'''join() with names from the outside.'''
+import pytest
+
+from bassjoin import compile_join
+
+SCHEMA = {"orders": ["id", "customer", "amount"], "customers": ["id", "name"]}
+
+
+def test_join_runs(make_db):
+    db = make_db()
+    db.insert("t", [{"id": 1, "a": "x"}, {"id": 2, "a": "y"}])
+    db.insert("t2", [{"id": 1, "b": "one"}])
+    rows = db.join("t", [{"table": "t2", "as": "other", "on": {"id": "id"}}],
+                   columns={"t": ["id"], "other": {"b": "other b"}})
+    assert rows == [{"id": 1, "other b": "one"}]
+
+
+@pytest.mark.parametrize("join, columns", [
+    ({"table": "customers", "as": "c` ON 1 JOIN (SELECT 1) AS `x", "on": {"customer": "id"}}, None),
+    ({"table": "customers", "on": {"customer": "id"}}, {"customers": {"name": "n`, (SELECT 1) AS `x"}}),
+    ({"table": "customers", "on": {"customer": "id"}}, {"customers": {"name": 1}}),
+])
+def test_backticks_in_names_are_refused(join, columns):
+    with pytest.raises(ValueError):
+        compile_join("orders", [join], columns, describe=SCHEMA.get)
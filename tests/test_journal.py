@@ -0,0 +1,33 @@
+'''The journal of bulk_load() with rows from a generator.'''
+import json
+
+from bassjournal import BassJournal
+
+
+def test_streamed_rows_are_journaled_per_chunk(make_db, contents):
+    master = make_db("master", journal=BassJournal())
+    master.bulk_load("t", ({"id": i, "a": str(i)} for i in range(25)), chunksize=10)
+    operations, last = master.journal.since(0)
+    assert [len(f["data"]) for f in operations if f["operation"] == "insert"] == [10, 10, 5]
+    replica = make_db("replica", tables=False)
+    replica.EatFeed(master.feed_since(0))
+    assert contents(replica, "t") == contents(master, "t")
+    assert json.loads(master.feed_since(last))["bassfeed"] == []
+
+
+def test_failed_stream_leaves_no_rows_and_no_journal(make_db, contents):
+    master = make_db("master", journal=BassJournal())
+    before = master.journal.last()
+    rows = ({"id": i, "a": "x"} if i != 15 else {"id": i} for i in range(20))
+    assert master.bulk_load("t", rows, chunksize=10) is False
+    assert contents(master, "t")["t"] == []
+    assert master.journal.last() == before
+
+
+def test_insert_of_a_tuple_is_journaled(make_db, contents):
+    master = make_db("master", journal=BassJournal())
+    assert master.insert("t", ({"id": 1, "a": "x"}, {"id": 2, "a": "y"})) is not False
+    replica = make_db("replica", tables=False)
+    replica.EatFeed(master.feed_since(0))
+    assert contents(replica, "t") == contents(master, "t")
+    assert len(contents(master, "t")["t"]) == 2
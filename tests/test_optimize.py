@@ -0,0 +1,59 @@
+'''OptimizeFeed() must give the same tables as the feed it was made from.'''
+import pytest
+
+
+def eat_both(make_db, contents, feed: list) -> tuple:
+    '''Eats feed as it is in one database and optimized in another, returns both tables.'''
+    raw = make_db("raw")
+    optimized = make_db("optimized")
+    for db in (raw, optimized):
+        db.insert("t", [{"id": 1, "a": "old", "b": "old"}, {"id": 9, "a": "old", "b": "old"}])
+    raw.EatFeed(raw.GenerateFeed(feed))
+    optimized.EatFeed(optimized.GenerateFeed(feed, optimize=True))
+    return contents(raw, "t", "t2"), contents(optimized, "t", "t2")
+
+
+FEEDS = {
+    "partial insupds of one key": lambda db: [
+        db.FeedInsupd("t2", [{"id": 1, "a": "1", "b": "2"}, {"id": 1, "a": "3"}])],
+    "partial insupds in separate operations": lambda db: [
+        db.FeedInsupd("t", {"id": 1, "b": "new"}),
+        db.FeedInsupd("t", {"id": 1, "a": "newer"}),
+        db.FeedInsupd("t", [{"id": 2, "a": "x", "b": "y"}, {"id": 2, "b": "z"}])],
+    "inserts around other tables": lambda db: [
+        db.FeedInsert("t", {"id": 5, "a": "x"}),
+        db.FeedDelete("t2", {"id": 5}),
+        db.FeedInsert("t2", {"id": 5, "a": "copy"}),
+        db.FeedInsert("t", {"id": 6, "a": "y"})],
+    "insupd, delete and insupd again": lambda db: [
+        db.FeedInsupd("t", {"id": 1, "a": "gone"}),
+        db.FeedDelete("t", {"id": 1}),
+        db.FeedInsupd("t", {"id": 1, "b": "back"}),
+        db.FeedUpdate("t", {"a": "changed"}, {"id": 9})],
+}
+
+
+@pytest.mark.parametrize("name", sorted(FEEDS))
+def test_optimized_feed_ends_in_the_same_tables(make_db, contents, name):
+    feed = FEEDS[name](make_db("maker", tables=False))
+    raw, optimized = eat_both(make_db, contents, feed)
+    assert optimized == raw
+
+
+def test_repeated_insupd_keeps_every_column(make_db, contents):
+    db = make_db()
+    feed = db.OptimizeFeed([db.FeedInsupd("t2", [{"id": 1, "a": "1", "b": "2"}, {"id": 1, "a": "3"}])])
+    assert feed == [db.FeedInsupd("t2", [{"id": 1, "a": "3", "b": "2"}])]
+    assert db.feedstats["collapsed"] == 1
+
+
+def test_only_adjacent_operations_are_merged(make_db):
+    db = make_db()
+    feed = [db.FeedInsert("t", {"id": 5, "a": "x"}),
+            db.FeedInsert("t2", {"id": 5, "a": "x"}),
+            db.FeedInsert("t", {"id": 6, "a": "y"}),
+            db.FeedInsert("t", {"id": 7, "a": "z"})]
+    optimized = db.OptimizeFeed(feed)
+    assert [(f["table"], f["data"]) for f in optimized] == [
+        ("t", [{"id": 5, "a": "x"}]), ("t2", [{"id": 5, "a": "x"}]), ("t", [{"id": 6, "a": "y"}, {"id": 7, "a": "z"}])]
+    assert db.feedstats["merged"] == 1
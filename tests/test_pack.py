@@ -0,0 +1,65 @@
+'''Packed feeds written with pack() and PackWriter and read back with PackReader.'''
+import io
+
+import pytest
+
+from basspack import PackReader, PackWriter, is_packed, pack
+from bassfeed import read_feed
+
+COMPRESSIONS = ["none", "zlib", "lzma"]
+
+FEED = [
+    {"operation": "insert", "table": "t",
+     "data": [{"id": i, "a": None if i % 3 else "räksmörgås ✓ {}".format(i),
+               "b": i / 7 if i % 2 else None, "big": 2**63 + i, "mixed": [i, "x"] if i % 4 else i}
+              for i in range(100)]},
+    {"operation": "insupd", "table": "t", "data": {"id": -2**63, "a": "", "b": 1.5, "big": -2**63 - 1,
+                                                   "mixed": None}},
+    {"operation": "update", "table": "t", "data": {"a": "ü"}, "where": {"id": 1}},
+    {"operation": "drop", "table": "t2"},
+]
+
+
+def sources(data: bytes, path):
+    path.write_bytes(data)
+    return {"bytes": data, "mmap": str(path), "stream": io.BytesIO(data)}
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("kind", ["bytes", "mmap", "stream"])
+def test_round_trip(tmp_path, compression, kind):
+    data = pack(FEED, {"source": "test"}, compression)
+    assert is_packed(data)
+    reader = PackReader(sources(data, tmp_path / "feed.bass")[kind])
+    assert reader.header == {"source": "test"}
+    assert list(reader) == FEED
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_blockrows(tmp_path, compression):
+    path = str(tmp_path / "feed.bass")
+    rows = FEED[0]["data"]
+    with PackWriter(path, compression=compression, blocksize=1000, blockrows=30) as writer:
+        writer.write(FEED[0])
+    operations = list(PackReader(path))
+    assert [len(operation["data"]) for operation in operations] == [30, 30, 30, 10]
+    assert [row for operation in operations for row in operation["data"]] == rows
+    assert all(operation["table"] == "t" for operation in operations)
+
+
+def test_read_feed_picks_the_format():
+    assert list(read_feed(pack(FEED))) == FEED
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+@pytest.mark.parametrize("kind", ["bytes", "mmap", "stream"])
+def test_truncated(tmp_path, compression, kind):
+    data = pack(FEED, compression=compression)
+    for cut in (5, 20, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError):
+            list(PackReader(sources(data[:cut], tmp_path / "feed{}.bass".format(cut))[kind]))
+
+
+def test_unknown_compression():
+    with pytest.raises(ValueError):
+        pack(FEED, compression="zstd")
@@ -0,0 +1,41 @@
+'''scan() over composite primary keys.'''
+import pytest
+
+KEYED = {"k": [{"Field": "x", "Type": "INTEGER", "Key": "PRI"},
+               {"Field": "y", "Type": "text", "Key": "PRI"},
+               {"Field": "v", "Type": "INTEGER", "Key": ""}]}
+
+
+@pytest.fixture
+def db(make_db):
+    db = make_db(tables=False)
+    db.create(KEYED)
+    # Several rows share every x, so a page can end in the middle of one.
+    db.insert("k", [{"x": x, "y": y, "v": x * 10 + i} for x in range(5) for i, y in enumerate("dbca")])
+    return db
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 4, 7, 20, 100])
+def test_composite_key(db, batch_size):
+    pages = list(db.scan("k", batch_size=batch_size))
+    assert all(len(page) == batch_size for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= batch_size
+    rows = [(row["x"], row["y"], row["v"]) for page in pages for row in page]
+    assert rows == [(row["x"], row["y"], row["v"]) for row in db.select("k", orderby=["x", "y"])]
+    assert len(rows) == 20 and len(set(rows)) == 20
+
+
+def test_composite_key_with_where_and_columns(db):
+    pages = list(db.scan("k", batch_size=3, where={"$or": [{"x": 1}, {"y": "a"}]},
+                         wherenot={"x": 4}, columns=["v"]))
+    assert [row for page in pages for row in page] == [
+        {"x": 0, "y": "a", "v": 3},
+        {"x": 1, "y": "a", "v": 13}, {"x": 1, "y": "b", "v": 11},
+        {"x": 1, "y": "c", "v": 12}, {"x": 1, "y": "d", "v": 10},
+        {"x": 2, "y": "a", "v": 23}, {"x": 3, "y": "a", "v": 33}]
+
+
+def test_no_primary_key(make_db):
+    db = make_db(tables=False)
+    db.run("CREATE TABLE nokey (a text)")
+    assert db.scan("nokey") is None
@@ -0,0 +1,69 @@
+'''Conditions in where and wherenot, see basswhere.'''
+import pytest
+
+ROWS = [{"id": 1, "a": "x", "b": None},
+        {"id": 2, "a": "y", "b": "1"},
+        {"id": 3, "a": "x", "b": "2"},
+        {"id": 4, "a": None, "b": None},
+        {"id": 5, "a": "z", "b": "3"}]
+
+
+@pytest.fixture
+def db(make_db):
+    db = make_db()
+    db.insert("t", ROWS)
+    return db
+
+
+def ids(rows) -> list:
+    return sorted(row["id"] for row in rows)
+
+
+@pytest.mark.parametrize("where, wherenot, expected", [
+    ({"b": None}, {}, [1, 4]),
+    ({}, {"b": None}, [2, 3, 5]),
+    ({"b": {"=": None}}, {}, [1, 4]),
+    ({"b": {"!=": None}}, {}, [2, 3, 5]),
+    ({"a": "x", "b": None}, {}, [1]),
+])
+def test_null(db, where, wherenot, expected):
+    assert ids(db.select("t", where, wherenot)) == expected
+
+
+@pytest.mark.parametrize("where, wherenot, expected", [
+    ({"id": {"in": [1, 3, 9]}}, {}, [1, 3]),
+    ({"id": {"not in": [1, 3]}}, {}, [2, 4, 5]),
+    ({}, {"id": {"in": [1, 3]}}, [2, 4, 5]),
+    ({"id": {"in": []}}, {}, []),
+    ({"id": {"not in": []}}, {}, [1, 2, 3, 4, 5]),
+    ({"a": {"in": ["x", "z"]}, "id": {"<": 5}}, {}, [1, 3]),
+])
+def test_in(db, where, wherenot, expected):
+    assert ids(db.select("t", where, wherenot)) == expected
+
+
+@pytest.mark.parametrize("where, wherenot, expected", [
+    ({"$or": [{"a": "x"}, {"b": "3"}]}, {}, [1, 3, 5]),
+    # As in SQL a comparison with NULL is neither true nor false, and neither is its
+    # NOT, so 4 is left out whenever a or b is compared in wherenot.
+    ({}, {"$or": [{"a": "x"}, {"b": "3"}]}, [2]),
+    ({"$or": [{"a": "x"}, {"b": None}]}, {"id": 1}, [3, 4]),
+    ({"$or": [{"a": "x"}, {"b": "3"}]}, {"$or": [{"id": 1}, {"b": None}]}, [3, 5]),
+    ({"id": {">": 1}}, {"$and": [{"a": "x"}, {"b": "2"}]}, [2, 5]),
+])
+def test_or_with_wherenot(db, where, wherenot, expected):
+    assert ids(db.select("t", where, wherenot)) == expected
+
+
+def test_update_and_delete_take_the_same_conditions(db, contents):
+    db.update("t", {"b": "null"}, {"$or": [{"b": None}, {"id": {"in": [5]}}]}, {"id": 4})
+    db.delete("t", {"id": {"in": [2, 3]}})
+    assert contents(db, "t")["t"] == [{"id": 1, "a": "x", "b": "null"},
+                                      {"id": 4, "a": None, "b": None},
+                                      {"id": 5, "a": "z", "b": "null"}]
+
+
+@pytest.mark.parametrize("where", [{"id": {"is": 1}}, {"$or": []}, {"$nor": [{"id": 1}]},
+                                   {"id": {"between": [1]}}, {"id": {"in": 1}}])
+def test_bad_conditions(db, where):
+    assert db.select("t", where) is None